@@ -0,0 +1,67 @@
+#-*- coding: utf-8 -*-
+
+# Measures the decoding of records by get_record(), per field type, and a full iteration of a table.
+# Each field type is timed on a table made of 8 fields of that type only, and reported in microseconds
+# per decoded field.
+# Run from the root of the repository, e.g. to compare with the tree before the per-table record decoder:
+#     python benchmarks/bench_decode.py --baseline e7ee2ac^
+
+
+import os, shutil, tempfile, time
+from datetime import datetime
+
+import common
+from pybase3 import DbaseFile
+
+# Field length and decimals of the single-type tables, and value of their records, per field type
+TYPES = {'C': (20, 0, lambda i: f'name {i}'), 'N': (8, 0, lambda i: i), 'F': (10, 2, lambda i: i * 0.25),
+         'D': (8, 0, lambda i: datetime(2020, 1, 1 + i % 28)), 'L': (1, 0, lambda i: i % 2 == 0)}
+WIDTH = 8
+
+
+def best(function, repeat: int = 3) -> float:
+    """Returns the best wall time of 'repeat' calls of 'function', in seconds."""
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def write_tables(directory: str, rows: int):
+    """Writes the single-type tables and the mixed table of the benchmark to 'directory'."""
+
+    for fieldtype, (length, decimal, value) in TYPES.items():
+        table = DbaseFile.create(os.path.join(directory, f'{fieldtype}.dbf'),
+                                 [(f'f{i}', fieldtype, length, decimal) for i in range(WIDTH)])
+        table.add_records([[value(i)] * WIDTH for i in range(rows)])
+    DbaseFile.create(os.path.join(directory, 'mixed.dbf'), common.FIELDS).add_records(common.make_rows(rows))
+
+
+def main():
+    parser = common.parser("Measures the decoding of records per field type, and a full table iteration.", 20000)
+    args = parser.parse_args()
+    directory = args.tables or tempfile.mkdtemp()
+    try:
+        if not args.tables:
+            write_tables(directory, args.rows)
+        print(f"{common.label()}:")
+        for fieldtype in TYPES:
+            table = DbaseFile(os.path.join(directory, f'{fieldtype}.dbf'))
+            seconds = best(lambda: [table.get_record(key) for key in range(args.rows)])
+            print(f"  {fieldtype} fields: {seconds / (args.rows * WIDTH) * 1e6:.3f} us/field")
+        table = DbaseFile(os.path.join(directory, 'mixed.dbf'))
+        seconds = best(lambda: list(table))
+        print(f"  iteration of {args.rows} records ({len(common.FIELDS)} fields): {seconds:.3f} s, "
+              f"{args.rows / seconds:,.0f} records/s")
+        if args.baseline:
+            common.run_baseline(args.baseline, ['--rows', str(args.rows), '--tables', directory])
+    finally:
+        if not args.tables:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
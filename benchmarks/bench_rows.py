@@ -0,0 +1,51 @@
+#-*- coding: utf-8 -*-
+
+# Measures the memory and time taken to read a whole table into a list, as Record objects
+# (the default) and as compact Row objects (compact=True).
+# Memory is the peak traced by tracemalloc while the list is built, so it includes the decoded values.
+# Run from the root of the repository:
+#     python benchmarks/bench_rows.py --rows 200000
+
+
+import os, shutil, tempfile, time, tracemalloc
+
+import common
+from pybase3 import DbaseFile
+
+
+def measure(table: DbaseFile, compact: bool):
+    """Returns the peak memory in bytes and the time in seconds taken to read all the records of 'table'."""
+
+    start = time.perf_counter()
+    rows = list(table.scan(compact=compact))
+    seconds = time.perf_counter() - start
+    del rows
+    tracemalloc.start()
+    rows = list(table.scan(compact=compact))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del rows
+    return peak, seconds
+
+
+def main():
+    parser = common.parser("Measures the memory and time taken to read a table as Record and as compact Row objects.",
+                           200000, baseline=False)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'rows.dbf')
+        DbaseFile.create(path, common.FIELDS).add_records(common.make_rows(args.rows))
+        table = DbaseFile(path)
+        results = {compact: measure(table, compact) for compact in (False, True)}
+    finally:
+        shutil.rmtree(directory)
+    print(f"{args.rows} records of {len(common.FIELDS)} fields:")
+    for compact, (peak, seconds) in results.items():
+        print(f"  {'Row' if compact else 'Record':6}: {peak / 2 ** 20:8.1f} MiB, {peak / args.rows:6.0f} bytes/record, "
+              f"{seconds:.3f} s")
+    print(f"  Row/Record memory: {results[True][0] / results[False][0]:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#-*- coding: utf-8 -*-
+
+# Measures the write throughput of a table, in records per second: encoding records alone,
+# appending them with add_records(), and rewriting existing records one at a time with save_record().
+# Run from the root of the repository, e.g. to compare with the tree before the shared RecordEncoder:
+#     python benchmarks/bench_write.py --baseline 711dc37^
+
+
+import os, shutil, tempfile, time
+
+import common
+from pybase3 import DbaseFile
+
+# Number of records rewritten by save_record()
+SAVES = 2000
+
+
+def main():
+    parser = common.parser("Measures the write throughput of a table, in records per second.", 200000)
+    args = parser.parse_args()
+    rows = common.make_rows(args.rows)
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'write.dbf')
+        table = DbaseFile.create(path, common.FIELDS)
+        # Older revisions have no encoder, but a _encode_values() method
+        encoder = getattr(table, 'encoder', None)
+        encode = encoder.encode if encoder else table._encode_values
+        start = time.perf_counter()
+        for row in rows:
+            encode(row)
+        encoding = time.perf_counter() - start
+        start = time.perf_counter()
+        table.add_records(rows)
+        adding = time.perf_counter() - start
+        table = DbaseFile(path)
+        records = [dict(table.get_record(key)) for key in range(min(SAVES, args.rows))]
+        start = time.perf_counter()
+        for key, record in enumerate(records):
+            table.save_record(key, record)
+        saving = time.perf_counter() - start
+    finally:
+        shutil.rmtree(directory)
+    print(f"{common.label()}:")
+    print(f"  encoding     : {args.rows / encoding:10,.0f} records/s")
+    print(f"  add_records(): {args.rows / adding:10,.0f} records/s")
+    print(f"  save_record(): {len(records) / saving:10,.0f} records/s")
+    if args.baseline:
+        common.run_baseline(args.baseline, ['--rows', str(args.rows)])
+
+
+if __name__ == '__main__':
+    main()
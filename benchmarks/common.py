@@ -0,0 +1,58 @@
+#-*- coding: utf-8 -*-
+
+# Helpers shared by the benchmark scripts of this directory, which are not part of the package.
+# Importing this module puts the pybase3 package of the working tree (or of the tree named by the
+# PYBASE3_TREE environment variable) first on sys.path, so import it before pybase3.
+# Given --baseline <git revision>, a script runs once more against the package as of that revision,
+# reading the tables written by the working tree, as older revisions may not write them all correctly.
+
+
+import io, os, subprocess, sys, tarfile, tempfile
+from argparse import ArgumentParser, SUPPRESS
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.environ.get('PYBASE3_TREE', ROOT))
+
+# Fields of the tables written by make_rows()
+FIELDS = [('name', 'C', 20, 0), ('qty', 'N', 8, 0), ('price', 'F', 10, 2), ('born', 'D', 8, 0), ('ok', 'L', 1, 0)]
+
+
+def make_rows(count: int) -> list:
+    """Returns 'count' rows of values for the fields in FIELDS."""
+
+    return [(f'name {i}', i, i * 0.25, datetime(2020, 1, 1 + i % 28), i % 2 == 0) for i in range(count)]
+
+
+def parser(description: str, rows: int, baseline: bool = True) -> ArgumentParser:
+    """Returns the argument parser of a benchmark script, with its --rows and (if 'baseline') --baseline options."""
+
+    parser = ArgumentParser(description=description)
+    parser.add_argument('--rows', type=int, default=rows, help=f"number of records (default {rows})")
+    if baseline:
+        parser.add_argument('--baseline', metavar='REV',
+                            help="git revision to run the benchmark against too, for a before/after comparison")
+        parser.add_argument('--tables', metavar='DIR', help=SUPPRESS)
+    return parser
+
+
+def label() -> str:
+    """Returns the name of the tree being measured, to prefix the results with."""
+
+    return os.environ.get('PYBASE3_LABEL', 'working tree')
+
+
+def run_baseline(revision: str, argv: list):
+    """
+    Runs the calling script again, with the arguments 'argv', importing the pybase3 package
+    as of the git revision 'revision', extracted to a temporary directory.
+    Pass '--tables <directory>' in 'argv' to have it read the tables already written there.
+    """
+
+    archive = subprocess.run(['git', 'archive', revision, 'pybase3'], cwd=ROOT,
+                             capture_output=True, check=True).stdout
+    with tempfile.TemporaryDirectory() as tree:
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            tar.extractall(tree)
+        env = dict(os.environ, PYBASE3_TREE=tree, PYBASE3_LABEL=revision)
+        subprocess.run([sys.executable, os.path.abspath(sys.argv[0]), *argv], env=env, check=True)
@@ -11,7 +11,20 @@ Classes:
     DbaseHeader
     DbaseField
     Record
+    LazyRecord
+    Row
+    RecordDecoder
+    RecordEncoder
     FieldType
+    IndexBuild
+        (Handle of an index build, returned by DbaseFile.make_mdx(), to wait for the indexes to be ready)
+    FieldIndex
+        (Index of a field, stored in a binary .pidx file. Resides in its own module, indexes.py)
+    BitmapIndex
+        (Index of a field with few distinct values, as a bitmap per value. Resides in indexes.py)
+    NativeIndex
+        (Read only index of a field in a dBase/Clipper .ndx, .ntx or .mdx file. 
+         Resides in its own module, native_indexes.py)
     SQLParser 
         (Additional class for SQL queries. 
          It stands alone and can be used independently of the DBaseFile class.
@@ -22,6 +35,7 @@ Classes:
 
 Functions:
     connect(filename: str) -> Connection
+    make_row_class(typename: str, names: List[str], header_size: int = 0, record_size: int = 0) -> type
     make_raw_lines(curr: Cursor)-> Generator[str, None, None]
     make_list_lines(curr: Cursor)-> Generator[str, None, None]
     make_csv_lines(curr: Cursor)-> Generator[str, None, None]
@@ -47,14 +61,28 @@ __url__ = "https://github.com/sandy98/pybase3"
 __description__ = "A simple library to read and write dbase III files."
 
 # Import the necessary modules.
-import struct, os, pickle, sqlite3, re, subprocess, shlex
-# from mmap import mmap as memmap, ACCESS_WRITE
+import struct, os, pickle, sqlite3, re, subprocess, shlex, keyword, tempfile
+from operator import attrgetter
+from itertools import chain, repeat
+from bisect import insort, bisect_left
+from heapq import heappop, heappush
+from array import array
+from mmap import mmap as memmap, ACCESS_READ
 from enum import Enum
-from typing import List, Tuple, Generator, AnyStr, Any, Callable
+from typing import List, Tuple, Generator, AnyStr, Any, Callable, Iterable
 from dataclasses import dataclass, field #, fields, field, is_dataclass
 from datetime import datetime
-from threading import Thread, Lock
+from threading import Thread, Lock, Event
+from contextlib import contextmanager
+from queue import Queue, Full
 from multiprocessing.pool import ThreadPool
+from concurrent.futures import ProcessPoolExecutor
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
 # from multiprocessing import Pool
 # from multiprocessing import Lock
 
@@ -62,10 +90,14 @@ try:
     # Import from the local module
     from utils import SmartDict, coerce_number
     from sqlparser import SQLParser
+    from indexes import FieldIndex, BitmapIndex, KeyCodec, open_index, bit_positions
+    from native_indexes import open_native
 except ImportError:
     # Import from the package
     from pybase3.utils import SmartDict, coerce_number
     from pybase3.sqlparser import SQLParser
+    from pybase3.indexes import FieldIndex, BitmapIndex, KeyCodec, open_index, bit_positions
+    from pybase3.native_indexes import open_native
 
 to_bytes = lambda x: x.encode('latin1') if type(x) == str else x
 to_str = lambda x: x.decode('latin1') if type(x) == bytes else x
@@ -75,6 +107,22 @@ getYear = lambda: datetime.now().year - 2000
 getMonth = lambda: datetime.now().month
 getDay = lambda: datetime.now().day
 
+def _lock_file(file, blocking:bool=True) -> bool:
+    """
+    Takes an exclusive advisory lock on an open file, held until the file is closed.
+    Returns False if 'blocking' is False and the lock is held through another open file.
+    """
+
+    try:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
 class Record(SmartDict):
     """
 
@@ -101,6 +149,262 @@ class Record(SmartDict):
         return self.__repr__() + "\n"
 
 
+class LazyRecord(Record):
+    """
+    Record which keeps a reference to the raw bytes of the record and decodes
+    each field only the first time it is read, caching the decoded value.
+    Whole-record operations (keys(), items(), iteration, repr, comparisons...) decode
+    the remaining fields first, so it behaves as a regular Record.
+    """
+
+    __slots__ = ('_decoder', '_raw', '_lazy')
+
+    def __init__(self, decoder, raw: bytes, key: int = 0, offset: int = 0):
+        super().__init__(deleted=(raw[0] == 0x2A), metadata=SmartDict(offset=offset, index=key))
+        object.__setattr__(self, '_decoder', decoder)
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_lazy', True)
+
+    def __missing__(self, key):
+        if self._lazy and key in self._decoder.positions:
+            value = self._decoder.decode_field(self._raw, key)
+            dict.__setitem__(self, key, value)
+            return value
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or (self._lazy and key in self._decoder.positions)
+
+    def get(self, key, default=None):
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        if self._lazy and key in self._decoder.positions:
+            return self[key]
+        return default
+
+    def _materialize(self):
+        """
+        Decodes the fields not read so far, keeping the field order of a regular Record.
+        """
+
+        if not self._lazy:
+            return
+        object.__setattr__(self, '_lazy', False)
+        decoder = self._decoder
+        items = [(k, dict.__getitem__(self, k)) for k in ('deleted', 'metadata') if dict.__contains__(self, k)]
+        items += [(name, dict.__getitem__(self, name) if dict.__contains__(self, name) 
+                   else decoder.decode_field(self._raw, name)) for name in decoder.names]
+        items += [(k, v) for k, v in dict.items(self) if k not in decoder.positions 
+                  and k not in ('deleted', 'metadata')]
+        dict.clear(self)
+        dict.update(self, items)
+
+    def keys(self):
+        self._materialize()
+        return dict.keys(self)
+
+    def values(self):
+        self._materialize()
+        return dict.values(self)
+
+    def items(self):
+        self._materialize()
+        return dict.items(self)
+
+    def __iter__(self):
+        self._materialize()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self._materialize()
+        return dict.__len__(self)
+
+    def __eq__(self, other):
+        self._materialize()
+        if isinstance(other, LazyRecord):
+            other._materialize()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __delitem__(self, key):
+        self._materialize()
+        dict.__delitem__(self, key)
+
+    def pop(self, *args):
+        self._materialize()
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self._materialize()
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        self._materialize()
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        self._materialize()
+        dict.update(self, *args, **kwargs)
+
+    def copy(self):
+        self._materialize()
+        return Record(dict.copy(self))
+
+    def __reduce__(self):
+        return (Record, (dict(self.items()),))
+
+
+class Row:
+    """
+    Base class of the compact, namedtuple-like row types generated per table by make_row_class().
+    Field values, the record index and the deletion flag are stored in __slots__, so a row 
+    carries neither a dict nor a nested metadata dict. Iterating a row yields its values, while 
+    row[name], row.get(name), keys(), items(), datafields, to_datafields, metadata and deleted 
+    work as with a Record.
+    """
+
+    __slots__ = ('_index', '_deleted')
+    _typename = 'Row'
+    _fields = ()
+    _slotnames = {}
+    _getvalues = staticmethod(lambda row: ())
+    _header_size = 0
+    _record_size = 0
+
+    def values(self) -> tuple:
+        """Returns a tuple with the values of the fields."""
+
+        return self._getvalues(self)
+
+    def __iter__(self):
+        return iter(self._getvalues(self))
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, slice)):
+            return self._getvalues(self)[key]
+        if key == 'deleted':
+            return self._deleted
+        if key == 'metadata':
+            return self.metadata
+        return getattr(self, self._slotnames[key])
+
+    def __setitem__(self, key, value):
+        if key == 'deleted':
+            self._deleted = value
+        else:
+            setattr(self, self._slotnames[key], value)
+
+    def get(self, key, default=None):
+        """Returns the value of the field 'key', or 'default' if there's no such field."""
+
+        try:
+            return self[key]
+        except (KeyError, IndexError, TypeError):
+            return default
+
+    def keys(self) -> List[str]:
+        """Returns the field names."""
+
+        return list(self._fields)
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """Returns (field name, value) pairs."""
+
+        return list(zip(self._fields, self._getvalues(self)))
+
+    def _asdict(self) -> dict:
+        return dict(zip(self._fields, self._getvalues(self)))
+
+    @property
+    def deleted(self) -> bool:
+        return self._deleted
+
+    @deleted.setter
+    def deleted(self, value):
+        self._deleted = value
+
+    @property
+    def metadata(self) -> SmartDict:
+        index = self._index
+        offset = self._header_size + index * self._record_size if index is not None and self._record_size else None
+        return SmartDict(offset=offset, index=index)
+
+    @property
+    def datafields(self) -> List[str]:
+        return list(self._fields)
+
+    @property
+    def to_datafields(self) -> SmartDict:
+        return SmartDict(zip(self._fields, self._getvalues(self)))
+
+    def __eq__(self, other):
+        if isinstance(other, Row):
+            return self._fields == other._fields and self._getvalues(self) == other._getvalues(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return (_make_row, (self._typename, self._fields, self._header_size, self._record_size,
+                            self._index, self._deleted, self._getvalues(self)))
+
+    def __repr__(self):
+        return f"{self._typename}(" + ", ".join(f"{k}={v!r}" for k, v in zip(self._fields, self._getvalues(self))) + ")"
+
+
+_row_classes = {}
+
+def make_row_class(typename: str, names: List[str], header_size: int = 0, record_size: int = 0) -> type:
+    """
+    Returns a Row subclass with one slot per field name, generated once and cached per
+    (typename, names, header_size, record_size). Instances are created as cls(index, deleted, *values).
+    Field names which are valid identifiers are also accessible as attributes (row.name).
+    """
+
+    key = (typename, tuple(names), header_size, record_size)
+    if key in _row_classes:
+        return _row_classes[key]
+    slots = tuple(f'_v{i}' for i in range(len(names)))
+    args = ''.join(f', {slot}' for slot in slots)
+    body = ''.join(f'    self.{slot} = {slot}\n' for slot in slots)
+    namespace = {}
+    exec(f"def __init__(self, _index, _deleted{args}):\n    self._index = _index\n    self._deleted = _deleted\n{body}", namespace)
+    if len(slots) == 1:
+        getter = attrgetter(slots[0])
+        getvalues = lambda row: (getter(row),)
+    elif slots:
+        getvalues = attrgetter(*slots)
+    else:
+        getvalues = lambda row: ()
+    cls = type(typename if typename.isidentifier() else 'Row', (Row,), {
+        '__slots__': slots,
+        '__init__': namespace['__init__'],
+        '_typename': typename,
+        '_fields': tuple(names),
+        '_slotnames': dict(zip(names, slots)),
+        '_getvalues': staticmethod(getvalues),
+        '_header_size': header_size,
+        '_record_size': record_size,
+    })
+    for name, slot in zip(names, slots):
+        if name.isidentifier() and not keyword.iskeyword(name) and not name.startswith('_') and not hasattr(cls, name):
+            setattr(cls, name, cls.__dict__[slot])
+    _row_classes[key] = cls
+    return cls
+
+def _make_row(typename, names, header_size, record_size, index, deleted, values):
+    """Rebuilds a Row when unpickling. Meant for internal use only."""
+
+    return make_row_class(typename, names, header_size, record_size)(index, deleted, *values)
+
+
 class FieldType(Enum):
     """Enum for dBase III field types."""
 
@@ -256,6 +560,366 @@ class DbaseField:
         )
 
 
+def field_text(raw: bytes) -> str:
+    """Decodes the raw bytes of a field into a stripped string, the way dBase stores it (latin1, padded)."""
+
+    return raw.decode('latin1').strip('\x00').strip().replace('\x00', ' ')
+
+
+class RecordDecoder:
+    """
+    Decoder for the records of a DBase III table, compiled once per table layout.
+    Field offsets are precomputed into a struct.Struct and a converter is chosen for
+    each field type, so a record buffer is turned into a Record in a single pass,
+    without slicing the buffer once per field.
+    """
+
+    true_bytes = (b'T', b't', b'Y', b'y')
+    true_values = ('T', 't', 'Y', 'y')
+
+    def __init__(self, fields: List[DbaseField], typename: str = 'Row', header_size: int = 0, record_size: int = 0):
+        """
+        Compiles the decoder for the given fields.
+
+        :param fields: List of DbaseField objects, in the order they appear in the record.
+        :param typename: Name of the compact Row class generated for the table.
+        :param header_size: Header size of the table, used to compute Row.metadata.offset.
+        :param record_size: Record size of the table, used to compute Row.metadata.offset.
+        """
+
+        self.fields = fields
+        self.names = [field.name.strip('\x00').strip() for field in fields]
+        self.offsets = []
+        offset = 1
+        for field in fields:
+            self.offsets.append(offset)
+            offset += field.length
+        self.converters = [self.converter(field.type) for field in fields]
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        self.struct = struct.Struct('<c' + ''.join(f'{field.length}s' for field in fields))
+        self.row_class = make_row_class(typename, self.names, header_size, record_size)
+
+    @classmethod
+    def converter(cls, fieldtype: str) -> Callable[[bytes], Any]:
+        """
+        Returns the function which converts the raw bytes of a field of the given type into a value.
+        """
+
+        if fieldtype == FieldType.CHARACTER.value:
+            return field_text
+        elif fieldtype == FieldType.NUMERIC.value:
+            return cls.decode_numeric
+        elif fieldtype == FieldType.FLOAT.value:
+            return cls.decode_float
+        elif fieldtype == FieldType.DATE.value:
+            return cls.decode_date
+        elif fieldtype == FieldType.LOGICAL.value:
+            return cls.decode_logical
+        else:
+            def unknown(raw):
+                raise ValueError(f"Unknown field type {fieldtype}")
+            return unknown
+
+    @staticmethod
+    def decode_numeric(raw: bytes) -> int|float|str:
+        """Converts the raw bytes of a N field into an int (or a float, if it has decimals)."""
+
+        try:
+            return int(raw)
+        except ValueError:
+            text = field_text(raw)
+            if text == '':
+                return 0
+            try:
+                return int(text)
+            except ValueError:
+                try:
+                    return float(text)
+                except ValueError:
+                    return text
+
+    @staticmethod
+    def decode_float(raw: bytes) -> float|str:
+        """Converts the raw bytes of a F field into a float."""
+
+        try:
+            return float(raw)
+        except ValueError:
+            text = field_text(raw)
+            if text == '':
+                return 0.0
+            try:
+                return float(text)
+            except ValueError:
+                return text
+
+    @staticmethod
+    def decode_date(raw: bytes) -> datetime|str:
+        """Converts the raw bytes (YYYYMMDD) of a D field into a datetime."""
+
+        if len(raw) == 8 and raw.isdigit():
+            try:
+                return datetime(int(raw[:4]), int(raw[4:6]), int(raw[6:]))
+            except ValueError:
+                return field_text(raw)
+        text = field_text(raw)
+        try:
+            return datetime.strptime(text, '%Y%m%d')
+        except ValueError:
+            return text
+
+    @classmethod
+    def decode_logical(cls, raw: bytes) -> bool:
+        """Converts the raw bytes of a L field into a bool."""
+
+        return raw in cls.true_bytes or (len(raw) > 1 and field_text(raw) in cls.true_values)
+
+    def decode(self, buffer, pos: int = 0, key: int = 0, offset: int = 0) -> Record:
+        """
+        Decodes the record starting at position 'pos' of 'buffer'.
+
+        :param buffer: bytes-like object holding one or more records.
+        :param pos: Position of the record within the buffer.
+        :param key: Index of the record within the table, stored in the record metadata.
+        :param offset: Offset of the record within the file, stored in the record metadata.
+        :returns: Record object.
+        """
+
+        values = self.struct.unpack_from(buffer, pos)
+        record = Record(deleted=(values[0] == b'*'), metadata=SmartDict(offset=offset, index=key))
+        record.update(zip(self.names, [convert(value) for convert, value in zip(self.converters, values[1:])]))
+        return record
+
+    def decode_lazy(self, buffer, pos: int = 0, key: int = 0, offset: int = 0) -> LazyRecord:
+        """
+        Same as decode(), but returns a LazyRecord which decodes its fields only when they are read.
+        """
+
+        return LazyRecord(self, bytes(buffer[pos:pos + self.struct.size]), key, offset)
+
+    def decode_row(self, buffer, pos: int = 0, key: int = 0, offset: int = 0) -> Row:
+        """
+        Same as decode(), but returns an instance of the compact row class of the table (see make_row_class).
+        """
+
+        values = self.struct.unpack_from(buffer, pos)
+        return self.row_class(key, values[0] == b'*', *[convert(value) for convert, value in zip(self.converters, values[1:])])
+
+    def decoder_for(self, lazy: bool = False, compact: bool = False) -> Callable:
+        """
+        Returns the decoding method for the requested kind of record: LazyRecord if 'lazy',
+        compact Row if 'compact', Record otherwise.
+        """
+
+        return self.decode_lazy if lazy else self.decode_row if compact else self.decode
+
+    def decode_field(self, raw: bytes, name: str) -> Any:
+        """
+        Decodes the single field 'name' out of the raw bytes of a record.
+        """
+
+        i = self.positions[name]
+        start = self.offsets[i]
+        return self.converters[i](raw[start:start + self.fields[i].length])
+
+    def column_struct(self, names: List[str], record_size: int = None) -> struct.Struct:
+        """
+        Returns a struct.Struct which unpacks only the raw bytes of the fields in 'names' 
+        ('deleted' standing for the deletion flag), in record order, skipping the rest of the record.
+        If 'record_size' is given, the struct spans exactly one record (as needed by iter_unpack).
+        """
+
+        slots = sorted((0, 1) if name == 'deleted' else 
+                       (self.offsets[self.positions[name]], self.fields[self.positions[name]].length)
+                       for name in names)
+        fmt, pos = '<', 0
+        for start, length in slots:
+            fmt += f'{start - pos}x{length}s'
+            pos = start + length
+        return struct.Struct(fmt + (f'{record_size - pos}x' if record_size else ''))
+
+    def projector(self, names: List[str], aliases: List[str] = None, compact: bool = False, 
+                  typename: str = 'Row') -> Callable:
+        """
+        Compiles a function project(raw, key=None) which decodes, out of the raw bytes of a record, 
+        only the fields in 'names', and returns them keyed by 'aliases' (the names by default):
+        as a Record, or as a compact Row if 'compact' ('key' being the record index kept by the Row).
+        """
+
+        aliases = list(aliases or names)
+        unique = sorted(set(names), key=self.positions.__getitem__)
+        unpacker = self.column_struct(unique)
+        converters = [self.converters[self.positions[name]] for name in unique]
+        where = [unique.index(name) for name in names]
+        row_class = make_row_class(typename, aliases) if compact else None
+
+        def project(raw, key=None):
+            values = [convert(value) for convert, value in zip(converters, unpacker.unpack_from(raw))]
+            if row_class:
+                return row_class(key, raw[0] == 0x2A, *[values[i] for i in where])
+            return Record(zip(aliases, [values[i] for i in where]))
+        return project
+
+
+class RecordEncoder:
+    """
+    Encoder for the records of a DBase III table, compiled once per table layout.
+    An encoder is chosen for each field type, and a struct.Struct packs the encoded fields, 
+    padded to their width (C values are truncated to it), into the fixed width record in a single call.
+    Numbers wider than their field and invalid dates raise ValueError.
+    """
+
+    true_values = RecordDecoder.true_values
+
+    def __init__(self, fields: List[DbaseField]):
+        """
+        Compiles the encoder for the given fields.
+
+        :param fields: List of DbaseField objects, in the order they appear in the record.
+        """
+
+        self.fields = fields
+        self.names = [field.name.strip('\x00').strip() for field in fields]
+        self.encoders = [self.encoder(field.type, field.length, field.decimal) for field in fields]
+        self.struct = struct.Struct('<c' + ''.join(f'{field.length}s' for field in fields))
+        self.record_size = self.struct.size
+
+    @classmethod
+    def encoder(cls, fieldtype: str, length: int, decimal: int = 0) -> Callable[[Any], bytes]:
+        """
+        Returns the function which converts a value into the raw bytes of a field of the given type.
+        None is encoded as a blank field.
+        """
+
+        blank = b' ' * length
+        if fieldtype == FieldType.CHARACTER.value:
+            def encode(value):
+                if value.__class__ is str:
+                    return value.encode('latin1')[:length].ljust(length, b' ')
+                return blank if value is None else str(value).encode('latin1')[:length].ljust(length, b' ')
+        elif fieldtype == FieldType.NUMERIC.value or fieldtype == FieldType.FLOAT.value:
+            number_format = f'%{length}.{decimal}f'.encode('latin1') if decimal else f'%{length}d'.encode('latin1')
+            number_types = (int, float) if decimal else (int,)
+            def encode(value):
+                if isinstance(value, number_types):
+                    raw = number_format % value
+                elif value is None:
+                    return blank
+                else:
+                    raw = str(value).encode('latin1').rjust(length, b' ')
+                if len(raw) > length:
+                    raise ValueError(f"DbaseFile: {value!r} doesn't fit in a numeric field of length {length}")
+                return raw
+        elif fieldtype == FieldType.DATE.value:
+            def encode(value):
+                if hasattr(value, 'year'):
+                    return b'%04d%02d%02d' % (value.year, value.month, value.day)
+                if value is None:
+                    return blank
+                text = str(value).strip().replace('-', '')
+                if not text:
+                    return blank
+                try:
+                    datetime.strptime(text, '%Y%m%d')
+                except ValueError:
+                    raise ValueError(f"DbaseFile: Invalid date {value!r}") from None
+                if len(text) != 8:
+                    raise ValueError(f"DbaseFile: Invalid date {value!r}")
+                return text.encode('latin1')
+        elif fieldtype == FieldType.LOGICAL.value:
+            true_values = cls.true_values + RecordDecoder.true_bytes
+            def encode(value):
+                if value is None:
+                    return b' '
+                if isinstance(value, (str, bytes)):
+                    return b'T' if value.strip()[:1] in true_values else b'F'
+                return b'T' if value else b'F'
+        else:
+            def encode(value):
+                raise ValueError(f"DbaseFile: Unknown field type {fieldtype}")
+        return encode
+
+    def encode(self, values, deleted: bool = False) -> bytes:
+        """
+        Returns the raw bytes of a record (deletion flag included) holding the given field values, in field order.
+        """
+
+        if len(values) != len(self.encoders):
+            raise ValueError("DbaseFile: Wrong number of fields")
+        return self.struct.pack(b'*' if deleted else b' ', 
+                                *[encode(value) for encode, value in zip(self.encoders, values)])
+
+    def encode_into(self, buffer: bytearray, offset: int, values, deleted: bool = False):
+        """
+        Same as encode(), but packs the record into 'buffer' at 'offset', 
+        so that a single preallocated buffer can be reused for many records.
+        """
+
+        if len(values) != len(self.encoders):
+            raise ValueError("DbaseFile: Wrong number of fields")
+        self.struct.pack_into(buffer, offset, b'*' if deleted else b' ', 
+                              *[encode(value) for encode, value in zip(self.encoders, values)])
+
+    def encode_record(self, record) -> bytes:
+        """
+        Returns the raw bytes of a record given as a mapping of field names to values, 
+        such as a Record or a Row, its 'deleted' entry giving the deletion flag.
+        """
+
+        return self.encode([record[name] for name in self.names], bool(record.get('deleted')))
+
+
+class IndexBuild:
+    """
+    Handle of an index build started by DbaseFile.make_mdx() or DbaseFile.update_mdx(),
+    which runs in a background thread. join() waits for the indexes to be ready.
+    """
+
+    def __init__(self, target: Callable, names: List[str]):
+        """
+        Starts the build.
+
+        :param target: Callable doing the build.
+        :param names: Names of the indexes being built.
+        """
+
+        self.names = names
+        self.error = None
+        self._thread = Thread(target=self._run, args=(target,), daemon=True)
+        self._thread.start()
+
+    def _run(self, target: Callable):
+        try:
+            target()
+        except BaseException as error:
+            self.error = error
+
+    def join(self, timeout: float = None) -> bool:
+        """
+        Waits for the build to finish, at most 'timeout' seconds if given.
+        Returns True if the build finished, raising the exception the build failed with, if any.
+        """
+
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+    wait = join
+
+    def done(self) -> bool:
+        """
+        Returns True if the build finished, successfully or not.
+        """
+
+        return not self._thread.is_alive()
+
+    def __repr__(self):
+        return f"IndexBuild({', '.join(self.names)}: {'done' if self.done() else 'running'})"
+
+
 class DbaseFile:
     """
     Class to manipulate DBase III database files (read and write).
@@ -264,11 +928,16 @@ class DbaseFile:
         create(filename: str, fields: List[Tuple[str, str, int, int]]) -> DbaseFile
         import_from(filename:str, tablename:str=None, stype:str='sqlite3', exportname:str=None) -> DbaseFile
         export_to(desttype:str='sqlite3', filename:str=None) -> bool
-        __init__(filename: str)
+        __init__(filename: str, block_size:int=None, mmap:bool=False, readonly:bool=False, compact:bool=False, prefetch:int=0)
         __del__()
         __len__() -> int
         __getitem__(key) -> Record
         __iter__() -> Generator[Record, None, None]
+        scan(start:int=0, stop:int=None, block_size:int=None, lazy:bool=False, compact:bool=None, prefetch:int=None) -> Generator[Record, None, None]
+        column(name:str, start:int=0, stop:int=None) -> array|list|bytes
+        columns(names:List[str], start:int=0, stop:int=None) -> SmartDict
+        as_numpy(memmap:bool=True) -> numpy.ndarray
+        to_numpy(fields:List[str]=None, memmap:bool=True) -> numpy.ndarray
         __str__() -> str
         _init()
         _load_mdx()
@@ -284,17 +953,31 @@ class DbaseFile:
         tmax_field_lengths() -> List[int]
         commit(filename:str=None) -> Tuple[bool, int]
         pack(filename:str=None) -> Tuple[bool, int]
-        add_record(*data)
+        add_record(*data, reuse:bool=None)
+        add_records(records, batch_size:int=1000, reuse:bool=None) -> int
         del_record(key, value=True)
+        begin()
+        commit_transaction()
+        rollback()
+        transaction() -> context manager
         update_record(key, record)
-        get_record(key) -> Record
+        deleted_count -> int
+        get_record(key, lazy:bool=False, compact:bool=None) -> Record
         get_field(fieldname) -> DbaseField
         search(fieldname, value, start=0, funcname="", compare_function=None)
-        update_mdx()
+        find_many(fieldname, values) -> List[Record]
+        make_mdx(fieldname="*", kind="sorted") -> IndexBuild  # fieldname may be a list of fields
+        update_mdx() -> IndexBuild
+        attach_index(path:str) -> List[str]  # native .ndx, .ntx or .mdx index files
     """
 
     import_types = ['sqlite3', 'sqlite', 'csv']
     export_types = ['sqlite3', 'sqlite', 'csv']
+    block_size = 2 * 1024 * 1024  # bytes read at once by sequential scans
+    mdx_log_limit = 10000  # index changes appended to an index file before it's saved whole again
+    mdx_workers = None  # worker processes building indexes (see make_mdx()), one per CPU if None
+    mdx_partition_size = 500000  # records scanned by each worker of an index build
+    fsync_policies = ('full', 'normal', 'off')
 
     @staticmethod
     def istartswith(f: str, v: str) -> bool:
@@ -399,8 +1082,7 @@ class DbaseFile:
             dbfname = exportname or filename.replace('sqlite', 'dbf')
             dbf = cls.create(dbfname, fields)
             curr = conn.execute(f"SELECT * FROM {tablename};")
-            for row in curr.fetchall():
-                dbf.add_record(*row)
+            dbf.add_records(curr)
             return dbf
 
         elif srctype == 'csv':
@@ -437,10 +1119,7 @@ class DbaseFile:
                             dbFields.append((header, ftype, len(value) * 3, 0))
                 dbfname = exportname or filename.replace('csv', 'dbf')
                 dbf = cls.create(dbfname, dbFields)
-                dbf.add_record(*values)
-                for line in file.readlines():
-                    values = line.strip().split(',')
-                    dbf.add_record(*values)
+                dbf.add_records(chain([values], (line.strip().split(',') for line in file)))
                 return dbf
             return False
         
@@ -476,26 +1155,105 @@ class DbaseFile:
                     file.write(line + "\n")
                 return True
 
-    def __init__(self, filename):
+    def __init__(self, filename, block_size:int=None, mmap:bool=False, readonly:bool=False, compact:bool=False,
+                 prefetch:int=0, journal:bool=False, fsync:str='normal', autovacuum:float=None,
+                 reuse_deleted:bool=False):
         """
         Initializes an instance of DBase3.
 
         :param filename: Name of the database file.
-        """
-
+        :param block_size: Number of bytes read at once by sequential scans. Defaults to DbaseFile.block_size.
+        :param mmap: If True, records are read from a memory mapped view of the file instead of 
+                     seeking and reading, so that processes opening the same file share the page cache.
+        :param readonly: If True, the file is opened read-only and any attempt to modify it raises PermissionError.
+        :param compact: If True, records are returned as compact Row objects (see make_row_class) 
+                        instead of Record objects by default.
+        :param prefetch: If greater than 0, sequential scans read that many blocks ahead of the records
+                         being decoded, in a background thread, overlapping I/O latency with decoding.
+        :param journal: If True, every write is done within a transaction backed by a journal file 
+                        (<table>.pjnl) holding what's needed to undo it, so that a write interrupted 
+                        by a crash is rolled back the next time the table is opened (not read only).
+                        The journal is locked while the transaction is active, so that it's only
+                        rolled back once no one holds it.
+        :param fsync: When the journal and the table are synced to disk: 'normal' (when a transaction 
+                      begins and commits, and the journal before a record is first overwritten in place 
+                      within it, so that its original contents can be restored after a crash), 
+                      'full' (also the table after each record written) or 'off' (left to the OS).
+        :param autovacuum: If given, the table is packed after a SQL DELETE (or an update_record() marking
+                           a record as deleted) leaves more than this ratio (0 to 1) of its records deleted.
+        :param reuse_deleted: If True, new records fill the slots of records marked as deleted 
+                              before being appended (see add_records()).
+        """
+
+        if fsync not in self.fsync_policies:
+            raise ValueError(f"DbaseFile: fsync must be one of {', '.join(self.fsync_policies)}")
         self.lock = Lock()
+        self._mdx_lock = Lock()
+        self._builds = []
+        if block_size:
+            self.block_size = block_size
+        self.mmap = mmap
+        self.readonly = readonly
+        self.compact = compact
+        self.prefetch = prefetch
+        self.journal = journal
+        self.fsync = fsync
+        self.autovacuum = autovacuum
+        self.reuse_deleted = reuse_deleted
+        self._transaction = None
+        self._map = None
         self.filename = filename
+        rebuild = self._recover_journal()
         self.filesize = os.path.getsize(filename)
-        self.file = open(filename, 'r+b')
+        self.file = open(filename, 'rb' if readonly else 'r+b')
 
         self. _init()
+        if rebuild:
+            # The crash interrupted the update of these indexes, whose files were removed
+            self._start_build([(name, name.split('+'), kind) for name, kind in rebuild]).join()
+
+    def __getstate__(self):
+        """
+        Pickles the table as its file name and options, so that worker processes (see make_mdx()) 
+        can open their own handle of the file.
+        """
+
+        return {'filename': self.filename, 'block_size': self.block_size, 'mmap': self.mmap}
+
+    def __setstate__(self, state):
+        """
+        Opens the pickled table read only, without recovering its journal, which is left to the 
+        process that pickled it.
+        """
+
+        self.lock = Lock()
+        self._mdx_lock = Lock()
+        self._builds = []
+        self.block_size = state['block_size']
+        self.mmap = state['mmap']
+        self.readonly = True
+        self.compact = False
+        self.prefetch = 0
+        self.journal = False
+        self.fsync = 'off'
+        self.autovacuum = None
+        self.reuse_deleted = False
+        self._transaction = None
+        self._map = None
+        self.filename = state['filename']
+        self.filesize = os.path.getsize(self.filename)
+        self.file = open(self.filename, 'rb')
+        self._init()
 
     def __del__(self):
         """
         Closes the database file when the instance is destroyed.
         """
 
-        self.file.close()
+        if getattr(self, '_map', None):
+            self._map.close()
+        if getattr(self, 'file', None):
+            self.file.close()
 
     def __len__(self):
         """
@@ -531,6 +1289,8 @@ class DbaseFile:
             if stop > self.header.records:
                 stop = self.header.records
 
+            if step == 1:
+                return list(self.scan(start, stop))
             return [self.get_record(i) for i in range(start, stop, step)]
         else:
             if -self.header.records > key or key >= self.header.records:
@@ -545,8 +1305,7 @@ class DbaseFile:
         allowing notation like 'for record in dbf'.
         """
 
-        self.file.seek(self.header.header_size)
-        return iter(self.get_record(i) for i in range(self.header.records))
+        return self.scan()
         
     def __str__(self):
         """
@@ -575,6 +1334,8 @@ class DbaseFile:
         self.datasize = 0
         self.indexes = {}
         self.indexhits = 0
+        self._deleted = None
+        self._free = None
         self.tablename = os.path.basename(self.filename).split('.')[0]
         self.header = DbaseHeader()
         self.file.seek(0)
@@ -597,26 +1358,552 @@ class DbaseFile:
                 # raise ValueError(f"DbaseFile:  File size mismatch: expected {self.header.header_size + self.datasize + 1}, got {self.filesize}")
                 os.sys.stderr.write(f"File size mismatch: expected {self.header.header_size + self.datasize + 1}, got {self.filesize}\n")
                 os.sys.stderr.flush()
+        self.decoder = RecordDecoder(self.fields, self.tablename, self.header.header_size, self.header.record_size)
+        self.encoder = RecordEncoder(self.fields)
+        if self.mmap:
+            self._remap()
         self._load_mdx()
 
+    def _remap(self):
+        """
+        (Re)creates the memory mapped view of the file, e.g. after it has grown or has been replaced.
+        The previous map is not closed explicitly, since running scans may still hold it.
+        """
+
+        self._map = memmap(self.file.fileno(), 0, access=ACCESS_READ)
+
+    def _check_writable(self):
+        """
+        Raises PermissionError if the file was opened read-only.
+        Meant for internal use only.
+        """
+
+        if self.readonly:
+            raise PermissionError(f"DbaseFile: {self.filename} is opened read-only")
+
+    def _write_header(self):
+        """
+        Stamps the header with the current date and writes it to disk, 
+        unless a transaction is active, in which case it is written when the transaction is committed.
+        Meant for internal use only.
+        """
+
+        hoy = datetime.now()
+        self.header.year = hoy.year - (2000 if hoy.year > 2000 else 1900)
+        self.header.month = hoy.month
+        self.header.day = hoy.day
+        self.datasize = self.header.record_size * self.header.records
+        if self._transaction is None:
+            with self.lock:
+                self.file.seek(0)
+                self.file.write(self.header.to_bytes())
+
+    def _flush(self):
+        """
+        Flushes pending writes to disk, unless a transaction is active 
+        (except in mmap mode, where reads go through the mapped file and must see the writes).
+        Meant for internal use only.
+        """
+
+        if self._transaction is None or self.mmap:
+            self.file.flush()
+
+    @property
+    def in_transaction(self) -> bool:
+        """
+        Returns True if a transaction is active.
+        """
+
+        return self._transaction is not None
+
+    def begin(self):
+        """
+        Starts a transaction. Until commit_transaction() (or rollback()) is called, header updates, 
+        flushes and index maintenance are deferred, and the original contents of the records 
+        overwritten are kept, so that rollback() can restore the table to its current state.
+        """
+
+        self._check_writable()
+        if self._transaction is not None:
+            raise ValueError("DbaseFile: A transaction is already active")
+        self.file.flush()
+        end = self.header.header_size + self.header.records * self.header.record_size
+        with self.lock:
+            self.file.seek(end)
+            tail = self.file.read()
+        self._transaction = SmartDict(header=self.header.to_bytes(), records=self.header.records, 
+                                      tail=tail, undo={}, modified=set(), pack=False, journal=None)
+        if self.journal:
+            path = self._journal_path()
+            while True:
+                # The journal stays locked while the transaction is active, so that opening the table
+                # elsewhere doesn't take it for the journal of a crashed one (see _recover_journal())
+                journal = open(path, 'a+b')
+                _lock_file(journal)
+                if os.path.exists(path) and os.path.samestat(os.fstat(journal.fileno()), os.stat(path)):
+                    break
+                journal.close()
+            journal.truncate(0)
+            pickle.dump(SmartDict(header=self._transaction['header'], tail=tail), journal)
+            self._sync(journal, 'normal')
+            self._transaction['journal'] = journal
+
+    def _sync(self, file, level:str='normal'):
+        """
+        Flushes 'file' and, unless the fsync policy is less strict than 'level', syncs it to disk.
+        Meant for internal use only.
+        """
+
+        file.flush()
+        if self.fsync_policies.index(self.fsync) <= self.fsync_policies.index(level):
+            os.fsync(file.fileno())
+
+    def _end_journal(self, transaction):
+        """
+        Syncs the table and removes the journal of a transaction that ended: 
+        from then on, there's nothing to roll back. Meant for internal use only.
+        """
+
+        journal = transaction['journal']
+        if journal is None:
+            return
+        self._sync(self.file, 'normal')
+        if fcntl is not None:
+            # Removed while still locked, so that no one opening the table rolls it back
+            os.remove(journal.name)
+            journal.close()
+        else:
+            # Windows can't remove an open file
+            journal.close()
+            os.remove(journal.name)
+
+    def _journal_path(self) -> str:
+        """
+        Returns the path of the journal file of the table (dbfname.pjnl). Meant for internal use only.
+        """
+
+        return os.path.splitext(self.filename)[0] + '.pjnl'
+
+    def _recover_journal(self):
+        """
+        Rolls back the transaction left unfinished in the journal file (<table>.pjnl), if there is one,
+        restoring the records it overwrote, the original header and the original end of the table.
+        A journal locked by an active transaction, elsewhere, and a file that doesn't hold a journal 
+        are left alone, as is the table if it's opened read only. A journal whose first entry is 
+        empty or cut short belongs to a transaction that hadn't started changing the table, and is removed.
+        The index files the transaction was updating when it was interrupted are removed too, and
+        returned as a list of (name, kind), to be built again. Meant for internal use only.
+        """
+
+        jnlfile = self._journal_path()
+        try:
+            journal = open(jnlfile, 'rb')
+        except FileNotFoundError:
+            return []
+        with journal:
+            if not _lock_file(journal, blocking=False):
+                return []
+            try:
+                if not os.path.samestat(os.fstat(journal.fileno()), os.stat(jnlfile)):
+                    return []
+            except FileNotFoundError:
+                # Removed by the transaction that held it, which ended
+                return []
+            journal.seek(0)
+            try:
+                start = pickle.load(journal)
+            except (EOFError, pickle.UnpicklingError) as error:
+                journal.seek(0)
+                if isinstance(error, EOFError) or journal.read(1) == pickle.PROTO:
+                    # Created, or cut short while being written, by a transaction beginning:
+                    # the table wasn't changed yet (begin() retries if the file is removed before it locks it)
+                    if not self.readonly:
+                        os.remove(jnlfile)
+                    return []
+                start = None
+            except Exception:
+                start = None
+            if not isinstance(start, dict) or 'header' not in start or 'tail' not in start:
+                os.sys.stderr.write(f"DbaseFile: {jnlfile} is not a journal, left as it is\n")
+                os.sys.stderr.flush()
+                return []
+            undo, rebuild = [], []
+            while True:
+                try:
+                    entry = pickle.load(journal)
+                except Exception:
+                    break
+                if entry[0] == 'indexes':
+                    rebuild = entry[1]
+                else:
+                    undo.append(entry)
+            try:
+                if self.readonly:
+                    raise PermissionError(self.filename)
+                file = open(self.filename, 'r+b')
+            except PermissionError:
+                os.sys.stderr.write(f"DbaseFile: Can't roll back the unfinished transaction in {jnlfile}\n")
+                os.sys.stderr.flush()
+                return []
+            self._rollback_journal(file, start, undo)
+            for name, _ in rebuild:
+                if os.path.exists(self._index_path(name)):
+                    os.remove(self._index_path(name))
+            os.remove(jnlfile)
+            return rebuild
+
+    @staticmethod
+    def _rollback_journal(file, start, undo):
+        """
+        Writes back to the table 'file' the records, header and end of the table saved in a journal.
+        Meant for internal use only.
+        """
+
+        with file:
+            header = DbaseHeader()
+            header.load_bytes(start['header'][:32])
+            for key, raw in undo:
+                file.seek(header.header_size + key * header.record_size)
+                file.write(raw)
+            end = header.header_size + header.records * header.record_size
+            file.seek(end)
+            file.write(start['tail'])
+            file.truncate(end + len(start['tail']))
+            file.seek(0)
+            file.write(start['header'])
+            file.flush()
+            os.fsync(file.fileno())
+
+    @property
+    def deleted_count(self) -> int:
+        """
+        Returns the number of records marked as deleted. 
+        Counted once from the deletion flags, then kept up to date by save_record().
+        """
+
+        if self._deleted is None:
+            self._deleted = sum(self.column('deleted'))
+        return self._deleted
+
+    def _autovacuum(self):
+        """
+        Packs the table if the ratio of deleted records went above the 'autovacuum' ratio.
+        Meant for internal use only.
+        """
+
+        if self.autovacuum is not None and self.header.records:
+            if self.deleted_count / self.header.records > self.autovacuum:
+                self._pack()
+
+    def _pack(self):
+        """
+        Packs the table (see commit()) right away, or when the active transaction is committed.
+        Meant for internal use only.
+        """
+
+        if self._transaction is None:
+            self.commit()
+        else:
+            self._transaction['pack'] = True
+
+    def _save_undo(self, key):
+        """
+        Keeps the original raw bytes of the record at 'key' the first time it's overwritten 
+        within a transaction. Meant for internal use only.
+        """
+
+        transaction = self._transaction
+        if transaction is None:
+            return
+        if key < transaction['records'] and key not in transaction['undo']:
+            with self.lock:
+                self.file.seek(self.header.header_size + key * self.header.record_size)
+                transaction['undo'][key] = raw = self.file.read(self.header.record_size)
+            journal = transaction['journal']
+            if journal is not None:
+                # On disk before the record is overwritten, or a crash could leave it unrestorable
+                pickle.dump((key, raw), journal)
+                self._sync(journal, 'normal')
+        transaction['modified'].add(key)
+
+    def commit_transaction(self):
+        """
+        Ends the active transaction, writing the header, flushing the file and 
+        updating the indexes once for all the changes made within it.
+        """
+
+        transaction = self._transaction
+        if transaction is None:
+            return
+        self._transaction = None
+        self._write_header()
+        self.file.flush()
+        if self.mmap:
+            self._remap()
+        with self._mdx_lock:
+            if self.indexes:
+                ops = []
+                for key in sorted(transaction['modified']):
+                    if key < transaction['records']:
+                        ops.extend(self._reindex(key, transaction['undo'][key], self._read_raw(key)))
+                for key in range(transaction['records'], self.header.records):
+                    ops.extend(self._reindex(key, None, self._read_raw(key)))
+                journal = transaction['journal']
+                if ops and journal is not None:
+                    # Written before the index files are changed, so that a crash from then on
+                    # gets them built again when the transaction is rolled back (see _recover_journal())
+                    names = sorted({fieldname for _, fieldname, _, _ in ops if fieldname in self.indexes})
+                    pickle.dump(('indexes', [(name, self.indexes[name].kind) for name in names]), journal)
+                    self._sync(journal, 'normal')
+                self._log_mdx(ops)
+        self._end_journal(transaction)
+        if transaction['pack']:
+            # After the indexes got the changes, since packing renumbers them
+            self.commit()
+
+    def rollback(self):
+        """
+        Ends the active transaction, restoring the table to its state when the transaction began:
+        records overwritten get their original contents back, records added are truncated away
+        and the original header is rewritten.
+        """
+
+        transaction = self._transaction
+        if transaction is None:
+            return
+        with self._mdx_lock, self.lock:
+            self._transaction = None
+            for key, raw in transaction['undo'].items():
+                self.file.seek(self.header.header_size + key * self.header.record_size)
+                self.file.write(raw)
+            self.header.load_bytes(transaction['header'])
+            end = self.header.header_size + self.header.records * self.header.record_size
+            self.file.seek(end)
+            self.file.write(transaction['tail'])
+            self.file.truncate(end + len(transaction['tail']))
+            self.file.seek(0)
+            self.file.write(transaction['header'])
+            self.file.flush()
+        self._end_journal(transaction)
+        self._deleted = None
+        self._free = None
+        self.filesize = end + len(transaction['tail'])
+        self.datasize = self.header.record_size * self.header.records
+        if self.mmap:
+            self._remap()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Context manager wrapping a block of changes in a transaction:
+        committed on normal exit, rolled back if an exception is raised.
+
+            with dbf.transaction():
+                dbf.add_record(...)
+                dbf.update_record(...)
+        """
+
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        else:
+            self.commit_transaction()
+
+    def _read_raw(self, key) -> bytes:
+        """
+        Returns the raw bytes of the record at 'key'. Meant for internal use only.
+        """
+
+        offset = self.header.header_size + key * self.header.record_size
+        if self.mmap and offset + self.header.record_size <= len(self._map):
+            self.file.flush()
+            return self._map[offset:offset + self.header.record_size]
+        with self.lock:
+            self.file.seek(offset)
+            return self.file.read(self.header.record_size)
+
+    def _apply_mdx(self, ops):
+        """
+        Applies a list of index changes, as returned by _reindex(). 
+        Native indexes (see attach_index()) are read only, so each one changed is converted 
+        to an index file of the field first. Meant for internal use only.
+        """
+
+        converted = set()
+        for fieldname in {fieldname for _, fieldname, _, _ in ops}:
+            index = self.indexes.get(fieldname)
+            if getattr(index, 'native', False):
+                changed = {key for _, name, _, key in ops if name == fieldname}
+                self.indexes[fieldname] = self._convert_native(fieldname, index, changed)
+                converted.add(fieldname)
+        for op, fieldname, value, key in ops:
+            index = self.indexes.get(fieldname)
+            if index is None or (op == '-' and fieldname in converted):
+                continue
+            if op == '+':
+                index.add(value, key)
+            else:
+                index.remove(value, key)
+
+    def _convert_native(self, fieldname, index, changed) -> FieldIndex:
+        """
+        Writes the index file of a field from its native index, and closes the latter.
+        The table already holds the changes to the records in 'changed', which the native index doesn't,
+        so those records are left out, to be added back by the changes themselves, along with 
+        the records marked as deleted, which native indexes hold and index files don't.
+        Meant for internal use only.
+        """
+
+        deleted = self.columns(['deleted'])['deleted']
+        values = {}
+        for value, keys in index.items():
+            keys = [key for key in keys if key not in changed and key < len(deleted) and not deleted[key]]
+            if keys:
+                values.setdefault(value, []).extend(keys)
+        index.close()
+        return self._build_index(fieldname, values, index.kind)
+
+    def _reindex(self, key, old=None, new=None):
+        """
+        Updates every index for the record at 'key', whose raw bytes change from 'old' to 'new'
+        (None for a record being added or removed). Deleted records are not indexed, so deleting 
+        a record removes it from the indexes. 
+        Returns the list of changes made, as ('+' or '-', fieldname, value, key) tuples,
+        the values of composite indexes (fieldname being field1+field2) being tuples.
+        Meant for internal use only.
+        """
+
+        if old is not None and old[:1] == b'*':
+            old = None
+        if new is not None and new[:1] == b'*':
+            new = None
+        decode_field = self.decoder.decode_field
+
+        def decode(raw, fieldname):
+            if '+' not in fieldname:
+                return decode_field(raw, fieldname)
+            return tuple(decode_field(raw, name) for name in fieldname.split('+'))
+
+        ops = []
+        for fieldname in self.indexes:
+            before = decode(old, fieldname) if old is not None else None
+            after = decode(new, fieldname) if new is not None else None
+            if old is not None and new is not None and before == after:
+                continue
+            if old is not None:
+                ops.append(('-', fieldname, before, key))
+            if new is not None:
+                ops.append(('+', fieldname, after, key))
+        self._apply_mdx(ops)
+        return ops
+
+    def _index_path(self, fieldname:str) -> str:
+        """
+        Returns the path of the index file of a field (dbfname.fieldname.pidx), 
+        or of a composite index, named after its fields joined by '+' (dbfname.field1+field2.pidx).
+        """
+
+        return f"{os.path.splitext(self.filename)[0]}.{fieldname}.pidx"
+
     def _load_mdx(self):
         """
-        Loads the MDX (.pmdx) index file, if it exists.
+        Opens the index files (dbfname.fieldname.pidx) of the fields of the table, if they exist,
+        and those of its composite indexes (dbfname.field1+field2.pidx).
+        The tags of the production index of the table (dbfname.mdx), if it has one, are attached
+        for the fields without an index file (see attach_index()), unless it can't be read, which is reported on stderr.
+        An index file in the former pickled format (dbfname.pmdx) is converted.
         """
 
-        mdxfile = self.filename.replace('.dbf', '.pmdx')
-        if os.path.exists(mdxfile):
+        for field in self.fields:
+            path = self._index_path(field.name)
+            if os.path.exists(path):
+                self.indexes[field.name] = open_index(path)
+        directory, stem = os.path.split(os.path.splitext(self.filename)[0])
+        for entry in sorted(os.listdir(directory or '.')):
+            name = entry[len(stem) + 1:-len('.pidx')]
+            if (entry.startswith(stem + '.') and entry.endswith('.pidx') and '+' in name and 
+                all(part in self.field_names for part in name.split('+'))):
+                self.indexes[name] = open_index(os.path.join(directory, entry))
+        base = os.path.splitext(self.filename)[0]
+        for production in (base + '.mdx', base + '.MDX'):
+            if os.path.exists(production):
+                try:
+                    self.attach_index(production)
+                except (ValueError, OSError, struct.error) as error:
+                    # A production index that can't be read doesn't keep the table from opening
+                    os.sys.stderr.write(f"DbaseFile: Production index {production} not attached: {error}\n")
+                    os.sys.stderr.flush()
+                break
+        mdxfile = os.path.splitext(self.filename)[0] + '.pmdx'
+        if os.path.exists(mdxfile) and not self.readonly:
             with open(mdxfile, 'rb') as file:
-                self.indexes = pickle.load(file)
+                indexes = pickle.load(file)
+                while True:
+                    try:
+                        ops = pickle.load(file)
+                    except (EOFError, pickle.UnpicklingError):
+                        break
+                    for op, fieldname, value, key in ops:
+                        keys = indexes.get(fieldname, {}).setdefault(value, [])
+                        if op == '+':
+                            insort(keys, key)
+                        elif key in keys:
+                            keys.remove(key)
+            for fieldname, index in indexes.items():
+                self.indexes[fieldname] = self._build_index(fieldname, index)
+            os.remove(mdxfile)
+
+    def _build_index(self, fieldname, index, kind='sorted') -> FieldIndex|BitmapIndex:
+        """
+        Writes the index file of a field from a dict mapping values to lists of record numbers, and opens it.
+        The keys are encoded as the type of the field, so that any value later stored in it fits,
+        and case folded for a 'casefold' index. 'fieldname' may name a composite index (field1+field2),
+        whose keys are tuples. A 'bitmap' index is written as a BitmapIndex. Meant for internal use only.
+        """
+
+        fields = [self.get_field(name) for name in fieldname.split('+')]
+        codecs = [KeyCodec.for_field(field.type, field.length, field.decimal) if field else None for field in fields]
+        if None in codecs:
+            codec = None
+        elif len(codecs) > 1:
+            codec = KeyCodec('T', parts=codecs)
+        else:
+            codec = codecs[0]
+        if kind == 'casefold' and codec is not None:
+            codec = KeyCodec('c', codec.width)
+        if kind == 'bitmap':
+            return BitmapIndex.build(self._index_path(fieldname), index, codec)
+        return FieldIndex.build(self._index_path(fieldname), index, codec)
 
     def _save_mdx(self):
         """
-        Saves the MDX index file (dbfname.pmdx).
+        Writes every index file whole again.
+        """
+
+        for index in list(self.indexes.values()):
+            if not getattr(index, 'native', False):
+                index.save()
+
+    def _log_mdx(self, ops):
+        """
+        Appends a list of index changes to the logs of the index files, instead of rewriting them whole.
+        Once more than 'mdx_log_limit' changes have been logged to an index file, it's saved whole again.
         """
 
-        mdxfile = self.filename.replace('.dbf', '.pmdx')
-        with open(mdxfile, 'wb') as file:
-            pickle.dump(self.indexes, file)
+        changes = {}
+        for op, fieldname, value, key in ops:
+            changes.setdefault(fieldname, []).append((op, value, key))
+        for fieldname, fieldchanges in changes.items():
+            index = self.indexes.get(fieldname)
+            if index is None:
+                continue
+            if index.logged + len(fieldchanges) > self.mdx_log_limit:
+                index.save()
+            else:
+                index.log(fieldchanges)
 
     @property
     def schema(self):
@@ -728,54 +2015,96 @@ class DbaseFile:
         If no filename is specified, the original file is overwritten.
         Skips records marked as deleted, thus effectively deleting them, 
         and adjusts the header accordingly.
-        """
-
-        numdeleted = 0
-        for record in self:
-            if record.get('deleted'):
-                numdeleted += 1
-        file = open('tmp.dbf', 'wb')
-        file.write(self.header.to_bytes())
-        for field in self.fields:
-            file.write(field.to_bytes())
-        file.write(b'\x0D')
-        for record in self:
-            if record['deleted']:    
-                # self.file.write(b'*')
-                continue
-            else:   
-                file.write(b' ')
-            for field in self.fields:
-                ftype = field.type
-                if ftype == 'C':
-                    file.write(record[field.name].ljust(field.length, ' ').encode('latin1'))
-                elif ftype == 'N' or ftype == 'F':
-                    file.write(str(record[field.name]).rjust(field.length, ' ').encode('latin1'))   
-                elif ftype == 'D':
-                    file.write(record[field.name].strftime('%Y%m%d').encode('latin1'))
-                elif ftype == 'L':
-                    file.write(b'T' if record[field.name] else b'F')
-                else:
-                    raise ValueError(f"DbaseFile: Unknown field type {field.type}")
-        file.write(b'\x1A')
-        self.header.records -= numdeleted
-        self.filesize -= numdeleted * self.header.record_size
-        self.datasize = self.header.record_size * self.header.records
-        file.seek(0)
-        file.write(self.header.to_bytes())
-        file.flush()
-        self.file.close()
-        if not filename:
-            filename = self.filename
-            os.remove(filename)
-        self.filename = filename
-        os.rename('tmp.dbf', self.filename)
+        The raw bytes of the remaining records are copied in a single pass to a temporary file 
+        next to the target, which then atomically replaces it. Indexes are renumbered, not rebuilt.
+        """
+
+        self._check_writable()
+        if self._transaction is not None:
+            raise ValueError("DbaseFile: Can't pack the table while a transaction is active")
+        # Packing renumbers the records: running index builds are let finish first
+        for build in list(self._builds):
+            build['handle']._thread.join()
+        target = filename or self.filename
+        header_size = self.header.header_size
+        record_size = self.header.record_size
+        remap = array('q') if self.indexes else None
+        kept = 0
+        self.file.flush()
+        with self.lock:
+            self.file.seek(0)
+            head = self.file.read(header_size)
+        fd, tmpname = tempfile.mkstemp(suffix='.dbf', dir=os.path.dirname(os.path.abspath(target)))
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(head)
+                # Single pass copying the raw bytes of the runs of non deleted records of each block
+                for index, count, buffer, pos in self._iter_blocks():
+                    flags = buffer[pos:pos + count * record_size:record_size]
+                    run = 0
+                    while run < count:
+                        deleted = flags.find(b'*', run)
+                        if deleted < 0:
+                            deleted = count
+                        if deleted > run:
+                            file.write(buffer[pos + run * record_size:pos + deleted * record_size])
+                            if remap is not None:
+                                remap.extend(range(kept, kept + deleted - run))
+                            kept += deleted - run
+                        if deleted < count and remap is not None:
+                            remap.append(-1)
+                        run = deleted + 1
+                file.write(b'\x1A')
+                header = DbaseHeader()
+                header.load_bytes(head[:32])
+                header.records = kept
+                hoy = datetime.now()
+                header.year = hoy.year - (2000 if hoy.year > 2000 else 1900)
+                header.month = hoy.month
+                header.day = hoy.day
+                file.seek(0)
+                file.write(header.to_bytes())
+                file.flush()
+                os.fsync(file.fileno())
+            os.chmod(tmpname, os.stat(self.filename).st_mode & 0o7777)
+            self.file.close()
+            self._map = None
+            os.replace(tmpname, target)
+        except BaseException:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            raise
+        indexes = None
+        if remap is not None:
+            indexes = {fieldname: self._remap_index(index, remap) for fieldname, index in self.indexes.items()}
+            kinds = {fieldname: index.kind for fieldname, index in self.indexes.items()}
+        for index in self.indexes.values():
+            index.close()
+        self.filename = target
+        self.filesize = os.path.getsize(target)
         self.file = open(self.filename, 'r+b')
-    
-        self. _init()
-        self.update_mdx() 
+        self._init()
+        if indexes is not None:
+            for index in self.indexes.values():
+                index.close()
+            self.indexes = {fieldname: self._build_index(fieldname, index, kinds[fieldname]) 
+                            for fieldname, index in indexes.items()}
         return True, self.header.records  
 
+    @staticmethod
+    def _remap_index(index, remap):
+        """
+        Returns a copy of 'index' with its record numbers translated through 'remap'
+        (old record number -> new record number, -1 for records removed). Meant for internal use only.
+        """
+
+        remapped = {}
+        for value, keys in index.items():
+            keys = [remap[key] for key in keys if key < len(remap) and remap[key] >= 0]
+            if keys:
+                remapped[value] = keys
+        return remapped
+
     def pack(self, filename=None):
         """Same as commit(). Included for compatibility with long lost dBase past."""
 
@@ -802,39 +2131,136 @@ class DbaseFile:
         if 0 > key >= self.header.records:  
             raise IndexError("Record index out of range")
 
-    def add_record(self, *data):
+    def add_record(self, *data, reuse:bool=None):
+        """
+        Adds a new record to the database.
+
+        :param record_data: SmartDictionary with the new record's data.
+        :param reuse: See add_records().
+        """
+
+        if self.journal:
+            self.add_records([data], reuse=reuse)
+        else:
+            # A single record is either written whole or not at all, with no transaction needed
+            self._check_writable()
+            self._add_records([data], 1, reuse)
+
+    def add_records(self, records, batch_size:int=1000, reuse:bool=None) -> int:
+        """
+        Adds many records to the database. Each batch of 'batch_size' records is encoded into a single 
+        reusable buffer and appended with one write, followed by one header update and one flush, and the 
+        indexes are updated with the new records instead of being rebuilt.
+
+        :param records: Iterable of sequences of field values, in field order.
+        :param batch_size: Number of records written at once.
+        :param reuse: If True (self.reuse_deleted if None), records are first written over the slots of 
+                      records marked as deleted, lowest first, and only appended once there are none left.
+        :returns: Number of records added.
+
+        Unless a transaction is active, the records are added in one, so that a record that can't be 
+        encoded (see RecordEncoder) rolls back those added before it and none is added.
+        """
+
+        self._check_writable()
+        if self._transaction is None:
+            with self.transaction():
+                return self._add_records(records, batch_size, reuse)
+        return self._add_records(records, batch_size, reuse)
+
+    def _add_records(self, records, batch_size:int, reuse:bool) -> int:
+        """
+        Does the work of add_records(). Meant for internal use only.
+        """
+
+        added = 0
+        if self.reuse_deleted if reuse is None else reuse:
+            added, records = self._fill_free_slots(iter(records))
+        record_size = self.header.record_size
+        encode_into = self.encoder.encode_into
+        batch_size = max(1, batch_size)
+        buffer = bytearray(b' ' * (batch_size * record_size))
+        count = 0
+        for data in records:
+            encode_into(buffer, count * record_size, data)
+            count += 1
+            if count >= batch_size:
+                self._append_batch(memoryview(buffer)[:count * record_size], count)
+                added += count
+                count = 0
+        if count:
+            self._append_batch(memoryview(buffer)[:count * record_size], count)
+            added += count
+        return added
+
+    def _fill_free_slots(self, records):
+        """
+        Writes records taken from the iterator 'records' over the slots of deleted records while there are any,
+        then returns how many were written and the iterator, to append the rest. Meant for internal use only.
+        """
+
+        filled = 0
+        for data in records:
+            key = self._next_free()
+            if key is None:
+                records = chain([data], records)
+                break
+            self._put_raw(key, self.encoder.encode(data))
+            filled += 1
+        if filled:
+            self._write_header()
+            self._flush()
+        return filled, records
+
+    def _next_free(self):
+        """
+        Returns the number of the lowest record marked as deleted, taking it off the list of free slots,
+        or None if there are none. The list is built from the deletion flags the first time it's needed,
+        then kept up to date by save_record(). Meant for internal use only.
+        """
+
+        if self._free is None:
+            deleted = self.column('deleted')
+            self._free = [key for key, flag in enumerate(deleted) if flag]
+            self._deleted = len(self._free)
+        while self._free:
+            key = heappop(self._free)
+            if key >= self.header.records:
+                continue
+            # Slots may have been reused or undeleted since they were listed
+            with self.lock:
+                self.file.seek(self.header.header_size + key * self.header.record_size)
+                if self.file.read(1) == b'*':
+                    return key
+        return None
+
+    def _append_batch(self, buffer:bytes|memoryview, count:int):
         """
-        Adds a new record to the database.
-
-        :param record_data: SmartDictionary with the new record's data.
+        Appends 'count' encoded records, held in 'buffer', to the file, 
+        then updates the header and the indexes once.
+        Meant for internal use only.
         """
 
-        if len(data) != len(self.fields):
-            raise ValueError("DbaseFile: Wrong number of fields")
-        value = b''
-        for field, val in zip(self.fields, data):
-            ftype = field.type
-            if ftype == 'C':
-                value += str(val).encode('latin1').ljust(field.length, b' ')
-            elif ftype == 'N' or ftype == 'F':
-                value += str(val).encode('latin1').rjust(field.length, b' ')
-            elif ftype == 'D':
-                value += val.strftime('%Y%m%d').encode('latin1')
-            elif ftype == 'L':
-                value = b'T' if val else b'F'
-        self.file.seek(self.filesize - 1)
-        self.file.write(b'\x20' + value + b'\x1A')
-        self.header.records += 1
-        self.filesize = self.header.header_size + self.header.record_size * self.header.records + 1
-        hoy = datetime.now()
-        self.header.year = hoy.year - (2000 if hoy.year > 2000 else 1900)
-        self.header.month = hoy.month
-        self.header.day = hoy.day
-        self.datasize = self.header.record_size * self.header.records
-        self.file.seek(0)
-        self.file.write(self.header.to_bytes())        
-        self.file.flush()
-        self.update_mdx()
+        with self._mdx_lock:
+            first = self.header.records
+            record_size = self.header.record_size
+            with self.lock:
+                self.file.seek(self.header.header_size + first * record_size)
+                self.file.write(buffer)
+                self.file.write(b'\x1A')
+            self.header.records += count
+            self.filesize = self.header.header_size + self.header.record_size * self.header.records + 1
+            self._write_header()
+            self._flush()
+            if self.mmap:
+                self._remap()
+            for build in self._builds:
+                build['changed'].update(range(first, first + count))
+            if self.indexes and self._transaction is None:
+                ops = []
+                for i in range(count):
+                    ops.extend(self._reindex(first + i, None, bytes(buffer[i * record_size:(i + 1) * record_size])))
+                self._log_mdx(ops)
 
     def del_record(self, key, value = True):
         """
@@ -846,8 +2272,6 @@ class DbaseFile:
         record = self.get_record(key)
         record['deleted'] = value
         self.save_record(key, record)
-        self.file.flush()
-        self.update_mdx()
 
     def update_record(self, key, record):
         """
@@ -858,67 +2282,380 @@ class DbaseFile:
         :raises IndexError: If the record index is out of range.
         """
 
+        self._check_writable()
         self._test_key(key)
+        self.save_record(key, record)
         if record.get('deleted'):
-            self.commit()
-        else:
-            self.save_record(key, record)
-            self.file.flush()
-            self.update_mdx()
+            self._autovacuum()
 
-    def get_record(self, key):
+    def get_record(self, key, lazy:bool=False, compact:bool=None):
         """
         Retrieves a record (dictionary with field names and field values) from the database.
         Used internally by the __getitem__ method.
+        If 'lazy' is True, a LazyRecord is returned, whose fields are decoded on first access.
+        If 'compact' is True (self.compact if None), a compact Row is returned.
         """
 
         self._test_key(key)
         offset = self.header.header_size + key * self.header.record_size
-        self.file.seek(offset)
-        rec_bytes = self.file.read(self.header.record_size)
+        if self.mmap:
+            if offset + self.header.record_size > len(self._map):
+                self._remap()
+            rec_bytes = self._map[offset:offset + self.header.record_size]
+        else:
+            with self.lock:
+                self.file.seek(offset)
+                rec_bytes = self.file.read(self.header.record_size)
         if len(rec_bytes) != self.header.record_size:
             err_msg = f"Error reading record {key}: expected {self.header.record_size} bytes, got {len(rec_bytes)}"
             os.sys.stderr.write(f"{err_msg}\n")
             os.sys.stderr.flush()
             return None
-        to_be_deleted = (rec_bytes[0] == 0x2A)
-        rec_bytes = rec_bytes[1:]
-        record = Record(deleted=to_be_deleted, metadata=SmartDict(offset=offset, index=key))
-        for field in self.fields:
-            fieldtype = field.type
-            fieldname = field.name.strip("\0x00").strip()
-            fieldcontent = rec_bytes[:field.length].decode('latin1').strip("\x00") .strip()
-            fieldcontent = fieldcontent.replace('\x00', ' ')
-            if fieldtype == 'C':
-                record[fieldname] = fieldcontent
-            elif fieldtype == 'N':
-                if fieldcontent == '':
-                    fieldcontent = 0
-                try: 
-                    record[fieldname] = int(fieldcontent)
-                except ValueError:
-                    try:
-                        record[fieldname] = float(fieldcontent)
-                    except:
-                        record[fieldname] = fieldcontent
-            elif fieldtype == 'F':
-                if fieldcontent == '':
-                    fieldcontent = 0
+        decode = self.decoder.decoder_for(lazy, self.compact if compact is None else compact)
+        return decode(rec_bytes, 0, key, offset)
+
+    def _iter_blocks(self, start=0, stop=None, block_size=None):
+        """
+        Yields tuples (index, count, buffer, pos) with consecutive blocks of raw records from 'start' to 'stop',
+        each block holding as many whole records as fit in 'block_size' bytes: 'count' records,
+        the first of them being the record at 'index', located at position 'pos' of 'buffer'.
+        In mmap mode the buffer is the mapped file itself, otherwise it is the bytes read for the block.
+        Meant for internal use only.
+        """
+
+        if stop is None or stop > self.header.records:
+            stop = self.header.records
+        record_size = self.header.record_size
+        per_block = max(1, (block_size or self.block_size) // record_size)
+        index = start
+        if self.mmap and index < stop:
+            if self.header.header_size + stop * record_size > len(self._map):
+                self._remap()
+            buffer = self._map
+            stop = min(stop, (len(buffer) - self.header.header_size) // record_size)
+            while index < stop:
+                count = min(per_block, stop - index)
+                yield index, count, buffer, self.header.header_size + index * record_size
+                index += count
+            return
+        while index < stop:
+            count = min(per_block, stop - index)
+            with self.lock:
+                self.file.seek(self.header.header_size + index * record_size)
+                buffer = self.file.read(count * record_size)
+            if len(buffer) != count * record_size:
+                complete = len(buffer) // record_size
+                err_msg = f"Error reading record {index + complete}: expected {record_size} bytes, got {len(buffer) % record_size}"
+                os.sys.stderr.write(f"{err_msg}\n")
+                os.sys.stderr.flush()
+                if complete:
+                    yield index, complete, buffer, 0
+                return
+            yield index, count, buffer, 0
+            index += count
+
+    def _prefetch_blocks(self, start=0, stop=None, block_size=None, depth=2):
+        """
+        Same as _iter_blocks(), but blocks are read by a background thread, through its own file handle,
+        up to 'depth' blocks ahead of the consumer. The thread stops as soon as the generator is
+        exhausted or closed (e.g. abandoned by find() after a hit).
+        Meant for internal use only.
+        """
+
+        if stop is None or stop > self.header.records:
+            stop = self.header.records
+        self.file.flush()
+        header_size = self.header.header_size
+        record_size = self.header.record_size
+        per_block = max(1, (block_size or self.block_size) // record_size)
+        blocks = Queue(maxsize=max(1, depth))
+        done = Event()
+
+        def put(item):
+            while not done.is_set():
                 try:
-                    record[fieldname] = float(fieldcontent)
-                except:
-                    record[fieldname] = fieldcontent
-            elif fieldtype == 'D':
+                    blocks.put(item, timeout=0.1)
+                    return
+                except Full:
+                    pass
+
+        def reader():
+            try:
+                with open(self.filename, 'rb') as file:
+                    index = start
+                    while index < stop and not done.is_set():
+                        count = min(per_block, stop - index)
+                        file.seek(header_size + index * record_size)
+                        buffer = file.read(count * record_size)
+                        if len(buffer) != count * record_size:
+                            complete = len(buffer) // record_size
+                            err_msg = f"Error reading record {index + complete}: expected {record_size} bytes, got {len(buffer) % record_size}"
+                            os.sys.stderr.write(f"{err_msg}\n")
+                            os.sys.stderr.flush()
+                            if complete:
+                                put((index, complete, buffer, 0))
+                            break
+                        put((index, count, buffer, 0))
+                        index += count
+            except Exception as exc:
+                put(exc)
+            finally:
+                put(None)
+
+        thread = Thread(target=reader, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = blocks.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            done.set()
+            thread.join()
+
+    def _blocks(self, start=0, stop=None, block_size=None, prefetch=None):
+        """
+        Returns the block generator for a sequential scan: _prefetch_blocks() if prefetching is 
+        enabled ('prefetch' blocks ahead, self.prefetch if None) and the file isn't memory mapped, 
+        _iter_blocks() otherwise.
+        Meant for internal use only.
+        """
+
+        prefetch = self.prefetch if prefetch is None else prefetch
+        if prefetch and not self.mmap:
+            return self._prefetch_blocks(start, stop, block_size, prefetch)
+        return self._iter_blocks(start, stop, block_size)
+
+    def scan(self, start=0, stop=None, block_size=None, lazy:bool=False, compact:bool=None, 
+             prefetch:int=None) -> Generator[Record, None, None]:
+        """
+        Returns a generator yielding the records from 'start' to 'stop', reading them 
+        from disk in blocks of 'block_size' bytes (self.block_size by default) instead of 
+        one record at a time. Used by __iter__ and every full table operation.
+        If 'lazy' is True, LazyRecord objects are yielded, which decode their fields on first access.
+        If 'compact' is True (self.compact if None), compact Row objects are yielded.
+        If 'prefetch' (self.prefetch if None) is greater than 0, blocks are read ahead by a background thread.
+        """
+
+        decode = self.decoder.decoder_for(lazy, self.compact if compact is None else compact)
+        header_size = self.header.header_size
+        record_size = self.header.record_size
+        for index, count, buffer, pos in self._blocks(start, stop, block_size, prefetch):
+            for pos in range(pos, pos + count * record_size, record_size):
+                yield decode(buffer, pos, index, header_size + index * record_size)
+                index += 1
+
+    def column(self, name:str, start=0, stop=None):
+        """
+        Returns the values of a single field for the records from 'start' to 'stop'.
+        See columns() for the type of container returned.
+        """
+
+        return self.columns([name], start, stop)[name]
+
+    def columns(self, names:List[str], start=0, stop=None) -> SmartDict:
+        """
+        Reads the values of the given fields for the records from 'start' to 'stop' (deleted ones included,
+        so that position i holds the value of record start + i), straight from block reads 
+        and without building Record objects.
+        
+        :param names: Field names (or aliases). 'deleted' stands for the deletion flag.
+        :returns: SmartDict mapping each name to a compact container:
+                  array('q') for N fields without decimals, array('d') for F fields and N fields with decimals
+                  (falling back to array('d') if a value is not integral, with NaN for unparseable values),
+                  list of str for C fields, list of datetime for D fields, and bytes (1 for True, 0 for False) 
+                  for L fields and the deletion flag.
+        """
+
+        keys = []
+        for name in names:
+            if name == 'deleted':
+                keys.append(name)
+                continue
+            field = self.get_field(name)
+            if not field:
+                raise ValueError(f"DbaseFile: Field {name} not found")
+            keys.append(field.name.strip())
+        order = sorted(set(keys), key=lambda k: -1 if k == 'deleted' else self.decoder.positions[k])
+        unpacker = self.decoder.column_struct(order, self.header.record_size) if order else None
+        builders = {}
+        for key in order:
+            ftype = 'L' if key == 'deleted' else self.get_field(key).type
+            if ftype == FieldType.NUMERIC.value and self.get_field(key).decimal == 0:
+                builders[key] = (array('q'), self.decoder.decode_numeric)
+            elif ftype in (FieldType.NUMERIC.value, FieldType.FLOAT.value):
+                builders[key] = (array('d'), self.decoder.decode_float)
+            elif ftype == FieldType.LOGICAL.value:
+                builders[key] = (bytearray(), (lambda raw: raw == b'*') if key == 'deleted' else self.decoder.decode_logical)
+            else:
+                builders[key] = ([], self.decoder.converter(ftype))
+
+        for _, count, buffer, pos in self._blocks(start, stop) if order else ():
+            with memoryview(buffer) as view:
+                raws = list(zip(*unpacker.iter_unpack(view[pos:pos + count * self.header.record_size])))
+            for key, raw in zip(order, raws):
+                container, convert = builders[key]
+                values = [convert(value) for value in raw]
                 try:
-                    record[fieldname] = datetime.strptime(fieldcontent, '%Y%m%d')
-                except:
-                    record[fieldname] = fieldcontent
-            elif fieldtype == 'L':
-                record[fieldname] = fieldcontent in ['T', 't', 'Y', 'y']
+                    container.extend(values)
+                except TypeError:
+                    values = [self._as_float(value) for value in values]
+                    if container.typecode == 'q':
+                        container = array('d', container)
+                        builders[key] = (container, convert)
+                    container.extend(values)
+
+        result = SmartDict()
+        for name, key in zip(names, keys):
+            container = builders[key][0]
+            result[name] = bytes(container) if isinstance(container, bytearray) else container
+        return result
+
+    @staticmethod
+    def _as_float(value):
+        """
+        Converts a decoded numeric value into a float, NaN if it can't be converted.
+        Meant for internal use only.
+        """
+
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return float('nan')
+
+    @staticmethod
+    def _numpy():
+        """
+        Imports NumPy, which is an optional dependency only needed by the NumPy views.
+        Meant for internal use only.
+        """
+
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("DbaseFile: NumPy is required for this method. Install it with 'pip install numpy'.")
+        return numpy
+
+    @property
+    def numpy_dtype(self):
+        """
+        Returns the NumPy structured dtype of a record: the deletion flag ('deleted', S1)
+        followed by one S<length> sub-field per field, spanning the whole record size.
+        """
+
+        np = self._numpy()
+        return np.dtype({'names': ['deleted'] + self.decoder.names,
+                         'formats': ['S1'] + [f'S{field.length}' for field in self.fields],
+                         'offsets': [0] + self.decoder.offsets,
+                         'itemsize': self.header.record_size})
+
+    def as_numpy(self, memmap:bool=True):
+        """
+        Returns the record area as a NumPy structured array of raw bytes (see numpy_dtype).
+        
+        :param memmap: If True (default) a read-only numpy.memmap over the file is returned, 
+                       otherwise the records are read (or taken from the mapped file in mmap mode) into memory.
+        """
+
+        np = self._numpy()
+        dtype = self.numpy_dtype
+        count = min(self.header.records, max(0, os.path.getsize(self.filename) - self.header.header_size) // self.header.record_size)
+        if not count:
+            return np.zeros(0, dtype=dtype)
+        if memmap:
+            return np.memmap(self.filename, dtype=dtype, mode='r', offset=self.header.header_size, shape=(count,))
+        if self.mmap:
+            return np.frombuffer(self._map, dtype=dtype, count=count, offset=self.header.header_size).copy()
+        with self.lock:
+            self.file.seek(self.header.header_size)
+            return np.frombuffer(self.file.read(count * self.header.record_size), dtype=dtype, count=count)
+
+    def to_numpy(self, fields:List[str]=None, memmap:bool=True):
+        """
+        Returns a NumPy structured array with the values of the given fields (all of them by default)
+        plus the 'deleted' flag, converted with vectorized operations:
+        N fields without decimals to int64 (float64 if some value is not integral), N fields with decimals and F 
+        fields to float64 (NaN for unparseable values), D fields to datetime64[D] (NaT for invalid dates), 
+        L fields and the deletion flag to bool, and C fields to unicode strings.
+        
+        :param fields: List of field names (or aliases) to include.
+        :param memmap: Passed to as_numpy(), which provides the raw records.
+        """
+
+        np = self._numpy()
+        raw = self.as_numpy(memmap=memmap)
+        names = []
+        for name in fields or self.field_names:
+            field = self.get_field(name)
+            if not field:
+                raise ValueError(f"DbaseFile: Field {name} not found")
+            names.append(field.name.strip())
+
+        columns = {'deleted': raw['deleted'] == b'*'}
+        for name in names:
+            field = self.get_field(name)
+            col = raw[name]
+            if field.type == FieldType.CHARACTER.value:
+                columns[name] = np.char.decode(np.char.strip(col), 'latin1')
+            elif field.type in (FieldType.NUMERIC.value, FieldType.FLOAT.value):
+                columns[name] = self._numpy_numbers(np, col, field.type == FieldType.NUMERIC.value and not field.decimal)
+            elif field.type == FieldType.DATE.value:
+                columns[name] = self._numpy_dates(np, col)
+            elif field.type == FieldType.LOGICAL.value:
+                columns[name] = np.isin(np.char.strip(col), [b'T', b't', b'Y', b'y'])
             else:
-                raise ValueError(f"Unknown field type {fieldtype}")
-            rec_bytes = rec_bytes[field.length:]
-        return record
+                raise ValueError(f"DbaseFile: Invalid field type {field.type} for conversion")
+
+        result = np.empty(len(raw), dtype=[(name, col.dtype) for name, col in columns.items()])
+        for name, col in columns.items():
+            result[name] = col
+        return result
+
+    @staticmethod
+    def _numpy_numbers(np, col, integral:bool):
+        """
+        Converts an array of raw numeric fields into int64 (if 'integral') or float64.
+        Meant for internal use only.
+        """
+
+        col = np.char.strip(col)
+        col = np.where(col == b'', b'0', col)
+        if integral:
+            try:
+                return col.astype(np.int64)
+            except ValueError:
+                pass
+        try:
+            return col.astype(np.float64)
+        except ValueError:
+            return np.array([DbaseFile._as_float(RecordDecoder.decode_float(value)) for value in col], dtype=np.float64)
+
+    @staticmethod
+    def _numpy_dates(np, col):
+        """
+        Converts an array of raw YYYYMMDD fields into datetime64[D], with NaT for blank or invalid dates.
+        Meant for internal use only.
+        """
+
+        if col.dtype.itemsize != 8:
+            values = [RecordDecoder.decode_date(value) for value in col]
+            return np.array([value if isinstance(value, datetime) else 'NaT' for value in values], dtype='datetime64[D]')
+        digits = np.frombuffer(np.ascontiguousarray(col).tobytes(), dtype=np.uint8).reshape(-1, 8).astype(np.int64) - 48
+        valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+        digits = np.where(valid[:, None], digits, 0)
+        year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+        month = digits[:, 4] * 10 + digits[:, 5]
+        day = digits[:, 6] * 10 + digits[:, 7]
+        valid &= (year > 0) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+        month = np.where(valid, month, 1)
+        day = np.where(valid, day, 1)
+        months = (year - 1970).astype('datetime64[Y]') + (month - 1).astype('timedelta64[M]')
+        dates = months.astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+        valid &= dates.astype('datetime64[M]') == months
+        return np.where(valid, dates, np.datetime64('NaT'))
     
     def get_field(self, fieldname):
         """
@@ -978,26 +2715,16 @@ class DbaseFile:
             raise ValueError(f"DbaseFile: Field {fieldname} not found")
         elif fieldname != field.name.strip():
             fieldname = field.name.strip()
-        fieldtype = field.type
         if not compare_function:
-            if fieldtype == FieldType.CHARACTER.value:
-                # compare_function = lambda f, v: f.lower().startswith(v.lower())
-                compare_function = self.istartswith
-            elif fieldtype == FieldType.NUMERIC.value or fieldtype == FieldType.FLOAT.value:
-                compare_function = lambda f, v: f == v 
-            elif fieldtype == FieldType.DATE.value:
-                compare_function = lambda f, v: f == v
-            else:
-                raise ValueError(f"DbaseFile: Invalid field type {fieldtype} for comparison")
+            compare_function = self._default_compare(field)
             
-        for i, record in enumerate(self[start:]):
-            if compare_function(record[fieldname], value):
-                if funcname not in ("find", "index"):
-                    return i + start, record
-                elif funcname == "find":
-                    return record
-                elif funcname == "index":
-                    return i + start
+        for record in self._matching(fieldname, value, compare_function, start):
+            if funcname not in ("find", "index"):
+                return record.metadata.index, record
+            elif funcname == "find":
+                return record
+            elif funcname == "index":
+                return record.metadata.index
 
         if funcname == "":
             return -1, None
@@ -1006,30 +2733,68 @@ class DbaseFile:
         elif funcname == "index":
             return -1
 
+    def _matching(self, fieldname, value, compare_function, start=0) -> Generator[LazyRecord, None, None]:
+        """
+        Yields, as LazyRecord objects, the records from 'start' on whose field 'fieldname' 
+        meets compare_function(field value, value). Only that field is decoded for the other records.
+        Records marked as deleted are left out, as the indexes leave them out.
+        Meant for internal use only.
+        """
+
+        decoder = self.decoder
+        i = decoder.positions[fieldname]
+        first = decoder.offsets[i]
+        last = first + decoder.fields[i].length
+        convert = decoder.converters[i]
+        header_size = self.header.header_size
+        record_size = self.header.record_size
+        for index, count, buffer, pos in self._blocks(start):
+            for pos in range(pos, pos + count * record_size, record_size):
+                if buffer[pos] != 42 and compare_function(convert(buffer[pos + first:pos + last]), value):
+                    yield decoder.decode_lazy(buffer, pos, index, header_size + index * record_size)
+                index += 1
+
+    def _default_compare(self, field):
+        """
+        Returns the default comparison function used by search() for the type of the given field:
+        case insensitive 'starts with' for C fields, equality for N, F and D fields
+        (tagged as such, so that it's looked up in the index of the field).
+        Meant for internal use only.
+        """
+
+        fieldtype = field.type
+        if fieldtype == FieldType.CHARACTER.value:
+            # compare_function = lambda f, v: f.lower().startswith(v.lower())
+            return self.istartswith
+        elif fieldtype in (FieldType.NUMERIC.value, FieldType.FLOAT.value, FieldType.DATE.value):
+            equals = lambda f, v: f == v
+            equals.operator = '=='
+            return equals
+        else:
+            raise ValueError(f"DbaseFile: Invalid field type {fieldtype} for comparison")
+
     def _indexed_search(self, fieldname, value, start=0, funcname="", compare_function=None):
         """
         Searches for a record with the specified value in the specified field,
         starting from the specified index, for which the specified comparison function returns True,
-        using the field index.
+        using the field index. The record found is the first one, from the specified index on, 
+        of the first matching value in index order, so that only the index entries up to it are read.
         """
 
         if fieldname not in self.indexes:
             raise ValueError(f"DbaseFile: Index {fieldname} not found.")
 
         if not compare_function:
-            compare_function = (self.istartswith if self.get_field(fieldname).type == FieldType.CHARACTER.value 
-                         else lambda f, v: f == v)        
+            compare_function = self._default_compare(self.get_field(fieldname))
         record = None
-        entry = self.indexes[fieldname]
-        candidates = []
-        for k in entry.keys():
-            if compare_function(k, value):
-                candidates.extend(entry[k])
-        for index in candidates:
-            if index >= start:
-                record = self.get_record(index)
+        for keys in self._index_lookup(fieldname, value, compare_function):
+            # Record numbers are ascending within a value
+            i = bisect_left(keys, start)
+            if i < len(keys):
+                index = keys[i]
+                record = self.get_record(index, lazy=True)
                 break
-        if record:
+        if record is not None:
             self.indexhits += 1
             if funcname not in ("find", "index"):
                 return index, record
@@ -1045,6 +2810,85 @@ class DbaseFile:
             elif funcname == "index":
                 return -1
 
+    def _index_lookup(self, fieldname, value, compare_function, reverse=False) -> Iterable[List[int]]:
+        """
+        Returns the numbers of the records whose field 'fieldname' meets compare_function(field value, value),
+        grouped by field value, in index order (descending if 'reverse'), using the index of the field
+        (see _index_groups()). Records marked as deleted are left out: index files don't hold them, 
+        and they're dropped from the groups of native indexes (see attach_index()), which do.
+        Meant for internal use only.
+        """
+
+        groups = self._index_groups(fieldname, value, compare_function, reverse)
+        if getattr(self.indexes[fieldname], 'native', False):
+            groups = ([key for key in keys if self._read_raw(key)[:1] != b'*'] for keys in groups)
+            groups = (keys for keys in groups if keys)
+        return groups
+
+    def _index_groups(self, fieldname, value, compare_function, reverse=False) -> Iterable[List[int]]:
+        """
+        Does the work of _index_lookup(): returns the numbers of the records whose field 'fieldname' 
+        meets compare_function(field value, value), grouped by field value, in index order.
+        The groups are produced lazily, as they are consumed.
+        Conditions tagged with their operator (see parse_conditions()) as equality, comparisons, 
+        BETWEEN or 'starts with' are binary searched, leaving blank dates out of comparisons and BETWEEN
+        as parse_conditions() does; any other one is tested against every indexed value.
+        A 'casefold' index is used for istartswith() (by a prefix scan) and to narrow down 
+        equality and 'starts with' conditions; the table is scanned for any other condition.
+        Meant for internal use only.
+        """
+
+        index = self.indexes[fieldname]
+        operator = getattr(compare_function, 'operator', None)
+        if index.kind == 'casefold':
+            return self._casefold_lookup(fieldname, value, compare_function, reverse)
+        # Blank dates decode as '', and meet no comparison
+        dates = self._is_date(fieldname)
+        bounds = {'<': (None, value, True, False), '<=': (None, value, True, True),
+                  '>': (value, None, False, True), '>=': (value, None, True, True)}
+        try:
+            if operator == '==':
+                keys = index.get(value)
+                return [keys] if keys else []
+            elif operator in bounds:
+                low, high, low_inclusive, high_inclusive = bounds[operator]
+                return (keys for key, keys in index.range(low, high, low_inclusive, high_inclusive, reverse) 
+                        if key != '' or not dates)
+            elif operator == 'between':
+                return (keys for key, keys in index.range(value[0], value[1], reverse=reverse) 
+                        if key != '' or not dates)
+            elif operator == 'startswith' and isinstance(value, str):
+                return (keys for _, keys in index.prefix(value, reverse))
+        except ValueError:
+            # The value can't be compared with the keys of the index, or they aren't text
+            pass
+        values = reversed(list(index.keys())) if reverse else index.keys()
+        return (index[key] for key in values if compare_function(key, value))
+
+    def _casefold_lookup(self, fieldname, value, compare_function, reverse=False) -> Iterable[List[int]]:
+        """
+        Does the work of _index_lookup() for a 'casefold' index, whose values are lowercased:
+        istartswith() is answered by a prefix scan of the index, equality and 'starts with' conditions 
+        by checking the records found for the lowercased value or prefix, and any other condition 
+        by a scan of the table. Meant for internal use only.
+        """
+
+        index = self.indexes[fieldname]
+        operator = getattr(compare_function, 'operator', None)
+        if compare_function is self.istartswith and isinstance(value, str):
+            return (keys for _, keys in index.prefix(value, reverse))
+        if operator in ('==', 'startswith') and isinstance(value, str):
+            if operator == '==':
+                groups = [index.get(value, [])]
+            else:
+                groups = (keys for _, keys in index.prefix(value, reverse))
+            decode_field = self.decoder.decode_field
+            groups = ([key for key in keys if compare_function(decode_field(self._read_raw(key), fieldname), value)]
+                      for keys in groups)
+            return (keys for keys in groups if keys)
+        groups = [[r.metadata.index] for r in self._matching(fieldname, value, compare_function)]
+        return reversed(groups) if reverse else groups
+
     def find(self, fieldname, value, start=0, compare_function=None): 
         """
         Wrapper for search() with funcname="find".
@@ -1061,11 +2905,57 @@ class DbaseFile:
 
         return self.search(fieldname, value, start, "index", compare_function)
 
+    def find_many(self, fieldname, values) -> List[Record]:
+        """
+        Returns the records whose field 'fieldname' equals any of the given values, in table order,
+        leaving out the records marked as deleted. 
+        If the field is indexed, all the values are looked up in a single pass over the index,
+        otherwise the table is scanned once.
+        """
+
+        for i, alias in enumerate(self.field_alias):
+            if alias == fieldname:
+                fieldname = self.fields[i].name
+                break
+        field = self.get_field(fieldname)
+        if not field:
+            raise ValueError(f"DbaseFile: Field {fieldname} not found")
+        name = field.name.strip()
+        values = set(values)
+        index = self.indexes.get(name)
+        if index is None:
+            return list(self._matching(name, values, lambda f, v: f in v))
+        self.indexhits += 1
+        keys = sorted(set(chain.from_iterable(index.get_many(values).values())))
+        records = (self.get_record(key, lazy=True) for key in keys)
+        if index.kind == 'casefold':
+            # The index found the values case insensitively
+            return [r for r in records if not r['deleted'] and r[name] in values]
+        return [r for r in records if not r['deleted']]
+
     def filter(self, fieldname, value, compare_function=None):
         """
-        Returns a list of records (dictionaries) that meet the specified criteria.
+        Returns a list of records (dictionaries) that meet the specified criteria,
+        in the order of the index of the field if it has one, otherwise in the order of the table.
+        Records marked as deleted are left out, as they are by find() and index().
         """
 
+        for i, alias in enumerate(self.field_alias):
+            if alias == fieldname:
+                fieldname = self.fields[i].name
+                break
+        field = self.get_field(fieldname) if fieldname else None
+        if field:
+            name = field.name.strip()
+            compare_function = compare_function or self._default_compare(field)
+            if name in self.indexes:
+                # Records in index order
+                self.indexhits += 1
+                return [self.get_record(key, lazy=True) 
+                        for keys in self._index_lookup(name, value, compare_function) for key in keys]
+            # Single pass over the table, instead of a new search() from each match on
+            return list(self._matching(name, value, compare_function))
+
         ret = []
         index = -1
         while True:
@@ -1088,7 +2978,7 @@ class DbaseFile:
             start = 0
         if stop is None:
             stop = self.header.records
-        l = records or (self.get_record(i) for i in range(start, stop))
+        l = records or self.scan(start, stop)
         # return recordsep.join(fieldsep.join(str(record[field.name]) for field in self.fields) for record in l)
         # return (fieldsep.join(str(record[field.name]) for field in self.fields) for record in l)
         return (fieldsep.join(str(record[fieldname] or '') for fieldname in record.datafields) for record in l)
@@ -1130,7 +3020,7 @@ class DbaseFile:
             start = 0
         if stop is None:
             stop = self.header.records
-        l = records or [self.get_record(i) for i in range(start, stop)]
+        l = records or list(self.scan(start, stop))
         line_bracket = "+"
         line_divider = line_bracket + line_bracket.join("-" * (field.length + 2) for field in self.fields) + line_bracket
         header_line = "|" + "|".join(field.name.center(field.length + 2) for field in self.fields) + "|" + "\n"
@@ -1150,7 +3040,7 @@ class DbaseFile:
             start = 0
         if stop is None:
             stop = self.header.records
-        l = records or [self.get_record(i) for i in range(start, stop)]
+        l = records or list(self.scan(start, stop))
         top_line = BoxType.UP_L.value + BoxType.T_DOWN.value.join(BoxType.HORZ.value * (field.length + 2) for field in self.fields) + BoxType.UP_R.value + "\n"
         line_divider = BoxType.T_L.value + BoxType.CROSS.value.join(BoxType.HORZ.value * (field.length + 2) for field in self.fields) + BoxType.T_R.value       
         header_line = BoxType.VERT.value + BoxType.VERT.value.join(field.name.center(field.length + 2) for field in self.fields) + BoxType.VERT.value + "\n"
@@ -1187,7 +3077,7 @@ class DbaseFile:
         # names_lengths = list(zip(self.field_names, self.field_lengths))
         # return recordsep.join([self.line(i, fieldsep, names_lengths=names_lengths)
         #                         for i in range(start, stop)])
-        records = records or self[start:stop]
+        records = records or self.scan(start, stop)
         return (self.line(r, fieldsep, names_lengths=names_lengths) for r in records) 
        
     def headers_line(self, fieldsep=""):
@@ -1206,41 +3096,53 @@ class DbaseFile:
         at the specified index.
         """
 
+        self._check_writable()
         self._test_key(key)
-        self.file.seek(self.header.header_size + key * self.header.record_size)
-        if record.get('deleted'):
-            self.file.write(b'*')
-        else:
-            self.file.write(b' ')
-        for field in self.fields:
-            ftype = field.type
-            if ftype == 'C':
-                self.file.write(record[field.name].ljust(field.length, ' ').encode('latin1'))
-            elif ftype == 'N' or ftype == 'F':
-                self.file.write(str(record[field.name]).rjust(field.length, ' ').encode('latin1'))
-            elif ftype == 'D':
-                self.file.write(record[field.name].strftime('%Y%m%d').encode('latin1'))
-            elif ftype == 'L':
-                self.file.write(b'\x01' if record[field.name] else b'\x00')
-            else:
-                raise ValueError(f"DbaseFile: Unknown field type {field.type}")
-        
-        hoy = datetime.now()
-        self.header.year = hoy.year - (2000 if hoy.year > 2000 else 1900)
-        self.header.month = hoy.month
-        self.header.day = hoy.day
-        self.datasize = self.header.record_size * self.header.records
-        self.file.seek(0)
-        self.file.write(self.header.to_bytes())        
-        self.file.flush()
-        self.update_mdx()
-
-    def transform(self, record:Record, fields:List[DbaseField]):
+        if self.journal and self._transaction is None:
+            with self.transaction():
+                return self.save_record(key, record)
+        self._put_raw(key, self.encoder.encode_record(record))
+        self._write_header()
+        self._flush()
+
+    def _put_raw(self, key, raw):
+        """
+        Writes the raw bytes of a record over the record at 'key', keeping the undo data of the active 
+        transaction, the count of deleted records, the free slots and the indexes up to date. 
+        The header is left for the caller to write. Meant for internal use only.
+        """
+
+        with self._mdx_lock:
+            old = self._read_raw(key) if self.indexes and self._transaction is None else None
+            if self._deleted is not None:
+                self._deleted += (raw[:1] == b'*') - ((old or self._read_raw(key))[:1] == b'*')
+            if self._free is not None and raw[:1] == b'*':
+                heappush(self._free, key)
+            self._save_undo(key)
+            with self.lock:
+                self.file.seek(self.header.header_size + key * self.header.record_size)
+                self.file.write(raw)
+            if self._transaction is not None and self._transaction['journal'] is not None:
+                self._sync(self.file, 'full')
+            for build in self._builds:
+                build['changed'].add(key)
+            if old is not None:
+                self._log_mdx(self._reindex(key, old, raw))
+
+    def transform(self, record:Record, fields:List[DbaseField], compact:bool=False):
         """
         Returns a record with the specified fields, usually with
         fields 'deleted' and 'metadata' stripped.
+        If 'compact' is True, a compact Row keyed by the field aliases is returned instead,
+        keeping the index of the source record.
         """
 
+        if compact:
+            fields = [self.get_field(f) for f in fields]
+            row_class = make_row_class(self.tablename, [field.alias for field in fields])
+            metadata = record.get('metadata')
+            return row_class(metadata.index if metadata else None, bool(record.get('deleted')),
+                             *[record.get(field.name) or record.get(field.alias) for field in fields])
         ret = Record()
         for field in [self.get_field(f) for f in fields]:
             # ret[fields[field]] = record.get(field.name)
@@ -1248,9 +3150,10 @@ class DbaseFile:
         return ret
 
     def as_cursor(self, records:List[Record]=None, fields:List[DbaseField]=None,
-                  start:int=0, stop:int=None, step:int=1):
+                  start:int=0, stop:int=None, step:int=1, compact:bool=None):
         """
         Returns a cursor object for the database.
+        If 'compact' is True (self.compact if None), the cursor yields compact Row objects.
         """
 
         if not fields:
@@ -1262,13 +3165,17 @@ class DbaseFile:
 
         description = [(i, field.alias, field.name, field.type, 
                         field.length, field.decimal) for i, field in enumerate(fields)]
-        records = (self.transform(r, fields) for r in records)
+        compact = self.compact if compact is None else compact
+        records = (self.transform(r, fields, compact) for r in records)
         return Cursor(description, records)
 
     def parse_conditions(self, wherestr: str) -> List[Tuple[str, Any, Callable]]:
         """
         Parses the WHERE clause of a SQL statement and returns a list of tuples
         with the field name, the value to compare and the comparison function.
+        Values are converted to the type of the field (dates may be given as 'YYYYMMDD' or 'YYYY-MM-DD'),
+        blank dates never meeting a comparison or BETWEEN, and comparison functions carry their operator (e.g. '==', '<', 'between', 'startswith') 
+        as the 'operator' attribute, which allows indexed fields to be looked up instead of scanned.
         """
 
         if not wherestr:
@@ -1284,6 +3191,9 @@ class DbaseFile:
         }
         # conditions = re.split(r'\s+AND\s+', wherestr, 0, re.IGNORECASE)
         # conditions = [re.split(r'\s+OR\s+', condition, 0, re.IGNORECASE) for condition in conditions]
+        # The AND of 'field BETWEEN low AND high' must not split the condition
+        wherestr = re.sub(r"(\w+)\s+BETWEEN\s+('[^']*'|\S+)\s+AND\s+('[^']*'|\S+)", r"\1 BETWEEN \2 \3", 
+                          wherestr, 0, re.IGNORECASE)
         conditions = [re.split(r'\s+OR\s+', condition, 0, re.IGNORECASE) for condition in 
                       re.split(r'\s+AND\s+', wherestr, 0, re.IGNORECASE)]
         # Just for now will only parse first condition
@@ -1292,6 +3202,17 @@ class DbaseFile:
         for condition in conditions:
             ors = []
             for cond in condition:
+                match = re.match(r"(\w+)\s+BETWEEN\s+('[^']*'|\S+)\s+('[^']*'|\S+)$", cond.strip(), re.IGNORECASE)
+                if match:
+                    lhs, low, high = match.groups()
+                    if self._is_date(lhs):
+                        searchfunc = lambda f, v: f != '' and v[0] <= f <= v[1]
+                    else:
+                        searchfunc = lambda f, v: v[0] <= f <= v[1]
+                    searchfunc.operator = 'between'
+                    ors.append((lhs, (self._coerce_operand(lhs, low.strip("'")), 
+                                      self._coerce_operand(lhs, high.strip("'"))), searchfunc))
+                    continue
                 match = re.match(r"(\w+)\s*(LIKE|=|<=|>=|<|>|!=)\s*'?([^']*)'?", cond, re.IGNORECASE)
                 if not match:
                     raise ValueError("DbaseFile: DbaseFile: Invalid WHERE clause format")
@@ -1315,35 +3236,222 @@ class DbaseFile:
                         raise ValueError(f"DbaseFile: Invalid operator {operator}")
                     operator = operator_map[operator]
 
-                if rhs.isdigit():
-                    rhs = coerce_number(rhs)
+                if operator in ('in', 'startswith', 'endswith'):
+                    if rhs.isdigit() and self.get_field(lhs) is None:
+                        rhs = coerce_number(rhs)
+                else:
+                    rhs = self._coerce_operand(lhs, rhs)
                 if operator == 'in':
                     lambdasrc = f"lambda f, v: f.find(v) >= 0"
                 elif operator == 'startswith':
                     lambdasrc = f"lambda f, v: f.startswith(v)" 
                 elif operator == 'endswith':
                     lambdasrc = f"lambda f, v: f.endswith(v)"
+                elif operator in ('<', '<=', '>', '>=') and self._is_date(lhs):
+                    # Blank dates (decoded as '') are neither before nor after any date
+                    lambdasrc = f"lambda f, v: f != '' and f {operator} v"
                 else:
                     lambdasrc = f"lambda f, v: f {operator} v"
                 searchfunc = eval(lambdasrc)
+                searchfunc.operator = operator
                 ors.append((lhs, rhs, searchfunc))
             ands.append(ors)
         return ands
     
+    def _is_date(self, fieldname: str) -> bool:
+        """
+        Returns True if 'fieldname' is a D field. Meant for internal use only.
+        """
+
+        field = self.get_field(fieldname)
+        return field is not None and field.type == FieldType.DATE.value
+
+    def _coerce_operand(self, fieldname: str, text: str):
+        """
+        Converts a value of a WHERE clause to the type of the field it's compared with:
+        a number for N and F fields, a datetime for D fields ('YYYYMMDD' or 'YYYY-MM-DD', month and day optional), 
+        a bool for L fields ('T', 'Y', 'true', 'F', 'N', 'false', ...) and the text itself for C fields. 
+        Values of unknown fields are converted to numbers if all digits.
+        Meant for internal use only.
+        """
+
+        field = self.get_field(fieldname)
+        if field is None:
+            return coerce_number(text) if text.isdigit() else text
+        if field.type in (FieldType.NUMERIC.value, FieldType.FLOAT.value):
+            return coerce_number(text)
+        if field.type == FieldType.DATE.value:
+            digits = text.replace('-', '')
+            try:
+                return datetime(int(digits[:4]), int(digits[4:6] or 1), int(digits[6:8] or 1))
+            except ValueError:
+                return text
+        if field.type == FieldType.LOGICAL.value:
+            if text in RecordDecoder.true_values or text.lower() == 'true':
+                return True
+            if text in ('F', 'f', 'N', 'n') or text.lower() == 'false':
+                return False
+        return text
+
     def get_filtered_records(self, parser:SQLParser):
+        """
+        Returns the records meeting the WHERE clause of a parsed SQL command.
+        The groups of OR-ed conditions on fields with bitmap indexes are answered by bitwise operations 
+        on the bitmaps, and AND-ed together, the records then being returned in table order;
+        otherwise, records are returned in the order in which the first group found them.
+        Without a WHERE clause, every record is returned in table order.
+        """
+
         parsed = parser.parsed
+        if not parsed['where']:
+            # Every record, in table order, whether or not any field has an index
+            return list(self._matching(self.field_names[0], None, lambda f, v: True))
         ands = self.parse_conditions(parsed['where'])
-        filteredrecords = []
+        # Dicts keyed by record number keep the order in which filter() returned the records,
+        # None standing for every record, before any group of conditions is applied
+        filteredrecords = None
+        composite = self._composite_lookup(ands)
+        if composite is not None:
+            filteredrecords, ands = composite
+            if not filteredrecords:
+                return []
+        bits = None
+        rest = []
         for ors in ands:
-            orfiltered = []
+            orbits = self._bitmap_lookup(ors)
+            if orbits is None:
+                rest.append(ors)
+            else:
+                bits = orbits if bits is None else bits & orbits
+        if bits is not None:
+            if not bits:
+                return []
+            self.indexhits += 1
+            if filteredrecords is None and not rest:
+                records = (self.get_record(key, lazy=True) for key in bit_positions(bits))
+                return [r for r in records if not r['deleted']]
+        for ors in rest:
+            orfiltered = {}
             for field_param, value_param, compare_function in ors:
-                newset = [r.metadata.index for r in 
-                          self.filter(field_param, value_param, 
-                                      compare_function=compare_function)]
-                orfiltered = list(set(orfiltered) | set(newset))
-            filteredrecords = list(set(filteredrecords) & set(orfiltered)) if filteredrecords else orfiltered 
+                matches = self.filter(field_param, value_param, compare_function=compare_function)
+                for r in matches:
+                    orfiltered.setdefault(r.metadata.index, r)
+            filteredrecords = ({i: r for i, r in filteredrecords.items() if i in orfiltered} 
+                               if filteredrecords is not None else orfiltered)
+        if bits is not None:
+            flags = bits.to_bytes((bits.bit_length() + 7) >> 3, 'little')
+            filteredrecords = {i: filteredrecords[i] for i in sorted(filteredrecords) 
+                               if i >> 3 < len(flags) and flags[i >> 3] >> (i & 7) & 1}
+
+        return [r for r in filteredrecords.values() if not r['deleted']]
+
+    def _bitmap_lookup(self, ors):
+        """
+        Returns the bitmap of the records meeting any of the OR-ed conditions of a parsed WHERE clause 
+        (see parse_conditions()), found by bitwise operations on the bitmap indexes of their fields:
+        an equality is the bitmap of its value, an inequality the negation of it, and any other condition 
+        the OR of the bitmaps of the values meeting it. Returns None unless every field has a bitmap index.
+        Meant for internal use only.
+        """
+
+        indexes = []
+        for lhs, value, compare_function in ors:
+            field = self.get_field(lhs)
+            index = self.indexes.get(field.name.strip()) if field is not None else None
+            if index is None or index.kind != 'bitmap':
+                return None
+            indexes.append(index)
+        bits = 0
+        for index, (lhs, value, compare_function) in zip(indexes, ors):
+            operator = getattr(compare_function, 'operator', None)
+            if operator == '==':
+                bits |= index.bitmap(value)
+            elif operator == '!=':
+                bits |= index.universe() & ~index.bitmap(value)
+            else:
+                try:
+                    for key in index.keys():
+                        if compare_function(key, value):
+                            bits |= index.bitmap(key)
+                except (TypeError, AttributeError):
+                    # The condition doesn't apply to the values of the field; let the table scan tell
+                    return None
+        return bits
+
+    def _composite_lookup(self, ands):
+        """
+        Looks up, in a single probe, the records meeting the AND-ed equality conditions 
+        of a parsed WHERE clause (see parse_conditions()) on the leading fields of a composite index,
+        choosing the index covering the most conditions. 
+        Returns a dict of the records found by record number, in index order, 
+        and the conditions left to check, or None if no composite index applies.
+        Meant for internal use only.
+        """
+
+        equal = {}
+        for ors in ands:
+            if len(ors) != 1:
+                continue
+            lhs, value, compare_function = ors[0]
+            field = self.get_field(lhs)
+            if field is not None and getattr(compare_function, 'operator', None) == '==':
+                equal.setdefault(field.name.strip(), (value, ors))
+        best, covered = None, 0
+        for name in self.indexes:
+            if '+' not in name:
+                continue
+            count = 0
+            for part in name.split('+'):
+                if part not in equal:
+                    break
+                count += 1
+            if count > covered:
+                best, covered = name, count
+        if best is None:
+            return None
+        fields = best.split('+')[:covered]
+        prefix = tuple(equal[name][0] for name in fields)
+        used = [equal[name][1] for name in fields]
+        try:
+            matches = self.indexes[best].range(prefix, prefix)
+        except ValueError:
+            # The values can't be compared with the keys of the index
+            return None
+        self.indexhits += 1
+        records = {key: self.get_record(key, lazy=True) for _, keys in matches for key in keys}
+        return records, [ors for ors in ands if not any(ors is group for group in used)]
+
+    def _indexed_order(self, parsed: dict, ordersrc: str, reverse: bool):
+        """
+        Returns the records selected by the parsed SQL command in the order of the ORDER BY field
+        (descending if 'reverse'), read from the index of that field, if it has a sorted or bitmap one and the 
+        WHERE clause is either absent or a single condition on that field which the index can look up.
+        Records with equal values are kept in table order. Returns None otherwise.
+        Meant for internal use only.
+        """
 
-        return [self.get_record(i) for i in filteredrecords]
+        field = self.get_field(ordersrc)
+        if field is None or field.name.strip() not in self.indexes:
+            return None
+        if self.indexes[field.name.strip()].kind == 'casefold':
+            # Values differing in case are one key of a casefold index
+            return None
+        name = field.name.strip()
+        if not parsed['where']:
+            keys = (key for _, keys in self.indexes[name].range(reverse=reverse) for key in keys)
+        else:
+            ands = self.parse_conditions(parsed['where'])
+            if len(ands) != 1 or len(ands[0]) != 1:
+                return None
+            lhs, value, compare_function = ands[0][0]
+            condfield = self.get_field(lhs)
+            if (condfield is None or condfield.name.strip() != name or 
+                getattr(compare_function, 'operator', None) not in ('==', '<', '<=', '>', '>=', 'between', 'startswith')):
+                return None
+            keys = (key for keys in self._index_lookup(name, value, compare_function, reverse) for key in keys)
+        self.indexhits += 1
+        records = (self.get_record(key, lazy=True) for key in keys)
+        return [r for r in records if not r['deleted']]
 
 
     def _execute_select(self, sql_parser: SQLParser, args=[]):
@@ -1358,16 +3466,7 @@ class DbaseFile:
             func_re = r"^(?P<func_name>avg|count|sum|max|min)\((?P<field>.+)\)$"
             return re.match(func_re, token)
 
-        filteredrecords = self.get_filtered_records(sql_parser)
         parsed = sql_parser.parsed
-        if parsed.get('order'):
-            orderdata = shlex.split(parsed['order'])
-            ordersrc = orderdata[0]
-            reverse = orderdata[-1].lower() == 'desc'
-            filteredrecords = sorted(filteredrecords, key=lambda r: r[ordersrc], reverse=reverse)
-
-        recordslen = len(filteredrecords)
-
         fieldobjs = {}
         funcfields = {}
         has_func_column = False
@@ -1399,12 +3498,32 @@ class DbaseFile:
             raise ValueError("DbaseFile: Cannot mix function columns with regular columns")
 
         if not has_func_column:
+            if parsed.get('order'):
+                orderdata = shlex.split(parsed['order'])
+                ordersrc = orderdata[0]
+                reverse = orderdata[-1].lower() == 'desc'
+                filteredrecords = self._indexed_order(parsed, ordersrc, reverse)
+                if filteredrecords is None:
+                    if self._is_date(ordersrc):
+                        # Blank dates ('') first, as in the index of the field
+                        orderkey = lambda r: (r[ordersrc] != '', r[ordersrc])
+                    else:
+                        orderkey = lambda r: r[ordersrc]
+                    filteredrecords = sorted(self.get_filtered_records(sql_parser), key=orderkey, reverse=reverse)
+            else:
+                filteredrecords = self.get_filtered_records(sql_parser)
+            recordslen = len(filteredrecords)
+
             for field in fieldobjs:
                 f = self.get_field(field)
                 f.alias = fieldobjs[field]
                 selectedfields.append(f)
             
-            records = self.fields_view(fields=selectedfields, records=filteredrecords)
+            # Only the selected fields are decoded, straight into the result shape
+            project = self.decoder.projector([f.name.strip() for f in selectedfields],
+                                             [f.alias for f in selectedfields], self.compact, self.tablename)
+            records = (project(r._raw, r.metadata.index) if isinstance(r, LazyRecord)
+                       else self.transform(r, selectedfields, self.compact) for r in filteredrecords)
             cursor = Cursor(description=[(i, f.alias, f.name, f.type, f.length, f.decimal) 
                                         for i, f in enumerate(selectedfields)], 
                                         records=records)
@@ -1413,20 +3532,33 @@ class DbaseFile:
         else:
             for field in funcfields:
                 selectedfields.append((field, *funcfields[field]))
+            if parsed['where']:
+                filteredrecords = self.get_filtered_records(sql_parser)
+                numrecords = len(filteredrecords)
+                values = lambda name: [r[name] for r in filteredrecords]
+            else:
+                # No filtering: read the columns straight from disk, without building records
+                columnvalues = self.columns([f[2] for f in selectedfields if f[2] != '*'] + ['deleted'])
+                deleted = columnvalues['deleted']
+                numrecords = len(deleted) - sum(deleted)
+                if numrecords < len(deleted):
+                    values = lambda name: [value for value, flag in zip(columnvalues[name], deleted) if not flag]
+                else:
+                    values = lambda name: columnvalues[name]
             record = Record()
             description = [(i, f[0], f"{f[1]}({f[2]})", 'N', 10, 0) for i, f in enumerate(selectedfields)]
             for f in selectedfields:
                 func_name, func_field = f[1:]
                 if func_name == 'count':
-                    record[f[0]] = len(filteredrecords)
+                    record[f[0]] = numrecords
                 elif func_name == 'sum':
-                    record[f[0]] = sum([r[func_field] for r in filteredrecords])
+                    record[f[0]] = sum(values(func_field))
                 elif func_name == 'avg':
-                    record[f[0]] = sum([r[func_field] for r in filteredrecords]) / len(filteredrecords)
+                    record[f[0]] = sum(values(func_field)) / numrecords
                 elif func_name == 'max':
-                    record[f[0]] = max([r[func_field] for r in filteredrecords])
+                    record[f[0]] = max(values(func_field))
                 elif func_name == 'min':
-                    record[f[0]] = min([r[func_field] for r in filteredrecords])
+                    record[f[0]] = min(values(func_field))
 
             cursor = Cursor(description=description, records=(r for r in [record]))
             cursor.rowsaffected = 1
@@ -1459,7 +3591,6 @@ class DbaseFile:
             for k, v in dict_update.items():
                 record[k] = coerce_number(v.strip().strip("'"))
             self.save_record(record.metadata.index, record)
-        self.commit()
         cursor = Cursor(description=[(0, 'records', 'records', 'N', 10, 0)], records=(n for n in [numupdated]))
         cursor.rowsaffected = numupdated
         return cursor
@@ -1478,7 +3609,7 @@ class DbaseFile:
         for record in filteredrecords:
             record['deleted'] = True
             self.save_record(record.metadata.index, record)
-        self.commit()
+        self._autovacuum()
         cursor = Cursor(description=[(0, 'records', 'records', 'N', 10, 0)], records=(n for n in [numdeleted]))
         cursor.rowsaffected = numdeleted
         return cursor
@@ -1504,7 +3635,7 @@ class DbaseFile:
             if len(real_values) != len(self.fields):
                 raise ValueError(f"DbaseFile: Wrong number of fields: expected {len(self.fields)}, got {len(real_values)}") 
             values = real_values               
-        self.add_record(*values)
+        self.add_records([values])
         cursor = Cursor(description=[(0, 'records', 'records', 'N', 10, 0)], records=(n for n in [1]))
         cursor.rowsaffected = 1
         return cursor
@@ -1534,7 +3665,7 @@ class DbaseFile:
         elif sql_type == 'UPDATE':
             return self._execute_update(sql_parser, args)
         
-    def fields_view(self, start=0, stop=None, step=1, fields:List[DbaseField]=None, records=None):
+    def fields_view(self, start=0, stop=None, step=1, fields:List[DbaseField]=None, records=None, compact:bool=None):
         """
         Returns a generator yielding a record with fields specified in the fields dictionary.
         
@@ -1543,60 +3674,243 @@ class DbaseFile:
         :param step: Step between records to return.
         :param fields: List of fields to include in the records.
         :param records: List of records to include in the view. If omitted, self[:] is used
+        :param compact: If True (self.compact if None), compact Row objects are yielded.
         :returns: Generator yielding records with the specified fields.
         """
 
         records = records if isinstance(records, list) else self[start:stop:step]
         if not fields:
             fields = self.fields
-        return (self.transform(record, fields) for record in records)
+        compact = self.compact if compact is None else compact
+        return (self.transform(record, fields, compact) for record in records)
 
-    def make_mdx(self, fieldname:str="*"):
+    def make_mdx(self, fieldname:str="*", kind:str="sorted") -> IndexBuild:
         """
-        Generates a .pmdx index for the specified field.
+        Generates the index file (dbfname.fieldname.pidx) of the specified field.
+        The index is built in the background: the returned IndexBuild handle's join() waits for it 
+        to be ready. The records are read by a single scan of the table, split in partitions of 
+        mdx_partition_size records scanned by worker processes (mdx_workers, one per CPU by default) 
+        when there are several. Records changed or added while the build runs are indexed again 
+        just before the new indexes replace the previous ones, and packing the table waits for the build.
 
         :param fieldname: Name of the field to index. If '*', indexes all fields.
+                          A list of field names (or the names joined by '+') makes a composite index,
+                          (dbfname.field1+field2.pidx), whose keys are tuples of the values of the fields,
+                          looked up by SQL queries with equality conditions on its leading fields.
+        :param kind: 'sorted' (the default) for an index of the values as they are, 
+                     which answers equality, range, prefix and ORDER BY lookups;
+                     'casefold' for an index of the lowercased values of a C field, which answers 
+                     case insensitive prefix lookups (the default search() of C fields) by a range scan;
+                     'bitmap' for a bitmap of the records holding each value, meant for fields with 
+                     few distinct values (logicals, codes), whose conditions in SQL queries are combined 
+                     by bitwise AND, OR and NOT.
+                     With '*', 'casefold' applies to the C fields only, and 'bitmap' to the L fields only,
+                     and the fields that already have an index keep its kind, as with update_mdx().
+        :returns: IndexBuild handle of the build.
         """
         
+        if kind not in ('sorted', 'casefold', 'bitmap'):
+            raise ValueError(f"DbaseFile: Invalid index kind {kind}")
         if fieldname == "*":
-            for field in self.fields:
-                self.make_mdx(field.name)
-            return
-        if fieldname not in self.field_names:
-            raise ValueError(f"DbaseFile: Field {fieldname} not found")
-        def do_index(fieldname):
-            self.indexes[fieldname] = {}
-            for i, record in enumerate(self):
-                if not self.indexes[fieldname].get(record[fieldname]):
-                    self.indexes[fieldname][record[fieldname]] = [i]
-                else:
-                    self.indexes[fieldname][record[fieldname]].append(i)
-            self._save_mdx()
-        indexing_thread = Thread(target=do_index, args=(fieldname,), daemon=True)
-        indexing_thread.start()
+            kinds = {'casefold': FieldType.CHARACTER.value, 'bitmap': FieldType.LOGICAL.value}
+            specs = [(field.name, [field.name], self.indexes[field.name].kind if field.name in self.indexes else
+                      kind if field.type == kinds.get(kind, field.type) else 'sorted') for field in self.fields]
+            return self._start_build(specs)
+        fields = list(fieldname) if isinstance(fieldname, (list, tuple)) else fieldname.split('+')
+        for name in fields:
+            if name not in self.field_names:
+                raise ValueError(f"DbaseFile: Field {name} not found")
+        fieldname = '+'.join(fields)
+        if kind == 'casefold' and (len(fields) > 1 or self.get_field(fieldname).type != FieldType.CHARACTER.value):
+            raise ValueError(f"DbaseFile: A casefold index needs a C field, {fieldname} is not")
+        if kind == 'bitmap' and len(fields) > 1:
+            raise ValueError("DbaseFile: A bitmap index can't be composite")
+        return self._start_build([(fieldname, fields, kind)])
+
+    def update_mdx(self) -> IndexBuild:
+        """
+        Rebuilds every index from scratch, in a single build (see make_mdx()). 
+        Changes made through add_records(), save_record() and del_record() already keep the indexes 
+        up to date, so this is only needed after the table was modified by other means.
+
+        :returns: IndexBuild handle of the build.
+        """
+
+        return self._start_build([(name, name.split('+'), index.kind) for name, index in list(self.indexes.items())])
+
+    def _start_build(self, specs:List[Tuple[str, List[str], str]]) -> IndexBuild:
+        """
+        Starts building the indexes described by 'specs', tuples (name, fields, kind), in the background.
+        The table is flushed first, so that worker processes read what was written up to now,
+        and the records changed from then on (including those of the active transaction) are 
+        recorded, to be indexed again when the build is done. Meant for internal use only.
+        """
+
+        self._flush()
+        build = SmartDict(records=self.header.records, changed=set(), handle=None)
+        with self._mdx_lock:
+            transaction = self._transaction
+            if transaction is not None:
+                build['changed'].update(transaction['modified'])
+                build['changed'].update(range(transaction['records'], self.header.records))
+            self._builds.append(build)
+        build['handle'] = IndexBuild(lambda: self._build_indexes(specs, build), [name for name, _, _ in specs])
+        return build['handle']
 
-    def update_mdx(self):
+    def _build_indexes(self, specs:List[Tuple[str, List[str], str]], build:SmartDict):
         """
-        Updates the .pmdx index file.
+        Builds the indexes described by 'specs' from the records the table had when the build started:
+        the table is scanned in partitions, by a pool of worker processes if there are several partitions
+        and workers (and no transaction is active, whose writes may not be on disk yet), and the partial 
+        indexes of the partitions are merged in order. Then, with writers held off, the records changed
+        or added since the build started are indexed again (see _patch_indexes()) and the new indexes 
+        replace the previous ones at once. Meant for internal use only.
+        """
+
+        try:
+            records = build['records']
+            size = max(1, self.mdx_partition_size)
+            bounds = [(start, min(start + size, records)) for start in range(0, records, size)] or [(0, 0)]
+            workers = min(len(bounds), self.mdx_workers or os.cpu_count() or 1)
+            if workers > 1 and self._transaction is None:
+                with ProcessPoolExecutor(workers) as pool:
+                    partials = list(pool.map(self._partial_indexes, repeat(specs), *zip(*bounds)))
+            else:
+                partials = [self._partial_indexes(specs, 0, records)]
+            merged = []
+            for i in range(len(specs)):
+                index = partials[0][i]
+                for partial in partials[1:]:
+                    for value, keys in partial[i].items():
+                        if value in index:
+                            index[value].extend(keys)
+                        else:
+                            index[value] = keys
+                merged.append(index)
+            with self._mdx_lock:
+                self._builds.remove(build)
+                self._patch_indexes(specs, merged, build)
+                built = {name: self._build_index(name, index, kind) for (name, _, kind), index in zip(specs, merged)}
+                previous = [self.indexes[name] for name in built if name in self.indexes]
+                indexes = dict(self.indexes)
+                indexes.update(built)
+                self.indexes = indexes
+        finally:
+            with self._mdx_lock:
+                if build in self._builds:
+                    self._builds.remove(build)
+        for index in previous:
+            index.close()
+
+    def _patch_indexes(self, specs:List[Tuple[str, List[str], str]], indexes:List[dict], build:SmartDict):
+        """
+        Brings the dicts built by _build_indexes() for 'specs' up to date with the records changed 
+        or added since the build started: they're taken out of the dicts and indexed again 
+        as they are now, or, within the active transaction, as they were when it began 
+        (its changes are indexed when it's committed). Called with _mdx_lock held.
+        Meant for internal use only.
         """
 
-        for field in self.indexes.keys():
-            self.make_mdx(field)
+        transaction = self._transaction
+        end = transaction['records'] if transaction is not None else self.header.records
+        changed = build['changed'] | set(range(build['records'], end))
+        if not changed:
+            return
+        for index in indexes:
+            for value in list(index):
+                keys = [key for key in index[value] if key not in changed]
+                if keys:
+                    index[value] = keys
+                else:
+                    del index[value]
+        undo = transaction['undo'] if transaction is not None else {}
+        decode_field = self.decoder.decode_field
+        for key in sorted(changed):
+            if key >= end:
+                break
+            raw = undo.get(key) or self._read_raw(key)
+            if raw[:1] == b'*':
+                continue
+            for (_, fields, kind), index in zip(specs, indexes):
+                value = tuple(decode_field(raw, name) for name in fields)
+                value = value[0] if len(fields) == 1 else value
+                if kind == 'casefold':
+                    value = value.lower()
+                insort(index.setdefault(value, []), key)
+
+    def _partial_indexes(self, specs:List[Tuple[str, List[str], str]], start:int, stop:int) -> List[dict]:
+        """
+        Reads the columns of every field in 'specs', tuples (name, fields, kind), for the records 
+        from 'start' to 'stop' in a single scan, and returns for each spec a dict mapping each value 
+        (lowercased for 'casefold', a tuple for composite indexes) to the ascending list 
+        of the numbers of the records, not deleted, holding it.
+        Runs in the worker processes of _build_indexes(). Meant for internal use only.
+        """
+
+        names = list(dict.fromkeys(name for _, fields, _ in specs for name in fields))
+        columns = self.columns(names + ['deleted'], start, stop)
+        deleted = columns['deleted']
+        for name in names:
+            if self.get_field(name).type == FieldType.LOGICAL.value:
+                columns[name] = [value == 1 for value in columns[name]]
+        partials = []
+        for _, fields, kind in specs:
+            values = columns[fields[0]] if len(fields) == 1 else zip(*(columns[name] for name in fields))
+            if kind == 'casefold':
+                values = [value.lower() for value in values]
+            index = {}
+            for i, (value, gone) in enumerate(zip(values, deleted), start):
+                if gone:
+                    continue
+                if value in index:
+                    index[value].append(i)
+                else:
+                    index[value] = [i]
+            partials.append(index)
+        return partials
+
+    def attach_index(self, path:str) -> List[str]:
+        """
+        Attaches the indexes in a native index file of a dBase or Clipper system (.ndx, .ntx or .mdx)
+        to the fields they index, so that lookups use them right away, with no index to build.
+        Only indexes in ascending order of a single C, N, F or D field, optionally in UPPER() 
+        (attached as a 'casefold' index) or DTOS(), are attached, and only to fields without an index.
+        Native indexes are read only: the first change to the records converts the index of a field 
+        to an index file of pybase3 (dbfname.fieldname.pidx), leaving the native file as it was.
+        Returns the names of the fields the indexes were attached to.
+        """
+
+        fields = {field.name.strip(): (field.type, field.decimal) for field in self.fields}
+        names = {name.upper(): name for name in fields}
+        attached = []
+        for index in open_native(path, fields):
+            name = names[index.fieldname]
+            if name in self.indexes:
+                index.close()
+                continue
+            self.indexes[name] = index
+            attached.append(name)
+        return attached
 
     def del_mdx(self,entry:str="*"):
         """
-        Deletes the .pmdx index file.
+        Deletes the index file of the given field, or of every field if '*'.
+        A composite index is given by its list of fields, or their names joined by '+'.
         """
 
+        if isinstance(entry, (list, tuple)):
+            entry = '+'.join(entry)
         if entry == "*":
-            mdxfile = self.filename.replace('.dbf', '.pmdx')
+            for fieldname in list(self.indexes.keys()):
+                self.del_mdx(fieldname)
+            mdxfile = os.path.splitext(self.filename)[0] + '.pmdx'
             if os.path.exists(mdxfile):
                 os.remove(mdxfile)
-            self.indexes = {}
         else:
             if entry in self.indexes:
-                del self.indexes[entry]
-                self._save_mdx()
+                self.indexes.pop(entry).close()
+                if os.path.exists(self._index_path(entry)):
+                    os.remove(self._index_path(entry))
             else:
                 raise ValueError(f"DbaseFile: Index {entry} not found")
 
@@ -1643,7 +3957,7 @@ class Cursor:
         retval = []
         for _ in range(size):
             record = self.fetchone()
-            if record:
+            if record is not None:
                 retval.append(record)
             else:
                 break
@@ -1684,6 +3998,7 @@ class Connection:
         self.name = os.path.basename(dirname)
         self._files = []
         self.tables = []
+        self._transaction = None
         self._load_files()
 
     def _load_files(self):
@@ -1784,11 +4099,61 @@ class Connection:
         parsertable = sql_parser.parsed['tables'][0]
         for i, table in enumerate(self.tables):
             if table == parsertable:
-                dbf = DbaseFile(self.filenames[i])
+                dbf = self._open_table(i)
                 cursor = dbf.execute(sql_parser, args)
                 return cursor
         raise ValueError(f"DbaseFile: Table '{parsertable}' not found")
 
+    def _open_table(self, i):
+        """
+        Returns a DbaseFile for the i-th table. While a transaction is active, 
+        each table is opened once and joins the transaction.
+        For private use by 'execute' method.
+        """
+
+        if self._transaction is None:
+            return DbaseFile(self.filenames[i])
+        filename = self.filenames[i]
+        if filename not in self._transaction:
+            dbf = DbaseFile(filename)
+            dbf.begin()
+            self._transaction[filename] = dbf
+        return self._transaction[filename]
+
+    def begin(self):
+        """
+        Starts a transaction: the tables touched by the following commands 
+        are kept open and their changes are deferred until commit() or undone by rollback().
+        """
+
+        if self._transaction is not None:
+            raise ValueError("Connection: A transaction is already active")
+        self._transaction = {}
+
+    def commit(self):
+        """
+        Commits the active transaction, if any, on every table it touched.
+        Complies with the Python DB API 2.0 specification.
+        """
+
+        if self._transaction is None:
+            return
+        tables, self._transaction = self._transaction, None
+        for dbf in tables.values():
+            dbf.commit_transaction()
+
+    def rollback(self):
+        """
+        Rolls back the active transaction, if any, on every table it touched.
+        Complies with the Python DB API 2.0 specification.
+        """
+
+        if self._transaction is None:
+            return
+        tables, self._transaction = self._transaction, None
+        for dbf in tables.values():
+            dbf.rollback()
+
 
 def connect(dirname:str):
     """Returns a Connection object for the specified directory."""
@@ -0,0 +1,1113 @@
+#-*- coding: utf-8 -*-
+
+# Provides the binary on-disk formats of the field indexes of a DBase III table (.pidx files):
+# sorted keys (FieldIndex) and bitmaps of low cardinality fields (BitmapIndex).
+
+
+# Import the necessary modules.
+import struct, os, sys, tempfile, math, zlib
+from array import array
+from bisect import insort, bisect_left
+from datetime import datetime
+from heapq import merge
+from itertools import takewhile, accumulate, chain, compress
+from operator import itemgetter
+from mmap import mmap as memmap, ACCESS_READ
+
+
+class KeyCodec:
+    """
+    Order preserving, fixed width binary encoding of the keys of an index,
+    so that the encoded keys sort as the keys themselves and can be binary searched as bytes.
+    Key types: 'C' text (latin1, NUL padded to the width), 'c' case folded text 
+    (as 'C', but lowercased first, so that 'Smith' and 'SMITH' are the same key), 'q' integers, 
+    'd' floats, 'D' dates ('' for blank dates), 'L' logicals and 'T' tuples, the keys of composite indexes,
+    encoded as the concatenation of the encodings of their items by the codecs of the parts.
+    """
+
+    widths = {'q': 8, 'd': 8, 'D': 8, 'L': 1}
+
+    def __init__(self, keytype: str, width: int = 0, parts: list = None):
+        """
+        Initializes the codec.
+
+        :param keytype: One of 'C', 'c', 'q', 'd', 'D', 'L', 'T'.
+        :param width: Width of the encoded keys, only needed for 'C' and 'c' keys.
+        :param parts: Codecs of the items of 'T' keys.
+        """
+
+        if keytype not in ('C', 'c', 'q', 'd', 'D', 'L', 'T'):
+            raise ValueError(f"KeyCodec: Unknown key type {keytype}")
+        if (keytype == 'T') != bool(parts):
+            raise ValueError("KeyCodec: The parts are needed for, and only for, 'T' keys")
+        self.keytype = keytype
+        self.parts = parts or []
+        if keytype == 'T':
+            width = sum(part.width for part in self.parts)
+        self.width = self.widths.get(keytype) or max(1, width)
+        self.encode = getattr(self, f'_encode_{keytype}')
+        self.decode = getattr(self, f'_decode_{keytype}')
+
+    @classmethod
+    def for_field(cls, fieldtype: str, length: int, decimal: int = 0) -> 'KeyCodec':
+        """
+        Returns the codec for the values of a field of the given type, length and decimals,
+        as decoded from a table, or None for field types without a key encoding (e.g. memos).
+        """
+
+        if fieldtype == 'C':
+            return cls('C', length)
+        if fieldtype == 'N' and not decimal:
+            return cls('q')
+        if fieldtype in ('N', 'F'):
+            return cls('d')
+        if fieldtype in ('D', 'L'):
+            return cls(fieldtype)
+        return None
+
+    @classmethod
+    def for_values(cls, values) -> 'KeyCodec':
+        """
+        Returns a codec able to encode all of the given values.
+        Raises ValueError if they are of mixed, incompatible types.
+        """
+
+        values = list(values)
+        if values and all(isinstance(value, tuple) for value in values):
+            if len({len(value) for value in values}) == 1:
+                return cls('T', parts=[cls.for_values(items) for items in zip(*values)])
+        kinds = set()
+        width = 1
+        for value in values:
+            if isinstance(value, bool):
+                kinds.add('L')
+            elif isinstance(value, int):
+                kinds.add('q' if -2 ** 63 <= value < 2 ** 63 else 'd')
+            elif isinstance(value, float):
+                kinds.add('d')
+            elif hasattr(value, 'year'):
+                kinds.add('D')
+            elif isinstance(value, str):
+                kinds.add('blank' if value == '' else 'C')
+                width = max(width, len(value.encode('latin1', 'replace')))
+            else:
+                raise ValueError(f"KeyCodec: Can't index values of type {type(value).__name__}")
+        if 'D' in kinds and kinds <= {'D', 'blank'}:
+            return cls('D')
+        kinds.discard('blank')
+        if not kinds or kinds == {'C'}:
+            return cls('C', width)
+        if kinds == {'L'}:
+            return cls('L')
+        if kinds == {'q'}:
+            return cls('q')
+        if kinds <= {'q', 'd'}:
+            return cls('d')
+        raise ValueError(f"KeyCodec: Can't index values of mixed types ({', '.join(sorted(kinds))})")
+
+    def _encode_C(self, value):
+        if not isinstance(value, str):
+            return None
+        try:
+            raw = value.encode('latin1')
+        except UnicodeEncodeError:
+            return None
+        if len(raw) > self.width:
+            return None
+        return raw.ljust(self.width, b'\x00')
+
+    def _decode_C(self, raw):
+        return bytes(raw).rstrip(b'\x00').decode('latin1')
+
+    def fold(self, value):
+        """
+        Returns the value as stored in the index: lowercased for 'c' keys, unchanged otherwise.
+        """
+
+        return value.lower() if self.keytype == 'c' and isinstance(value, str) else value
+
+    def _encode_c(self, value):
+        return self._encode_C(value.lower() if isinstance(value, str) else value)
+
+    _decode_c = _decode_C
+
+    def _encode_q(self, value):
+        if isinstance(value, float):
+            if not value.is_integer():
+                return None
+            value = int(value)
+        if not isinstance(value, int) or not -2 ** 63 <= value < 2 ** 63:
+            return None
+        return struct.pack('>Q', value + 2 ** 63)
+
+    def _decode_q(self, raw):
+        return struct.unpack('>Q', raw)[0] - 2 ** 63
+
+    def _encode_d(self, value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        bits = struct.unpack('>Q', struct.pack('>d', float(value) + 0.0))[0]
+        return struct.pack('>Q', bits ^ 0xFFFFFFFFFFFFFFFF if bits >> 63 else bits | 1 << 63)
+
+    def _decode_d(self, raw):
+        bits = struct.unpack('>Q', raw)[0]
+        return struct.unpack('>d', struct.pack('>Q', bits & ~(1 << 63) if bits >> 63 else bits ^ 0xFFFFFFFFFFFFFFFF))[0]
+
+    def _encode_D(self, value):
+        if value == '':
+            return b'\x00' * 8
+        if not hasattr(value, 'year'):
+            return None
+        return b'%04d%02d%02d' % (value.year, value.month, value.day)
+
+    def _decode_D(self, raw):
+        if raw == b'\x00' * 8:
+            return ''
+        return datetime(int(raw[:4]), int(raw[4:6]), int(raw[6:8]))
+
+    def _encode_L(self, value):
+        if not isinstance(value, int):
+            return None
+        return b'\x01' if value else b'\x00'
+
+    def _decode_L(self, raw):
+        return raw == b'\x01'
+
+    def _encode_T(self, value):
+        if not isinstance(value, tuple) or len(value) != len(self.parts):
+            return None
+        raws = [part.encode(item) for part, item in zip(self.parts, value)]
+        if None in raws:
+            return None
+        return b''.join(raws)
+
+    def _decode_T(self, raw):
+        items = []
+        pos = 0
+        for part in self.parts:
+            items.append(part.decode(raw[pos:pos + part.width]))
+            pos += part.width
+        return tuple(items)
+
+    def bound(self, value, inclusive: bool = True, upper: bool = False):
+        """
+        Returns the encoded form of a range bound and whether it's inclusive, converting
+        the bound when needed: dates given as 'YYYYMMDD' or 'YYYY-MM-DD', non integral bounds
+        of integer keys, and text longer than the key width.
+        The bounds of 'T' keys may hold just their leading items, standing for every key starting with them.
+        Returns (None, inclusive) if the value can't be compared with the keys.
+        """
+
+        if self.keytype == 'T':
+            if not isinstance(value, tuple) or not 0 < len(value) <= len(self.parts):
+                return None, inclusive
+            raws = [part.encode(item) for part, item in zip(self.parts, value)]
+            if None in raws:
+                return None, inclusive
+            raw = b''.join(raws)
+            if len(raw) < self.width and upper == inclusive:
+                # Past every key starting with the given items
+                raw += b'\xff' * (self.width - len(raw))
+            return raw, inclusive
+        if self.keytype == 'D' and isinstance(value, str) and value:
+            text = value.replace('-', '')
+            try:
+                value = datetime(int(text[:4]), int(text[4:6]), int(text[6:8]))
+            except ValueError:
+                return None, inclusive
+        elif self.keytype == 'q' and isinstance(value, float) and not value.is_integer():
+            if math.isnan(value):
+                return None, inclusive
+            value = math.floor(value) if upper else math.ceil(value)
+            inclusive = True
+        elif self.keytype in ('C', 'c') and isinstance(value, str):
+            raw = self.fold(value).encode('latin1', 'replace')
+            if len(raw) > self.width:
+                # Keys equal to the truncated bound are shorter, hence lower, than the bound
+                return raw[:self.width], upper
+        return self.encode(value), inclusive
+
+    def sort_key(self, value):
+        """
+        Returns a sort key placing the values in index order:
+        encodable values by their encoding, then any other values.
+        """
+
+        raw = self.encode(value)
+        return (0, raw) if raw is not None else (1, str(value).encode('latin1', 'replace'))
+
+
+def _pack_value(value) -> bytes:
+    """Returns a self describing binary representation of an index key, used by the change log."""
+
+    if isinstance(value, tuple):
+        # The length of a tuple is the number of its items, packed after it
+        return struct.pack('<cH', b'T', len(value)) + b''.join(_pack_value(item) for item in value)
+    if isinstance(value, bool):
+        tag, text = b'b', '1' if value else '0'
+    elif isinstance(value, int):
+        tag, text = b'i', str(value)
+    elif isinstance(value, float):
+        tag, text = b'f', repr(value)
+    elif hasattr(value, 'year'):
+        tag, text = b'D', value.strftime('%Y%m%d')
+    else:
+        tag, text = b's', str(value)
+    raw = text.encode('latin1', 'replace')
+    return struct.pack('<cH', tag, len(raw)) + raw
+
+
+def _unpack_value(buffer, pos: int):
+    """Inverse of _pack_value(): returns (value, position past it)."""
+
+    tag, length = struct.unpack_from('<cH', buffer, pos)
+    pos += 3
+    if tag == b'T':
+        items = []
+        for _ in range(length):
+            item, pos = _unpack_value(buffer, pos)
+            items.append(item)
+        return tuple(items), pos
+    text = bytes(buffer[pos:pos + length]).decode('latin1')
+    if len(text) != length:
+        raise ValueError("Truncated value")
+    if tag == b'b':
+        value = text == '1'
+    elif tag == b'i':
+        value = int(text)
+    elif tag == b'f':
+        value = float(text)
+    elif tag == b'D':
+        value = datetime(int(text[:4]), int(text[4:6]), int(text[6:8]))
+    else:
+        value = text
+    return value, pos + length
+
+
+class FieldIndex:
+    """
+    Index of a field of a table: maps each value of the field to the ascending list of
+    the numbers of the records holding it, and behaves as a read only dict of them.
+
+    The .pidx file holds a 32 bytes header (magic, version, key type, key width, number of keys,
+    number of record numbers, position of the change log), the sorted keys as fixed width,
+    order preserving binary strings, the offsets of the record numbers of each key (uint32)
+    and the record numbers themselves (uint32), followed by a log of changes.
+    The keys of a composite index ('T' key type) are preceded by the number of its parts (uint16) 
+    and the key type and width of each one.
+    The file is memory mapped and keys are binary searched, so opening an index doesn't load it.
+
+    Changes made with add() and remove() are kept in memory, and persisted by appending them
+    to the log (see log()), which is replayed when the index is opened,
+    until the index is written whole again by save().
+
+    An index with case folded keys ('c' key type, see KeyCodec) is of the 'casefold' kind: 
+    values are lowercased when added, removed or looked up, so it answers case insensitive 
+    lookups, e.g. of prefixes with prefix(), and keys() yields the lowercased values. 
+    Other indexes are of the 'sorted' kind.
+
+    The keys of a composite index, on several fields, are tuples of their values, and range() 
+    takes bounds holding just their leading items, so that e.g. index.range((branch,), (branch,))
+    finds every key of a branch.
+    """
+
+    magic = b'PIDX'
+    version = 1
+    header = struct.Struct('<4sBcHIIQ8x')
+    part = struct.Struct('<cH')
+    count = struct.Struct('<H')
+    entry = struct.Struct('<cI')
+
+    def __init__(self, path: str):
+        """
+        Opens the index stored in 'path'.
+        """
+
+        self.path = path
+        self._map = None
+        self._numbers = None
+        self._load()
+
+    def _load(self):
+        """
+        Maps the index file and replays its change log. Meant for internal use only.
+        """
+
+        self.close()
+        self._added = {}
+        self._removed = {}
+        self.logged = 0
+        with open(self.path, 'rb') as file:
+            head = file.read(self.header.size)
+            if len(head) < self.header.size:
+                raise ValueError(f"FieldIndex: {self.path} is not an index file")
+            magic, version, keytype, width, nkeys, npostings, logstart = self.header.unpack(head)
+            if magic != self.magic or version != self.version:
+                raise ValueError(f"FieldIndex: {self.path} is not an index file")
+            self._map = memmap(file.fileno(), 0, access=ACCESS_READ)
+        keytype = keytype.decode('latin1')
+        self._keys_at = self.header.size
+        parts = None
+        if keytype == 'T':
+            parts = []
+            nparts, = self.count.unpack_from(self._map, self._keys_at)
+            self._keys_at += self.count.size
+            for _ in range(nparts):
+                parttype, partwidth = self.part.unpack_from(self._map, self._keys_at)
+                parts.append(KeyCodec(parttype.decode('latin1'), partwidth))
+                self._keys_at += self.part.size
+        self.codec = KeyCodec(keytype, width, parts)
+        self.nkeys = nkeys
+        self._offsets_at = self._keys_at + nkeys * self.codec.width
+        self._postings_at = self._offsets_at + (nkeys + 1) * 4
+        self._offsets = struct.Struct(f'<{nkeys + 1}I')
+        pos = logstart
+        while pos + self.entry.size <= len(self._map):
+            try:
+                op, key = self.entry.unpack_from(self._map, pos)
+                value, pos = _unpack_value(self._map, pos + self.entry.size)
+            except (struct.error, ValueError):
+                # Torn write at the end of the log
+                break
+            self._apply(op, value, key)
+            self.logged += 1
+
+    def close(self):
+        """
+        Releases the memory mapped view of the index file.
+        """
+
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._numbers = None
+
+    @property
+    def kind(self) -> str:
+        """
+        Returns 'casefold' for an index with case folded keys, 'sorted' otherwise.
+        """
+
+        return 'casefold' if self.codec.keytype == 'c' else 'sorted'
+
+    def _key_at(self, i: int) -> bytes:
+        start = self._keys_at + i * self.codec.width
+        return self._map[start:start + self.codec.width]
+
+    def _bisect(self, raw: bytes, right: bool = False, lo: int = 0) -> int:
+        """
+        Returns the position where the encoded key 'raw' would be inserted among the saved keys
+        from position 'lo' on, after any equal key if 'right'. Meant for internal use only.
+        """
+
+        hi = self.nkeys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key = self._key_at(mid)
+            if key < raw or (right and key == raw):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _find(self, value) -> int:
+        """
+        Returns the position of 'value' among the saved keys, -1 if not there. Meant for internal use only.
+        """
+
+        raw = self.codec.encode(value)
+        if raw is None:
+            return -1
+        i = self._bisect(raw)
+        return i if i < self.nkeys and self._key_at(i) == raw else -1
+
+    def _postings(self, i: int) -> list:
+        """
+        Returns the saved record numbers of the i-th key. Meant for internal use only.
+        """
+
+        start, end = struct.unpack_from('<II', self._map, self._offsets_at + i * 4)
+        postings = array('I')
+        postings.frombytes(self._map[self._postings_at + start * 4:self._postings_at + end * 4])
+        if sys.byteorder == 'big':
+            postings.byteswap()
+        return postings.tolist()
+
+    def get(self, value, default=None):
+        """
+        Returns the ascending list of the numbers of the records holding 'value', 'default' if there are none.
+        """
+
+        value = self.codec.fold(value)
+        i = self._find(value)
+        return self._changed(value, self._postings(i) if i >= 0 else []) or default
+
+    def get_many(self, values) -> dict:
+        """
+        Returns a dict mapping each of the given values held by the index (lowercased for a 'casefold' index)
+        to the ascending list of the numbers of the records holding it. The values are looked up 
+        in ascending order, each search starting where the previous one ended. 
+        8 bytes wide keys (numbers and dates) are searched as an array of integers.
+        """
+
+        codec = self.codec
+        found = {}
+        probes = []
+        for value in {codec.fold(value) for value in values}:
+            raw = codec.encode(value)
+            if raw is None:
+                # Only among the values added since the index was saved
+                keys = self._changed(value, [])
+                if keys:
+                    found[value] = keys
+            else:
+                probes.append((raw, value))
+        probes.sort(key=itemgetter(0))
+        if codec.width == 8:
+            numbers = self._key_numbers()
+            probes = [(int.from_bytes(raw, 'big'), value) for raw, value in probes]
+            search = lambda key, lo: bisect_left(numbers, key, lo)
+            key_at = numbers.__getitem__
+        else:
+            search, key_at = self._gallop, self._key_at
+        i = 0
+        for raw, value in probes:
+            i = search(raw, i)
+            saved = self._postings(i) if i < self.nkeys and key_at(i) == raw else []
+            keys = self._changed(value, saved)
+            if keys:
+                found[value] = keys
+        return found
+
+    def _key_numbers(self) -> array:
+        """
+        Returns the saved 8 bytes wide keys as an array of unsigned integers, which sort as the keys.
+        Meant for internal use only.
+        """
+
+        if self._numbers is None:
+            numbers = array('Q')
+            numbers.frombytes(self._map[self._keys_at:self._offsets_at])
+            if sys.byteorder == 'little':
+                numbers.byteswap()
+            self._numbers = numbers
+        return self._numbers
+
+    def _gallop(self, raw: bytes, lo: int) -> int:
+        """
+        Returns the position of the encoded key 'raw' among the saved keys, as _bisect(), 
+        knowing it's not before 'lo': the keys are probed at growing distances from 'lo' first, 
+        so that a near position takes a few probes. Meant for internal use only.
+        """
+
+        step = 1
+        while lo + step < self.nkeys and self._key_at(lo + step) < raw:
+            lo += step
+            step *= 2
+        hi = min(lo + step, self.nkeys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < raw:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _changed(self, value, keys: list) -> list:
+        """
+        Returns the saved record numbers 'keys' of 'value' with the changes made since the index was saved.
+        Meant for internal use only.
+        """
+
+        removed = self._removed.get(value)
+        if removed:
+            keys = [key for key in keys if key not in removed]
+        added = self._added.get(value)
+        if added:
+            keys = list(merge(keys, added))
+        return keys
+
+    def __getitem__(self, value):
+        keys = self.get(value)
+        if keys is None:
+            raise KeyError(value)
+        return keys
+
+    def __contains__(self, value):
+        return self.get(value) is not None
+
+    def keys(self):
+        """
+        Yields the indexed values, in index order.
+        """
+
+        sort_key = self.codec.sort_key
+        saved = (self.codec.decode(self._key_at(i)) for i in range(self.nkeys))
+        new = sorted((value for value in self._added if self._find(value) < 0), key=sort_key)
+        for value in merge(saved, new, key=sort_key) if new else saved:
+            if value in self._removed and self.get(value) is None:
+                continue
+            yield value
+
+    __iter__ = keys
+
+    def range(self, low=None, high=None, low_inclusive: bool = True, high_inclusive: bool = True,
+              reverse: bool = False):
+        """
+        Returns an iterator of (value, record numbers) pairs for the indexed values from 'low' to 'high' 
+        (None for no bound), in index order, or in reverse order if 'reverse'.
+        The saved keys are binary searched, so this takes O(log n + k).
+        Raises ValueError if a bound can't be compared with the keys.
+        """
+
+        codec = self.codec
+        low_raw = high_raw = None
+        if low is not None:
+            low_raw, low_inclusive = codec.bound(low, low_inclusive)
+            if low_raw is None:
+                raise ValueError(f"FieldIndex: Can't compare {low!r} with the keys of {self.path}")
+        if high is not None:
+            high_raw, high_inclusive = codec.bound(high, high_inclusive, upper=True)
+            if high_raw is None:
+                raise ValueError(f"FieldIndex: Can't compare {high!r} with the keys of {self.path}")
+        first = 0 if low_raw is None else self._bisect(low_raw, right=not low_inclusive)
+        last = self.nkeys if high_raw is None else self._bisect(high_raw, right=high_inclusive)
+        last = max(first, last)
+
+        def inside(raw):
+            return ((low_raw is None or raw > low_raw or (low_inclusive and raw == low_raw)) and
+                    (high_raw is None or raw < high_raw or (high_inclusive and raw == high_raw)))
+
+        return self._range(first, last, inside, reverse)
+
+    def _range(self, first: int, last: int, inside, reverse: bool):
+        """
+        Yields the (value, record numbers) pairs of the saved keys from position 'first' to 'last' 
+        and of the values added since the index was saved whose encoded key is 'inside', 
+        for range(). Meant for internal use only.
+        """
+
+        codec = self.codec
+        positions = range(last - 1, first - 1, -1) if reverse else range(first, last)
+        saved = ((self._key_at(i), i, None) for i in positions)
+        # Values added since the index was saved, which don't fit its key type, are left out
+        new = sorted(((raw, -1, value) for raw, value in ((codec.encode(value), value) for value in self._added)
+                      if raw is not None and self._find(value) < 0 and inside(raw)), reverse=reverse)
+        for raw, i, value in merge(saved, new, key=lambda entry: entry[0], reverse=reverse) if new else saved:
+            if i >= 0:
+                value = codec.decode(raw)
+                keys = self._changed(value, self._postings(i))
+            else:
+                keys = self._changed(value, [])
+            if keys:
+                yield value, keys
+
+    def prefix(self, text: str, reverse: bool = False):
+        """
+        Returns an iterator of (value, record numbers) pairs for the indexed text values starting with 'text' 
+        (case insensitively for a 'casefold' index), in index order, or in reverse order if 'reverse'.
+        Raises ValueError if the index doesn't hold text.
+        """
+
+        if self.codec.keytype not in ('C', 'c') or not isinstance(text, str):
+            raise ValueError(f"FieldIndex: {self.path} doesn't index text")
+        text = self.codec.fold(text)
+        matches = takewhile(lambda item: item[0].startswith(text), self.range(text))
+        return reversed(list(matches)) if reverse else matches
+
+    def values(self):
+        return (self.get(value) for value in self.keys())
+
+    def items(self):
+        return ((value, self.get(value)) for value in self.keys())
+
+    def __len__(self):
+        return sum(1 for _ in self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, (FieldIndex, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return f"FieldIndex({self.path!r}, keys={self.nkeys}, logged={self.logged})"
+
+    def _apply(self, op: bytes, value, key: int):
+        value = self.codec.fold(value)
+        if op == b'+':
+            removed = self._removed.get(value)
+            if removed and key in removed:
+                removed.discard(key)
+                return
+            keys = self._added.setdefault(value, [])
+            if not keys or keys[-1] < key:
+                keys.append(key)
+            else:
+                insort(keys, key)
+        else:
+            keys = self._added.get(value)
+            if keys and key in keys:
+                keys.remove(key)
+                if not keys:
+                    del self._added[value]
+                return
+            self._removed.setdefault(value, set()).add(key)
+
+    def add(self, value, key: int):
+        """
+        Adds record number 'key' to the records holding 'value'.
+        """
+
+        self._apply(b'+', value, key)
+
+    def remove(self, value, key: int):
+        """
+        Removes record number 'key' from the records holding 'value'.
+        """
+
+        self._apply(b'-', value, key)
+
+    def log(self, changes):
+        """
+        Appends changes already made with add() and remove(), given as ('+' or '-', value, key) tuples,
+        to the change log of the index file.
+        """
+
+        entries = [self.entry.pack(op.encode('latin1'), key) + _pack_value(value) for op, value, key in changes]
+        if not entries:
+            return
+        with open(self.path, 'ab') as file:
+            file.write(b''.join(entries))
+        self.logged += len(entries)
+
+    def save(self):
+        """
+        Writes the whole index again, changes included, emptying the change log.
+        """
+
+        items = list(self.items())
+        self.close()
+        self.write(self.path, items, self.codec)
+        self._load()
+
+    @classmethod
+    def build(cls, path: str, index: dict, codec: KeyCodec = None) -> 'FieldIndex':
+        """
+        Writes a dict mapping values to lists of record numbers as an index file and opens it.
+        See write() for 'codec'.
+        """
+
+        cls.write(path, index.items(), codec)
+        return cls(path)
+
+    @classmethod
+    def write(cls, path: str, items, codec: KeyCodec = None):
+        """
+        Writes (value, ascending record numbers) pairs as an index file, in a single sequential pass,
+        to a temporary file which then atomically replaces 'path'.
+        The keys are encoded with 'codec' if given and able to encode all of them 
+        (e.g. KeyCodec.for_field(), so that any later value of the field fits), 
+        otherwise with a codec chosen for them.
+        """
+
+        items = [(value, keys) for value, keys in items if keys]
+        if codec is not None and codec.keytype == 'c':
+            # Values differing only in case become one key
+            folded = {}
+            fold = codec.fold
+            for value, keys in items:
+                value = fold(value)
+                folded[value] = sorted(folded[value] + keys) if value in folded else keys
+            items = list(folded.items())
+        encoded = [(codec.encode(value), keys) for value, keys in items] if codec is not None else None
+        if encoded is None or any(raw is None for raw, _ in encoded):
+            codec = KeyCodec.for_values(value for value, _ in items)
+            encoded = [(codec.encode(value), keys) for value, keys in items]
+        encoded.sort(key=itemgetter(0))
+        nkeys = len(encoded)
+        npostings = sum(len(keys) for _, keys in encoded)
+        descriptor = b''
+        if codec.keytype == 'T':
+            descriptor = cls.count.pack(len(codec.parts)) + b''.join(
+                cls.part.pack(part.keytype.encode('latin1'), part.width) for part in codec.parts)
+        logstart = cls.header.size + len(descriptor) + nkeys * codec.width + (nkeys + 1) * 4 + npostings * 4
+        fd, tmpname = tempfile.mkstemp(suffix='.pidx', dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(cls.header.pack(cls.magic, cls.version, codec.keytype.encode('latin1'),
+                                           codec.width, nkeys, npostings, logstart))
+                file.write(descriptor)
+                file.write(b''.join(raw for raw, _ in encoded))
+                offsets = array('I', accumulate((len(keys) for _, keys in encoded), initial=0))
+                postings = array('I', chain.from_iterable(keys for _, keys in encoded))
+                if sys.byteorder == 'big':
+                    offsets.byteswap()
+                    postings.byteswap()
+                file.write(offsets.tobytes())
+                file.write(postings.tobytes())
+            os.replace(tmpname, path)
+        except BaseException:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            raise
+
+
+# Maps the binary digits of a bitmap to the flags taken by compress(), used by bit_positions()
+_BINARY_FLAGS = bytes.maketrans(b'01', b'\x00\x01')
+
+
+def bitmap_of(keys) -> int:
+    """
+    Returns the bitmap (a Python int used as a bitset) with the bits of the given record numbers set.
+    """
+
+    keys = list(keys)
+    if not keys:
+        return 0
+    buffer = bytearray((max(keys) >> 3) + 1)
+    for key in keys:
+        buffer[key >> 3] |= 1 << (key & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def bit_positions(bits: int) -> list:
+    """
+    Returns the ascending list of the positions of the set bits of a bitmap, i.e. the record numbers it holds.
+    """
+
+    if bits <= 0:
+        return []
+    if bits.bit_count() * 8 > bits.bit_length():
+        # Dense: every bit is checked, by compress()
+        flags = format(bits, 'b')[::-1].encode('latin1').translate(_BINARY_FLAGS)
+        return list(compress(range(len(flags)), flags))
+    # Sparse: only the 64 bits words with bits set are looked into
+    words = array('Q', bits.to_bytes((bits.bit_length() + 63) >> 6 << 3, 'little'))
+    if sys.byteorder == 'big':
+        words.byteswap()
+    positions = []
+    for i in compress(range(len(words)), words):
+        word, base = words[i], i << 6
+        while word:
+            low = word & -word
+            positions.append(base + low.bit_length() - 1)
+            word ^= low
+    return positions
+
+
+class BitmapIndex:
+    """
+    Bitmap index of a field of a table: maps each value of the field to a bitmap of the records holding it,
+    a Python int whose bit n is set if record n holds the value, and behaves as a read only dict of
+    the ascending lists of their numbers, as FieldIndex does.
+    Meant for fields with few distinct values (logicals, status or region codes, ...), whose conditions 
+    are combined by bitwise AND, OR and NOT of the bitmaps (see bitmap() and universe()).
+
+    The file shares the 32 bytes header of FieldIndex (magic, version, key type, key width, 
+    number of values, number of bits, position of the change log), followed by, for each value in 
+    index order, its key, as encoded by KeyCodec, the length of its compressed bitmap (uint32) 
+    and the bitmap itself, compressed with zlib, and by a log of changes, as FieldIndex.
+    Bitmaps are decompressed the first time they're used.
+    """
+
+    magic = b'BIDX'
+    version = 1
+    header = FieldIndex.header
+    size = struct.Struct('<I')
+    entry = FieldIndex.entry
+
+    def __init__(self, path: str):
+        """
+        Opens the index stored in 'path'.
+        """
+
+        self.path = path
+        self._load()
+
+    def _load(self):
+        """
+        Reads the index file and replays its change log. Meant for internal use only.
+        """
+
+        self._bits = {}
+        self._blobs = {}
+        self._changes = {}
+        self._sorted = None
+        self._universe = None
+        self.logged = 0
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        if len(data) < self.header.size:
+            raise ValueError(f"BitmapIndex: {self.path} is not an index file")
+        magic, version, keytype, width, nvalues, self.nbits, logstart = self.header.unpack_from(data, 0)
+        if magic != self.magic or version != self.version:
+            raise ValueError(f"BitmapIndex: {self.path} is not an index file")
+        self.codec = KeyCodec(keytype.decode('latin1'), width)
+        pos = self.header.size
+        for _ in range(nvalues):
+            value = self.codec.decode(data[pos:pos + width])
+            length, = self.size.unpack_from(data, pos + width)
+            pos += width + self.size.size
+            self._bits[value] = None
+            self._blobs[value] = (pos, length)
+            pos += length
+        self._data = data
+        pos = logstart
+        while pos + self.entry.size <= len(data):
+            try:
+                op, key = self.entry.unpack_from(data, pos)
+                value, pos = _unpack_value(data, pos + self.entry.size)
+            except (struct.error, ValueError):
+                # Torn write at the end of the log
+                break
+            self._apply(op, value, key)
+            self.logged += 1
+
+    def close(self):
+        """
+        Nothing to release: the index file is read whole, being small, when the index is opened.
+        """
+
+        pass
+
+    @property
+    def kind(self) -> str:
+        """
+        Returns 'bitmap'.
+        """
+
+        return 'bitmap'
+
+    def bitmap(self, value) -> int:
+        """
+        Returns the bitmap of the records holding 'value' (0 if none).
+        """
+
+        if value not in self._bits:
+            return 0
+        bits = self._bits[value]
+        if bits is None:
+            pos, length = self._blobs.pop(value)
+            bits = int.from_bytes(zlib.decompress(self._data[pos:pos + length]), 'little')
+        changes = self._changes.pop(value, None)
+        if changes:
+            buffer = bytearray(bits.to_bytes(max((bits.bit_length() + 7) >> 3, (max(changes) >> 3) + 1), 'little'))
+            for key, present in changes.items():
+                if present:
+                    buffer[key >> 3] |= 1 << (key & 7)
+                else:
+                    buffer[key >> 3] &= ~(1 << (key & 7)) & 0xFF
+            bits = int.from_bytes(buffer, 'little')
+        self._bits[value] = bits
+        return bits
+
+    def universe(self) -> int:
+        """
+        Returns the bitmap of every record in the index, i.e. of the records not marked as deleted,
+        against which bitmaps are negated: universe() & ~bitmap(value) for the records not holding 'value'.
+        """
+
+        if self._universe is None:
+            bits = 0
+            for value in self._bits:
+                bits |= self.bitmap(value)
+            self._universe = bits
+        return self._universe
+
+    def get(self, value, default=None):
+        """
+        Returns the ascending list of the numbers of the records holding 'value', 'default' if there are none.
+        """
+
+        bits = self.bitmap(value)
+        return bit_positions(bits) if bits else default
+
+    def get_many(self, values) -> dict:
+        """
+        Returns a dict mapping each of the given values held by the index to the ascending list of
+        the numbers of the records holding it.
+        """
+
+        found = {}
+        for value in set(values):
+            keys = self.get(value)
+            if keys:
+                found[value] = keys
+        return found
+
+    def __getitem__(self, value):
+        keys = self.get(value)
+        if keys is None:
+            raise KeyError(value)
+        return keys
+
+    def __contains__(self, value):
+        return self.bitmap(value) != 0
+
+    def keys(self):
+        """
+        Yields the indexed values, in index order.
+        """
+
+        if self._sorted is None:
+            self._sorted = sorted(self._bits, key=self.codec.sort_key)
+        for value in self._sorted:
+            # Unchanged values read from the file hold records
+            if (value in self._blobs and value not in self._changes) or self.bitmap(value):
+                yield value
+
+    __iter__ = keys
+
+    def range(self, low=None, high=None, low_inclusive: bool = True, high_inclusive: bool = True,
+              reverse: bool = False):
+        """
+        Returns an iterator of (value, record numbers) pairs for the indexed values from 'low' to 'high' 
+        (None for no bound), in index order, or in reverse order if 'reverse'.
+        Raises ValueError if a bound can't be compared with the keys.
+        """
+
+        codec = self.codec
+        low_raw = high_raw = None
+        if low is not None:
+            low_raw, low_inclusive = codec.bound(low, low_inclusive)
+            if low_raw is None:
+                raise ValueError(f"BitmapIndex: Can't compare {low!r} with the keys of {self.path}")
+        if high is not None:
+            high_raw, high_inclusive = codec.bound(high, high_inclusive, upper=True)
+            if high_raw is None:
+                raise ValueError(f"BitmapIndex: Can't compare {high!r} with the keys of {self.path}")
+
+        def inside(raw):
+            return raw is not None and (
+                (low_raw is None or raw > low_raw or (low_inclusive and raw == low_raw)) and
+                (high_raw is None or raw < high_raw or (high_inclusive and raw == high_raw)))
+
+        values = [value for value in self.keys() if inside(codec.encode(value))]
+        if reverse:
+            values.reverse()
+        return ((value, self.get(value)) for value in values)
+
+    def prefix(self, text: str, reverse: bool = False):
+        """
+        Returns an iterator of (value, record numbers) pairs for the indexed text values starting with 'text',
+        in index order, or in reverse order if 'reverse'.
+        Raises ValueError if the index doesn't hold text.
+        """
+
+        if self.codec.keytype != 'C' or not isinstance(text, str):
+            raise ValueError(f"BitmapIndex: {self.path} doesn't index text")
+        values = [value for value in self.keys() if value.startswith(text)]
+        if reverse:
+            values.reverse()
+        return ((value, self.get(value)) for value in values)
+
+    def values(self):
+        return (self.get(value) for value in self.keys())
+
+    def items(self):
+        return ((value, self.get(value)) for value in self.keys())
+
+    def __len__(self):
+        return sum(1 for _ in self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, (FieldIndex, BitmapIndex, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return f"BitmapIndex({self.path!r}, values={len(self._bits)}, logged={self.logged})"
+
+    def _apply(self, op: bytes, value, key: int):
+        if value not in self._bits:
+            self._bits[value] = 0
+            self._sorted = None
+        self._changes.setdefault(value, {})[key] = op == b'+'
+        self._universe = None
+
+    def add(self, value, key: int):
+        """
+        Adds record number 'key' to the records holding 'value'.
+        """
+
+        self._apply(b'+', value, key)
+
+    def remove(self, value, key: int):
+        """
+        Removes record number 'key' from the records holding 'value'.
+        """
+
+        self._apply(b'-', value, key)
+
+    def log(self, changes):
+        """
+        Appends changes already made with add() and remove(), given as ('+' or '-', value, key) tuples,
+        to the change log of the index file.
+        """
+
+        entries = [self.entry.pack(op.encode('latin1'), key) + _pack_value(value) for op, value, key in changes]
+        if not entries:
+            return
+        with open(self.path, 'ab') as file:
+            file.write(b''.join(entries))
+        self.logged += len(entries)
+
+    def save(self):
+        """
+        Writes the whole index again, changes included, emptying the change log.
+        """
+
+        self.write(self.path, [(value, self.bitmap(value)) for value in self.keys()], self.codec)
+        self._load()
+
+    @classmethod
+    def build(cls, path: str, index: dict, codec: KeyCodec = None) -> 'BitmapIndex':
+        """
+        Writes a dict mapping values to lists of record numbers as an index file and opens it.
+        See write() for 'codec'.
+        """
+
+        cls.write(path, index.items(), codec)
+        return cls(path)
+
+    @classmethod
+    def write(cls, path: str, items, codec: KeyCodec = None):
+        """
+        Writes (value, ascending record numbers or bitmap) pairs as an index file, 
+        to a temporary file which then atomically replaces 'path'.
+        The keys are encoded with 'codec' if given and able to encode all of them, 
+        otherwise with a codec chosen for them, as FieldIndex.write() does.
+        """
+
+        items = [(value, keys if isinstance(keys, int) else bitmap_of(keys)) for value, keys in items]
+        items = [(value, bits) for value, bits in items if bits]
+        encoded = [(codec.encode(value), bits) for value, bits in items] if codec is not None else None
+        if encoded is None or any(raw is None for raw, _ in encoded):
+            codec = KeyCodec.for_values(value for value, _ in items)
+            encoded = [(codec.encode(value), bits) for value, bits in items]
+        encoded.sort(key=itemgetter(0))
+        nbits = max((bits.bit_length() for _, bits in encoded), default=0)
+        blobs = [zlib.compress(bits.to_bytes((bits.bit_length() + 7) >> 3, 'little')) for _, bits in encoded]
+        fd, tmpname = tempfile.mkstemp(suffix='.pidx', dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                logstart = cls.header.size + sum(codec.width + cls.size.size + len(blob) for blob in blobs)
+                file.write(cls.header.pack(cls.magic, cls.version, codec.keytype.encode('latin1'),
+                                           codec.width, len(encoded), nbits, logstart))
+                for (raw, _), blob in zip(encoded, blobs):
+                    file.write(raw + cls.size.pack(len(blob)) + blob)
+            os.replace(tmpname, path)
+        except BaseException:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            raise
+
+
+def open_index(path: str):
+    """
+    Opens an index file, as a FieldIndex or a BitmapIndex, as its header tells.
+    """
+
+    with open(path, 'rb') as file:
+        magic = file.read(len(BitmapIndex.magic))
+    return BitmapIndex(path) if magic == BitmapIndex.magic else FieldIndex(path)
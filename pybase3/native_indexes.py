@@ -0,0 +1,683 @@
+#-*- coding: utf-8 -*-
+
+# Provides read only access to the B-tree index files of legacy dBase and Clipper systems:
+# dBase III .ndx, Clipper .ntx and dBase IV (production) .mdx files.
+
+
+# Import the necessary modules.
+import struct, os, re
+from datetime import datetime
+from itertools import takewhile
+from mmap import mmap as memmap, ACCESS_READ
+
+
+def parse_expression(expression: str):
+    """
+    Parses the key expression of a native index, returning (field name, function) for the expressions
+    made of a single field, optionally wrapped in UPPER() or DTOS() ('' as function for a plain field),
+    or None for any other expression, which can't stand for the index of a field.
+    """
+
+    match = re.fullmatch(r"\s*(?:(UPPER|DTOS)\s*\(\s*)?(?:\w+\s*->\s*)?(\w+)\s*(\))?\s*", expression, re.IGNORECASE)
+    if not match or bool(match.group(1)) != bool(match.group(3)):
+        return None
+    return match.group(2).upper(), (match.group(1) or '').upper()
+
+
+def _map_file(path: str):
+    """Returns a read only memory mapped view of a file, raising ValueError if it's empty."""
+
+    with open(path, 'rb') as file:
+        if not os.fstat(file.fileno()).st_size:
+            raise ValueError(f"NativeIndex: {path} is empty")
+        return memmap(file.fileno(), 0, access=ACCESS_READ)
+
+
+def _check_size(path: str, data, size: int):
+    """Raises ValueError, closing 'data', if the file is too short to hold a header of 'size' bytes."""
+
+    if len(data) < size:
+        data.close()
+        raise ValueError(f"NativeIndex: {path} is too short for an index file of its type")
+
+
+def _julian(value: datetime) -> int:
+    """Returns the julian day number of a date, as dBase stores dates in numeric keys."""
+
+    return value.toordinal() + 1721425
+
+
+def _from_julian(day: float):
+    """Inverse of _julian(): returns a datetime, '' for a blank date."""
+
+    if not 1721426 <= day < 5373485:
+        return ''
+    return datetime.fromordinal(int(day) - 1721425)
+
+
+def _parse_date(value):
+    """Returns the datetime given as such or as 'YYYYMMDD' / 'YYYY-MM-DD' text, None if it's neither."""
+
+    if hasattr(value, 'year'):
+        return value
+    if isinstance(value, str):
+        digits = value.replace('-', '')
+        try:
+            return datetime(int(digits[:4]), int(digits[4:6]), int(digits[6:8]))
+        except ValueError:
+            return None
+    return None
+
+
+class NativeIndex:
+    """
+    Read only view of a B-tree index file of a legacy dBase or Clipper system,
+    which offers the lookups of FieldIndex (get(), range(), prefix(), keys(), ...)
+    for an index whose key expression is a single field, optionally in UPPER() or DTOS().
+    Record numbers are converted to the 0 based numbers used by pybase3.
+
+    The file is memory mapped and the tree is descended from its root for each lookup,
+    so opening an index reads nothing but its header. Subclasses read the pages of each format.
+    Records marked as deleted are indexed as well, as dBase and Clipper do.
+    """
+
+    native = True
+    descending = False
+
+    def __init__(self, path: str, data, root: int, expression: str, keytype: str, keylength: int,
+                 decimals: int = 0):
+        """
+        Initializes the index.
+
+        :param path: Path of the index file.
+        :param data: Memory mapped contents of the index file.
+        :param root: Page (or offset, depending on the format) of the root of the tree, 0 for an empty tree.
+        :param expression: Key expression of the index.
+        :param keytype: 'C', 'N' or 'D', the type of the keys as stored in the file.
+        :param keylength: Length of the keys.
+        :param decimals: Decimals of numeric keys stored as text.
+        """
+
+        self.path = path
+        self.expression = expression.strip()
+        parsed = parse_expression(self.expression)
+        self.fieldname, self.function = parsed if parsed else (None, None)
+        self.keytype = keytype
+        self.keylength = keylength
+        self.decimals = decimals
+        # Type of the indexed field, set by open_native() from the fields of the table
+        self.fieldtype = 'D' if self.function == 'DTOS' else keytype
+        self._map = data
+        self._root = root
+        # Offset of the first page after the header, checked by _check()
+        self._first = 1
+
+    @property
+    def kind(self) -> str:
+        """
+        Returns 'casefold' for an index on UPPER(field), 'sorted' otherwise.
+        """
+
+        return 'casefold' if self.function == 'UPPER' else 'sorted'
+
+    def close(self):
+        """
+        Releases the memory mapped view of the index file.
+        """
+
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _node(self, page: int):
+        """
+        Returns the entries of a page of the tree, as (child page or 0, record number or None, raw key) tuples,
+        and the page holding the keys after the last entry (0 if none).
+        The record number is None for the entries which only separate child pages.
+        To be implemented by subclasses. Meant for internal use only.
+        """
+
+        raise NotImplementedError
+
+    def _check(self, offset: int, size: int):
+        """
+        Raises ValueError if the 'size' bytes at 'offset' aren't within the file past its header, 
+        as happens with a corrupt file. Meant for internal use only.
+        """
+
+        if offset < self._first or offset + size > len(self._map):
+            raise ValueError(f"NativeIndex: {self.path} is corrupt, a page at {offset} is out of the file")
+
+    @staticmethod
+    def _text_key(raw: bytes) -> bytes:
+        """Returns a raw text key without its padding. Meant for internal use only."""
+
+        return bytes(raw).rstrip(b' \x00')
+
+    def _order(self, raw: bytes):
+        """
+        Returns a key by which the raw keys of the index sort in tree order.
+        Text keys sort by their bytes, stored numbers by their value. Meant for internal use only.
+        """
+
+        return self._text_key(raw)
+
+    def _decode(self, raw: bytes):
+        """
+        Returns the value of a raw key, as decoded from the table: text, a number or a datetime.
+        Meant for internal use only.
+        """
+
+        text = self._text_key(raw).decode('latin1')
+        if self.fieldtype == 'D':
+            return (_parse_date(text) or '') if text.strip() else ''
+        if self.fieldtype in ('N', 'F'):
+            try:
+                return self._number(float(text))
+            except ValueError:
+                return self._number(0)
+        return text.strip()
+
+    def _number(self, number: float):
+        """Returns a number as decoded from the table: an int for a N field without decimals, a float otherwise."""
+
+        if self.fieldtype == 'N' and not self.decimals and float(number).is_integer():
+            return int(number)
+        return float(number)
+
+    def fold(self, value):
+        """
+        Returns the value as stored in the index: uppercased for an index on UPPER(field), unchanged otherwise.
+        """
+
+        return value.upper() if self.function == 'UPPER' and isinstance(value, str) else value
+
+    def _bound(self, value):
+        """
+        Returns the key by which a value compares with the keys of the index (see _order()),
+        None if it can't be compared with them. Meant for internal use only.
+        """
+
+        if self.fieldtype == 'D':
+            date = _parse_date(value)
+            if date is None:
+                return b'' if value == '' else None
+            return b'%04d%02d%02d' % (date.year, date.month, date.day)
+        if not isinstance(value, str):
+            return None
+        return self.fold(value).encode('latin1', 'replace')[:self.keylength].rstrip(b' ')
+
+    def _walk(self, page: int, low=None, high=None, reverse: bool = False):
+        """
+        Yields the (order key, raw key, record number) entries of the subtree rooted at 'page',
+        in tree order (reversed if 'reverse'), skipping the child pages holding only keys
+        below 'low' or above 'high' (order keys, None for no bound). Meant for internal use only.
+        """
+
+        entries, last = self._node(page)
+        order = self._order
+        keys = [order(raw) for _, _, raw in entries]
+        if not reverse:
+            # The keys of a child page are at most the key of its entry
+            for (child, recno, raw), key in zip(entries, keys):
+                if low is not None and key < low:
+                    continue
+                if child:
+                    yield from self._walk(child, low, high, reverse)
+                if recno is not None:
+                    yield key, raw, recno
+                if high is not None and key > high:
+                    return
+            if last:
+                yield from self._walk(last, low, high, reverse)
+        else:
+            # The keys of a child page are at least the key of the previous entry
+            if last and not (high is not None and keys and keys[-1] > high):
+                yield from self._walk(last, low, high, reverse)
+            for i in range(len(entries) - 1, -1, -1):
+                child, recno, raw = entries[i]
+                if recno is not None and (high is None or keys[i] <= high):
+                    yield keys[i], raw, recno
+                if low is not None and keys[i] < low:
+                    return
+                if child and not (high is not None and i > 0 and keys[i - 1] > high):
+                    yield from self._walk(child, low, high, reverse)
+
+    def _groups(self, entries):
+        """
+        Groups consecutive (order key, raw key, record number) entries with the same key into
+        (value, ascending record numbers) pairs. Meant for internal use only.
+        """
+
+        current, raw, recnos = None, None, []
+        for key, keyraw, recno in entries:
+            if recnos and key != current:
+                yield self._decode(raw), sorted(recnos)
+                recnos = []
+            current, raw = key, keyraw
+            recnos.append(recno)
+        if recnos:
+            yield self._decode(raw), sorted(recnos)
+
+    def range(self, low=None, high=None, low_inclusive: bool = True, high_inclusive: bool = True,
+              reverse: bool = False):
+        """
+        Returns an iterator of (value, record numbers) pairs for the indexed values from 'low' to 'high'
+        (None for no bound), in index order, or in reverse order if 'reverse'.
+        Only the pages on the way to the bounds and those holding the values in range are read.
+        Raises ValueError if a bound can't be compared with the keys.
+        """
+
+        bounds = []
+        for value in (low, high):
+            key = None if value is None else self._bound(value)
+            if value is not None and key is None:
+                raise ValueError(f"NativeIndex: Can't compare {value!r} with the keys of {self.path}")
+            bounds.append(key)
+        low_key, high_key = bounds
+
+        def inside(entry):
+            key = entry[0]
+            return ((low_key is None or key > low_key or (low_inclusive and key == low_key)) and
+                    (high_key is None or key < high_key or (high_inclusive and key == high_key)))
+
+        def beyond(entry):
+            key = entry[0]
+            if reverse:
+                return low_key is not None and (key < low_key or (not low_inclusive and key == low_key))
+            return high_key is not None and (key > high_key or (not high_inclusive and key == high_key))
+
+        entries = self._walk(self._root, low_key, high_key, reverse) if self._root else iter(())
+        entries = takewhile(lambda entry: not beyond(entry), entries)
+        return self._groups(entry for entry in entries if inside(entry))
+
+    def get(self, value, default=None):
+        """
+        Returns the ascending list of the numbers of the records holding 'value', 'default' if there are none.
+        """
+
+        if self.fieldtype == 'D' and isinstance(value, str) and value:
+            # Dates are held as such, the text of a date is only taken as a bound of range()
+            return default
+        try:
+            for _, keys in self.range(value, value):
+                return keys
+        except ValueError:
+            pass
+        return default
+
+    def get_many(self, values) -> dict:
+        """
+        Returns a dict mapping each of the given values held by the index to the ascending list of
+        the numbers of the records holding it.
+        """
+
+        found = {}
+        for value in {self.fold(value) for value in values}:
+            keys = self.get(value)
+            if keys:
+                found[value] = keys
+        return found
+
+    def prefix(self, text: str, reverse: bool = False):
+        """
+        Returns an iterator of (value, record numbers) pairs for the indexed text values starting with 'text'
+        (case insensitively for an index on UPPER(field)), in index order, or in reverse order if 'reverse'.
+        Raises ValueError if the index doesn't hold text.
+        """
+
+        if self.fieldtype != 'C' or not isinstance(text, str):
+            raise ValueError(f"NativeIndex: {self.path} doesn't index text")
+        start = self._bound(text)
+        entries = self._walk(self._root, start) if self._root else iter(())
+        entries = takewhile(lambda entry: entry[0].startswith(start), (e for e in entries if e[0] >= start))
+        groups = self._groups(entries)
+        return reversed(list(groups)) if reverse else groups
+
+    def __getitem__(self, value):
+        keys = self.get(value)
+        if keys is None:
+            raise KeyError(value)
+        return keys
+
+    def __contains__(self, value):
+        return self.get(value) is not None
+
+    def items(self):
+        """
+        Returns an iterator of (value, record numbers) pairs for every indexed value, in index order.
+        """
+
+        return self.range()
+
+    def keys(self):
+        """
+        Returns an iterator of the indexed values, in index order.
+        """
+
+        return (value for value, _ in self.range())
+
+    __iter__ = keys
+
+    def values(self):
+        return (keys for _, keys in self.range())
+
+    def __len__(self):
+        return sum(1 for _ in self.range())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.path!r}, expression={self.expression!r})"
+
+
+class NdxIndex(NativeIndex):
+    """
+    dBase III index file (.ndx): 512 bytes pages, character keys or numeric keys stored as doubles
+    (dates as julian day numbers). Only the leaf pages point to records.
+    """
+
+    page_size = 512
+    header = struct.Struct('<IIIHHHH')
+
+    def __init__(self, path: str):
+        """
+        Opens the .ndx file in 'path'.
+        """
+
+        data = _map_file(path)
+        _check_size(path, data, self.page_size)
+        root, _, _, keylength, _, numeric, self._entry_size = self.header.unpack_from(data, 0)
+        expression = bytes(data[24:self.page_size]).split(b'\x00')[0].decode('latin1')
+        super().__init__(path, data, root, expression, 'N' if numeric else 'C', keylength)
+        self._first = self.page_size
+        if self._entry_size < 8 + keylength:
+            self.close()
+            raise ValueError(f"NativeIndex: {path} is corrupt, its keys don't fit in its entries")
+
+    def _node(self, page: int):
+        data, size = self._map, self._entry_size
+        offset = page * self.page_size
+        self._check(offset, 4)
+        count, = struct.unpack_from('<I', data, offset)
+        self._check(offset, 4 + count * size)
+        entries = []
+        for i in range(count):
+            pos = offset + 4 + i * size
+            child, recno = struct.unpack_from('<II', data, pos)
+            entries.append((child, None if child else recno - 1, data[pos + 8:pos + 8 + self.keylength]))
+        # Branch pages hold one more child than keys
+        last = 0
+        if entries and entries[0][0]:
+            self._check(offset, 8 + count * size)
+            last = struct.unpack_from('<I', data, offset + 4 + count * size)[0]
+        return entries, last
+
+    def _order(self, raw: bytes):
+        if self.keytype == 'N':
+            return struct.unpack_from('<d', raw)[0]
+        return self._text_key(raw)
+
+    def _decode(self, raw: bytes):
+        if self.keytype == 'N':
+            number = struct.unpack_from('<d', raw)[0]
+            if self.fieldtype == 'D':
+                return _from_julian(number)
+            return self._number(number)
+        return super()._decode(raw)
+
+    def _bound(self, value):
+        if self.keytype != 'N':
+            return super()._bound(value)
+        if self.fieldtype == 'D':
+            if value == '':
+                return 0.0
+            date = _parse_date(value)
+            return float(_julian(date)) if date is not None else None
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        return float(value)
+
+
+class NtxIndex(NativeIndex):
+    """
+    Clipper index file (.ntx): 1024 bytes pages, each one starting with a table of the offsets of its items,
+    keys stored as text (numbers formatted to the key length, dates as YYYYMMDD).
+    Unlike dBase indexes, every item of a page, leaf or not, points to a record.
+    """
+
+    header = struct.Struct('<HHIIHHHHH')
+
+    def __init__(self, path: str):
+        """
+        Opens the .ntx file in 'path'.
+        """
+
+        data = _map_file(path)
+        _check_size(path, data, 280)
+        _, _, root, _, _, keylength, decimals, _, _ = self.header.unpack_from(data, 0)
+        expression = bytes(data[22:278]).split(b'\x00')[0].decode('latin1')
+        super().__init__(path, data, root, expression, 'C', keylength, decimals)
+        self._first = 1024
+        self.descending = len(data) > 279 and data[279] == 1
+
+    def _node(self, offset: int):
+        data = self._map
+        self._check(offset, 2)
+        count, = struct.unpack_from('<H', data, offset)
+        self._check(offset, 4 + 2 * count)
+        items = struct.unpack_from(f'<{count + 1}H', data, offset + 2)
+        entries = []
+        for item in items[:count]:
+            pos = offset + item
+            self._check(pos, 8 + self.keylength)
+            child, recno = struct.unpack_from('<II', data, pos)
+            entries.append((child, recno - 1, data[pos + 8:pos + 8 + self.keylength]))
+        # The item after the last one only points to the page of the greatest keys
+        self._check(offset + items[count], 4)
+        last = struct.unpack_from('<I', data, offset + items[count])[0]
+        return entries, last
+
+    def _decode(self, raw: bytes):
+        if self.fieldtype not in ('N', 'F'):
+            return super()._decode(raw)
+        text = bytes(raw).decode('latin1')
+        # The digits of negative numbers are stored complemented, so that they sort before the positive ones
+        negative = any(35 <= ord(char) <= 44 for char in text)
+        if negative:
+            text = ''.join(chr(92 - ord(char)) if 35 <= ord(char) <= 44 else char for char in text)
+        try:
+            number = float(text)
+        except ValueError:
+            return self._number(0)
+        return self._number(-number if negative else number)
+
+    def _bound(self, value):
+        if self.fieldtype not in ('N', 'F'):
+            return super()._bound(value)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        text = f"{abs(value):{self.keylength}.{self.decimals}f}".replace(' ', '0')
+        if len(text) > self.keylength:
+            return None
+        if value < 0:
+            text = ''.join(chr(92 - ord(char)) if char.isdigit() else char for char in text)
+        return text.encode('latin1')
+
+
+class MdxTag(NativeIndex):
+    """
+    Tag (index) of a dBase IV multiple index file (.mdx). Pages are addressed in 512 bytes units,
+    character keys are stored as text, numeric keys as 12 bytes BCD numbers and dates as julian day numbers.
+    """
+
+    header = struct.Struct('<IIBcHHHHH')
+
+    def __init__(self, mdx: 'MdxFile', name: str, page: int):
+        """
+        Opens the tag named 'name', whose header is at 'page' of the .mdx file.
+        """
+
+        offset = page * 512
+        if offset + 244 > len(mdx._map):
+            raise ValueError(f"NativeIndex: {mdx.path} is corrupt, the header of tag {name} is out of the file")
+        root, _, keyformat, keytype, _, keylength, _, _, self._item_size = self.header.unpack_from(mdx._map, offset)
+        expression = bytes(mdx._map[offset + 24:offset + 244]).split(b'\x00')[0].decode('latin1')
+        keytype = keytype.decode('latin1').upper()
+        super().__init__(mdx.path, mdx._map, root, expression, 'N' if keytype == 'F' else keytype, keylength)
+        self.name = name
+        self.descending = bool(keyformat & 0x08)
+        self._mdx = mdx
+        self._first = 512
+        if self._item_size < 4 + keylength:
+            raise ValueError(f"NativeIndex: {mdx.path} is corrupt, the keys of tag {name} don't fit in its items")
+
+    def close(self):
+        # The memory mapped view belongs to the MdxFile, released along with its last tag
+        if self._map is not None:
+            self._map = None
+            self._mdx._release()
+
+    def _node(self, page: int):
+        data, size = self._map, self._item_size
+        offset = page * 512
+        self._check(offset, 4)
+        count, = struct.unpack_from('<I', data, offset)
+        if count:
+            self._check(offset, 12 + count * size)
+        # Branch pages hold one more pointer than keys, 0 in leaf pages
+        last = struct.unpack_from('<I', data, offset + 8 + count * size)[0] if count else 0
+        entries = []
+        for i in range(count):
+            pos = offset + 8 + i * size
+            pointer, = struct.unpack_from('<I', data, pos)
+            raw = data[pos + 4:pos + 4 + self.keylength]
+            entries.append((pointer, None, raw) if last else (0, pointer - 1, raw))
+        return entries, last
+
+    @staticmethod
+    def _bcd(raw: bytes):
+        """Returns the value of a 12 bytes BCD number."""
+
+        exponent, flags = raw[0], raw[1]
+        digits = bytes(raw[2:12]).hex()[:(flags >> 2) & 0x1F]
+        if not digits.isdigit():
+            return 0
+        shift = exponent - 0x34 - len(digits)
+        number = int(digits) * 10 ** shift if shift >= 0 else int(digits) / 10 ** -shift
+        return -number if flags & 0x80 else number
+
+    def _order(self, raw: bytes):
+        if self.keytype == 'N':
+            return self._bcd(raw)
+        if self.keytype == 'D':
+            return struct.unpack_from('<d', raw)[0]
+        return self._text_key(raw)
+
+    def _decode(self, raw: bytes):
+        if self.keytype == 'N':
+            return self._number(self._bcd(raw))
+        if self.keytype == 'D':
+            return _from_julian(struct.unpack_from('<d', raw)[0])
+        return super()._decode(raw)
+
+    def _bound(self, value):
+        if self.keytype == 'N':
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return None
+            return value
+        if self.keytype == 'D':
+            if value == '':
+                return 0.0
+            date = _parse_date(value)
+            return float(_julian(date)) if date is not None else None
+        return super()._bound(value)
+
+
+class MdxFile:
+    """
+    dBase IV multiple index file (.mdx), holding up to 48 tags.
+    The production index of a table is named after it (table.mdx) and opened along with it.
+    """
+
+    header = struct.Struct('<B3s16sHHBBBxH')
+
+    def __init__(self, path: str):
+        """
+        Opens the .mdx file in 'path'.
+        """
+
+        self.path = path
+        self._map = _map_file(path)
+        _check_size(path, self._map, 544)
+        _, _, _, _, self.block_size, _, maxtags, entrylength, ntags = self.header.unpack_from(self._map, 0)
+        ntags, entrylength = min(ntags, maxtags or 48), entrylength or 32
+        if 544 + ntags * entrylength > len(self._map) or entrylength < 15:
+            self._map.close()
+            raise ValueError(f"NativeIndex: {path} is corrupt, its tag table is out of the file")
+        self.tags = []
+        try:
+            for i in range(ntags):
+                entry = 544 + i * entrylength
+                page, = struct.unpack_from('<I', self._map, entry)
+                name = bytes(self._map[entry + 4:entry + 15]).split(b'\x00')[0].decode('latin1').strip()
+                if page:
+                    self.tags.append(MdxTag(self, name, page))
+        except ValueError:
+            self.close()
+            raise
+        self._open_tags = len(self.tags)
+        if not self.tags:
+            self.close()
+
+    def _release(self):
+        """Closes the file once all of its tags are closed. Meant for internal use only."""
+
+        self._open_tags -= 1
+        if not self._open_tags:
+            self.close()
+
+    def close(self):
+        """
+        Releases the memory mapped view of the index file.
+        """
+
+        for tag in self.tags:
+            tag._map = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __repr__(self):
+        return f"MdxFile({self.path!r}, tags={[tag.name for tag in self.tags]})"
+
+
+def open_native(path: str, fields: dict) -> list:
+    """
+    Opens a native index file (.ndx, .ntx or .mdx, by its extension) and returns the list of
+    its indexes which can stand for the index of a field of the table: those in ascending order
+    whose key expression is a single character, numeric or date field (see parse_expression()).
+
+    :param path: Path of the index file.
+    :param fields: Maps the names of the fields of the table to their (type, decimals).
+    """
+
+    fields = {name.upper(): field for name, field in fields.items()}
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.mdx':
+        indexes = MdxFile(path).tags
+    elif extension == '.ndx':
+        indexes = [NdxIndex(path)]
+    elif extension == '.ntx':
+        indexes = [NtxIndex(path)]
+    else:
+        raise ValueError(f"NativeIndex: Unknown index file type {extension}")
+    usable = []
+    for index in indexes:
+        fieldtype, decimals = fields.get(index.fieldname, (None, 0))
+        if (fieldtype in ('C', 'N', 'F', 'D') and not index.descending and
+            (index.function != 'UPPER' or fieldtype == 'C') and (index.function != 'DTOS' or fieldtype == 'D') and
+            (fieldtype != 'C' or index.keytype == 'C')):
+            index.fieldtype, index.decimals = fieldtype, decimals
+            usable.append(index)
+        else:
+            index.close()
+    return usable
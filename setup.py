@@ -17,6 +17,9 @@ setup(
         'Operating System :: OS Independent',
     ],
     python_requires='>=3.6',
+    extras_require={
+        'numpy': ['numpy'],
+    },
     entry_points={
         'console_scripts': [
             'pybase3=pybase3.__main__:main',
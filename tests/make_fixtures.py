@@ -0,0 +1,235 @@
+#-*- coding: utf-8 -*-
+
+# Writes the fixtures of test_native_indexes.py: a small table (fixtures/people.dbf) and
+# index files of it in the formats of dBase III (.ndx), Clipper (.ntx) and dBase IV (.mdx),
+# with pages small enough for the trees to have several levels.
+# Run it again only if the fixtures have to change.
+
+
+import os, random, struct, sys
+from datetime import datetime
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pybase3 import DbaseFile
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+JULIAN = 1721425
+
+
+def make_table(path):
+    random.seed(1)
+    names = ['Ann', 'ann', 'Bob', 'Carla', 'Dan', 'Eve', 'Zed']
+    table = DbaseFile.create(path, [('name', 'C', 20, 0), ('qty', 'N', 6, 0),
+                                    ('price', 'N', 10, 2), ('born', 'D', 8, 0)])
+    records = []
+    for i in range(90):
+        born = None if i % 11 == 0 else datetime(1950 + random.randint(0, 60), random.randint(1, 12), random.randint(1, 28))
+        records.append([f'{random.choice(names)} {random.randint(1, 20)}', random.randint(-50, 500),
+                        round(random.uniform(-500, 500), 2), born])
+    table.add_records(records)
+    table.del_record(5)
+    return [dict(record) for record in DbaseFile(path)]
+
+
+def chunks(seq, n):
+    return [seq[i:i + n] for i in range(0, len(seq), n)]
+
+
+def dbase_tree(entries, cap, alloc, write_leaf, write_branch):
+    """Builds a dBase style tree, whose branch keys are the greatest key of each child."""
+
+    level = []
+    for chunk in chunks(entries, cap):
+        page = alloc()
+        write_leaf(page, chunk)
+        level.append((page, chunk[-1][0]))
+    while len(level) > 1:
+        upper = []
+        for chunk in chunks(level, cap + 1):
+            page = alloc()
+            write_branch(page, chunk)
+            upper.append((page, chunk[-1][1]))
+        level = upper
+    return level[0][0] if level else 0
+
+
+def ndx(path, expression, entries, keylength, numeric):
+    group = (8 + keylength + 3) // 4 * 4
+    cap = 4
+    pages = {}
+    counter = [0]
+
+    def alloc():
+        counter[0] += 1
+        return counter[0]
+
+    def leaf(page, chunk):
+        data = bytearray(512)
+        struct.pack_into('<I', data, 0, len(chunk))
+        for i, (key, recno) in enumerate(chunk):
+            struct.pack_into('<II', data, 4 + i * group, 0, recno)
+            data[12 + i * group:12 + i * group + keylength] = key
+        pages[page] = data
+
+    def branch(page, chunk):
+        data = bytearray(512)
+        struct.pack_into('<I', data, 0, len(chunk) - 1)
+        for i, (child, key) in enumerate(chunk):
+            struct.pack_into('<II', data, 4 + i * group, child, 0)
+            if i < len(chunk) - 1:
+                data[12 + i * group:12 + i * group + keylength] = key
+        pages[page] = data
+
+    root = dbase_tree(entries, cap, alloc, leaf, branch)
+    header = bytearray(512)
+    struct.pack_into('<IIIHHHH', header, 0, root, counter[0] + 1, 0, keylength, cap, 1 if numeric else 0, group)
+    header[24:24 + len(expression)] = expression.encode()
+    with open(path, 'wb') as file:
+        file.write(header)
+        for page in range(1, counter[0] + 1):
+            file.write(pages[page])
+
+
+def ntx(path, expression, entries, keylength, decimals=0):
+    itemsize = 8 + keylength
+    cap = 12
+    maxitems = (1024 - 2) // (2 + itemsize) - 1
+    pages = []
+
+    def build(items):
+        if len(items) <= cap:
+            children, separators = [0] * (len(items) + 1), items
+        else:
+            size = (len(items) - cap) / (cap + 1)
+            separators, children, start = [], [], 0
+            for bound in [round(size * (i + 1) + i) for i in range(cap)]:
+                children.append(build(items[start:bound]))
+                separators.append(items[bound])
+                start = bound + 1
+            children.append(build(items[start:]))
+        page = bytearray(1024)
+        struct.pack_into('<H', page, 0, len(separators))
+        base = 2 + 2 * (maxitems + 1)
+        for i in range(maxitems + 1):
+            struct.pack_into('<H', page, 2 + 2 * i, base + i * itemsize)
+        for i, (key, recno) in enumerate(separators):
+            pos = base + i * itemsize
+            struct.pack_into('<II', page, pos, children[i], recno)
+            page[pos + 8:pos + 8 + keylength] = key
+        struct.pack_into('<I', page, base + len(separators) * itemsize, children[len(separators)])
+        pages.append(page)
+        return 1024 * len(pages)
+
+    root = build(entries) if entries else 0
+    header = bytearray(1024)
+    struct.pack_into('<HHIIHHHHH', header, 0, 6, 1, root, 0, itemsize, keylength, decimals, maxitems, maxitems // 2)
+    header[22:22 + len(expression)] = expression.encode()
+    with open(path, 'wb') as file:
+        file.write(header)
+        for page in pages:
+            file.write(page)
+
+
+def bcd(value):
+    sign, digits, exponent = Decimal(str(value)).as_tuple()
+    digits = ''.join(map(str, digits)).lstrip('0')
+    if not digits:
+        return bytes([0x34, 0]) + bytes(10)
+    stripped = digits.rstrip('0')
+    exponent += len(digits) - len(stripped)
+    digits = stripped
+    return (bytes([exponent + len(digits) + 0x34, (0x80 if sign else 0) | (len(digits) << 2)]) +
+            bytes.fromhex(digits.ljust(20, '0')))
+
+
+def mdx(path, tags):
+    blocks = {}
+    counter = [4]
+
+    def alloc():
+        page = counter[0]
+        counter[0] += 2
+        return page
+
+    table = []
+    for name, expression, keytype, keylength, entries in tags:
+        item = (4 + keylength + 3) // 4 * 4
+        cap = 9
+
+        def leaf(page, chunk, item=item, keylength=keylength):
+            data = bytearray(1024)
+            struct.pack_into('<I', data, 0, len(chunk))
+            for i, (key, recno) in enumerate(chunk):
+                struct.pack_into('<I', data, 8 + i * item, recno)
+                data[12 + i * item:12 + i * item + keylength] = key
+            blocks[page] = data
+
+        def branch(page, chunk, item=item, keylength=keylength):
+            data = bytearray(1024)
+            struct.pack_into('<I', data, 0, len(chunk) - 1)
+            for i, (child, key) in enumerate(chunk):
+                struct.pack_into('<I', data, 8 + i * item, child)
+                if i < len(chunk) - 1:
+                    data[12 + i * item:12 + i * item + keylength] = key
+            blocks[page] = data
+
+        header = alloc()
+        root = dbase_tree(entries, cap, alloc, leaf, branch)
+        data = bytearray(1024)
+        struct.pack_into('<IIBcHHHHH', data, 0, root, 0, 0x10, keytype.encode(), 0, keylength, cap, 0, item)
+        data[24:24 + len(expression)] = expression.encode()
+        blocks[header] = data
+        table.append((header, name))
+    header = bytearray(2048)
+    header[0] = 2
+    struct.pack_into('<HHBBBxH', header, 20, 2, 1024, 0, 48, 32, len(table))
+    for i, (page, name) in enumerate(table):
+        struct.pack_into('<I', header, 544 + 32 * i, page)
+        header[548 + 32 * i:548 + 32 * i + len(name)] = name.encode()
+    with open(path, 'wb') as file:
+        file.write(header)
+        for page in range(4, counter[0], 2):
+            file.write(blocks.get(page, bytes(1024)))
+
+
+def julian(value):
+    return float(value.toordinal() + JULIAN) if value else 0.0
+
+
+def ntx_number(value, length, decimals):
+    text = f"{abs(value):{length}.{decimals}f}".replace(' ', '0')
+    if value < 0:
+        # Clipper complements the digits of negative numbers
+        text = ''.join(chr(92 - ord(char)) if char.isdigit() else char for char in text)
+    return text.encode()
+
+
+def main():
+    os.makedirs(FIXTURES, exist_ok=True)
+    for entry in os.listdir(FIXTURES):
+        os.remove(os.path.join(FIXTURES, entry))
+    path = lambda name: os.path.join(FIXTURES, name)
+    records = make_table(path('people.dbf'))
+    recno = lambda record: record['metadata']['index'] + 1
+    pad = lambda text, n: text.encode('latin1').ljust(n, b' ')[:n]
+    ndx(path('name.ndx'), 'NAME', sorted((pad(r['name'], 20), recno(r)) for r in records), 20, False)
+    by = lambda key: sorted(records, key=lambda r: (key(r), recno(r)))
+    ndx(path('qty.ndx'), 'QTY', [(struct.pack('<d', r['qty']), recno(r)) for r in by(lambda r: r['qty'])], 8, True)
+    ndx(path('born.ndx'), 'PEOPLE->BORN',
+        [(struct.pack('<d', julian(r['born'])), recno(r)) for r in by(lambda r: julian(r['born']))], 8, True)
+    ntx(path('uname.ntx'), 'UPPER(NAME)', sorted((pad(r['name'].upper(), 20), recno(r)) for r in records), 20)
+    ntx(path('price.ntx'), 'PRICE', sorted((ntx_number(r['price'], 10, 2), recno(r)) for r in records), 10, 2)
+    ntx(path('born.ntx'), 'DTOS(BORN)',
+        sorted(((r['born'].strftime('%Y%m%d').encode() if r['born'] else b' ' * 8), recno(r)) for r in records), 8)
+    mdx(path('people.mdx'), [
+        ('NAME', 'NAME', 'C', 20, sorted((pad(r['name'], 20), recno(r)) for r in records)),
+        ('QTY', 'QTY', 'N', 12, [(bcd(r['qty']), recno(r)) for r in by(lambda r: r['qty'])]),
+        ('PRICE', 'PRICE', 'N', 12, [(bcd(r['price']), recno(r)) for r in by(lambda r: r['price'])]),
+        ('BORN', 'BORN', 'D', 8, [(struct.pack('<d', julian(r['born'])), recno(r)) for r in by(lambda r: julian(r['born']))]),
+        ('CPLX', 'NAME+STR(QTY)', 'C', 26, [])])
+    print(sorted(os.listdir(FIXTURES)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,489 @@
+#-*- coding: utf-8 -*-
+
+# Checks the lookups answered by the indexes of a table (indexes.py) against a scan of the table:
+# each index is built, changed through the table, reopened, and compared with the same table opened 
+# without indexes.
+
+
+import os, pickle, shutil, sys, tempfile, unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pybase3 import DbaseFile, IndexBuild
+from pybase3.indexes import KeyCodec, FieldIndex
+
+# WHERE clauses on the fields of the table written by make_table()
+CONDITIONS = ["qty = 17", "qty != 17", "qty < 10", "qty >= 40", "qty BETWEEN 5 AND 30", "price > 12.5", 
+              "price <= -3", "name = 'Ann 3'", "name LIKE 'bob%'", "name LIKE 'Bob%'", "name > 'Bobby'", 
+              "paid = 'T'", "paid != 'T'", "day < '2020-06-01'", "day BETWEEN '2020-03-01' AND '2020-09-30'", 
+              "day = ''", "qty > 10 AND paid = 'F'", "paid = 'T' OR qty < 0"]
+
+
+def plain(path):
+    """Opens the table at 'path' with no index, so that every lookup scans it."""
+
+    table = DbaseFile(path)
+    for index in list(table.indexes.values()):
+        index.close()
+    table.indexes = {}
+    return table
+
+
+def select(table, sql):
+    return sorted((tuple(record.values()) for record in table.execute(sql).fetchall()), key=repr)
+
+
+def natural(value):
+    """Sort key of the values of an index: blank dates ('') first, the items of tuples one by one."""
+
+    if isinstance(value, tuple):
+        return tuple(natural(item) for item in value)
+    return (value != '', value)
+
+
+def scan_items(table, name, kind='sorted'):
+    """
+    Returns the values of the index 'name' (a field, or fields joined by '+') mapped to 
+    the numbers of the records holding them, from a scan of the table.
+    """
+
+    fields = name.split('+')
+    groups = {}
+    for record in table.scan():
+        if record['deleted']:
+            continue
+        value = tuple(record[field] for field in fields) if len(fields) > 1 else record[name]
+        if kind == 'casefold':
+            value = value.lower()
+        groups.setdefault(value, []).append(record['metadata']['index'])
+    return groups
+
+
+def scan_order(table, name, kind='sorted'):
+    """Returns the (value, record numbers) pairs of the index 'name', in index order, from a scan of the table."""
+
+    groups = scan_items(table, name, kind)
+    return [(value, groups[value]) for value in sorted(groups, key=natural)]
+
+
+def make_table(path, count=200):
+    table = DbaseFile.create(path, [('name', 'C', 12, 0), ('qty', 'N', 6, 0), ('price', 'N', 9, 2),
+                                    ('paid', 'L', 1, 0), ('day', 'D', 8, 0)])
+    table.add_records([[('Ann', 'ANN', 'bob', 'Bobby', 'carl')[i % 5] + f' {i % 9}', (i * 37) % 101 - 20,
+                        round((i * 7.31) % 50 - 10, 2), i % 3 == 0, None if i % 10 == 0 else datetime(2020, 1 + i % 12, 1 + i % 28)]
+                       for i in range(count)])
+    return table
+
+
+def mutate(table):
+    """Updates, deletes, undeletes and adds records, so that the indexes log changes of every kind."""
+
+    for key in range(1, 200, 7):
+        record = dict(table.get_record(key))
+        record['qty'] += 1000 if key % 2 else 1
+        record['name'] = record['name'].swapcase()
+        record['paid'] = not record['paid']
+        record['day'] = '' if key % 3 == 0 else datetime(2019, 12, 31)
+        table.update_record(key, record)
+    for key in range(2, 200, 11):
+        table.del_record(key)
+    table.del_record(2, False)
+    table.add_records([[f'Zed {i}', 900 + i, -i / 4, i % 2 == 0, datetime(2030, 1, 1 + i)] for i in range(10)])
+
+
+class IndexTestCase(unittest.TestCase):
+    """Base of the tests of the indexes of the table written by make_table()."""
+
+    indexes = []
+    count = 200
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'sales.dbf')
+        table = make_table(self.path, self.count)
+        for name, kind in self.indexes:
+            table.make_mdx(name.split('+'), kind).join()
+
+    def check(self, table, conditions=CONDITIONS):
+        """Checks the indexes of 'table', and the results of SQL queries, against a scan of the table."""
+
+        self.assertEqual(sorted(table.indexes), sorted(name for name, _ in self.indexes))
+        for name, kind in self.indexes:
+            with self.subTest(index=name):
+                self.assertEqual(table.indexes[name].kind, kind)
+                self.assertEqual(list(table.indexes[name].items()), scan_order(table, name, kind))
+        reference = plain(self.path)
+        for where in conditions:
+            with self.subTest(where=where):
+                sql = f"select name, qty, price, paid, day from sales where {where};"
+                self.assertEqual(select(table, sql), select(reference, sql))
+
+    def check_round_trip(self):
+        """Checks the indexes once built, once changed, and once the table is opened again."""
+
+        table = DbaseFile(self.path)
+        self.check(table)
+        mutate(table)
+        self.check(table)
+        self.check(DbaseFile(self.path))
+
+
+class KeyCodecTest(unittest.TestCase):
+
+    def test_order(self):
+        cases = [(KeyCodec('C', 6), ['', 'A', 'AB', 'Ab', 'a', 'a b', 'ab', '\xe9t\xe9']),
+                 (KeyCodec('q'), [-2 ** 63, -1000, -1, 0, 1, 7, 2 ** 40, 2 ** 63 - 1]),
+                 (KeyCodec('d'), [float('-inf'), -1e300, -2.5, -1e-300, 0.0, 1e-300, 0.25, 3.0, 1e300, float('inf')]),
+                 (KeyCodec('D'), ['', datetime(1, 1, 1), datetime(1999, 12, 31), datetime(2000, 1, 1), datetime(9999, 12, 31)]),
+                 (KeyCodec('L'), [False, True]),
+                 (KeyCodec('T', parts=[KeyCodec('q'), KeyCodec('D')]),
+                  [(-5, ''), (-5, datetime(2020, 1, 1)), (0, ''), (0, datetime(1990, 5, 5)), (0, datetime(2020, 1, 1)), (3, '')])]
+        for codec, values in cases:
+            with self.subTest(keytype=codec.keytype):
+                encoded = [codec.encode(value) for value in values]
+                self.assertTrue(all(len(raw) == codec.width for raw in encoded))
+                self.assertEqual(encoded, sorted(encoded))
+                self.assertEqual(len(set(encoded)), len(encoded))
+                self.assertEqual([codec.decode(raw) for raw in encoded], values)
+
+    def test_casefold(self):
+        codec = KeyCodec('c', 5)
+        self.assertEqual(codec.encode('SMITH'), codec.encode('smith'))
+        self.assertEqual(codec.decode(codec.encode('SMITH')), 'smith')
+
+    def test_unencodable(self):
+        self.assertIsNone(KeyCodec('C', 3).encode('long text'))
+        self.assertIsNone(KeyCodec('q').encode('text'))
+        self.assertIsNone(KeyCodec('D').encode(5))
+
+
+class FormatTest(IndexTestCase):
+
+    indexes = [('name', 'sorted'), ('qty', 'sorted'), ('price', 'sorted'), ('paid', 'sorted'), ('day', 'sorted')]
+
+    def test_round_trip(self):
+        self.check_round_trip()
+
+    def test_changes_logged(self):
+        table = DbaseFile(self.path)
+        mutate(table)
+        self.assertTrue(all(index.logged for index in table.indexes.values()))
+        reopened = DbaseFile(self.path)
+        self.assertEqual({name: index.logged for name, index in reopened.indexes.items()},
+                         {name: index.logged for name, index in table.indexes.items()})
+
+    def test_torn_log(self):
+        table = DbaseFile(self.path)
+        mutate(table)
+        with open(table.indexes['qty'].path, 'ab') as file:
+            file.write(FieldIndex.entry.pack(b'+', 3) + b'i\x05\x0012')
+        self.check(DbaseFile(self.path), [])
+
+    def test_saved_whole(self):
+        table = DbaseFile(self.path)
+        table.mdx_log_limit = 5
+        mutate(table)
+        self.assertTrue(all(index.logged <= 5 for index in table.indexes.values()))
+        self.check(table)
+        self.check(DbaseFile(self.path))
+
+    def test_legacy_format(self):
+        table = DbaseFile(self.path)
+        for index in table.indexes.values():
+            os.remove(index.path)
+        groups = scan_items(table, 'qty')
+        first = table.get_record(0)['qty']
+        groups[first].remove(0)
+        base = os.path.splitext(self.path)[0]
+        with open(base + '.pmdx', 'wb') as file:
+            pickle.dump({'qty': groups}, file)
+            pickle.dump([('+', 'qty', first, 0)], file)
+        table = DbaseFile(self.path)
+        self.assertFalse(os.path.exists(base + '.pmdx'))
+        self.assertIsInstance(table.indexes['qty'], FieldIndex)
+        self.assertEqual(list(table.indexes['qty'].items()), scan_order(table, 'qty'))
+
+
+class CasefoldTest(IndexTestCase):
+
+    indexes = [('name', 'casefold')]
+
+    def check_prefixes(self, table):
+        reference = plain(self.path)
+        for prefix in ['ann', 'ANN 3', 'Bob', 'bobby 1', 'CARL', 'zed', 'Nobody']:
+            with self.subTest(prefix=prefix):
+                found = [record.metadata.index for record in table.filter('name', prefix)]
+                self.assertEqual(sorted(found), [record.metadata.index for record in reference.filter('name', prefix)])
+                # find() gives the first record of the first matching value in index order
+                for start in (0, 100):
+                    record = table.find('name', prefix, start)
+                    if reference.index('name', prefix, start) < 0:
+                        self.assertIsNone(record)
+                    else:
+                        self.assertTrue(record['name'].lower().startswith(prefix.lower()))
+                        self.assertGreaterEqual(record.metadata.index, start)
+
+    def test_round_trip(self):
+        self.check_round_trip()
+
+    def test_prefixes(self):
+        table = DbaseFile(self.path)
+        hits = table.indexhits
+        self.check_prefixes(table)
+        self.assertGreater(table.indexhits, hits)
+        mutate(table)
+        self.check_prefixes(table)
+        self.check_prefixes(DbaseFile(self.path))
+
+    def test_keys_lowercased(self):
+        index = DbaseFile(self.path).indexes['name']
+        self.assertEqual(index.get('ANN 3'), index.get('ann 3'))
+        self.assertEqual(len(index.get('ann 3')), len(scan_items(plain(self.path), 'name', 'casefold')['ann 3']))
+        self.assertTrue(all(value == value.lower() for value in index.keys()))
+
+
+class LookupTest(IndexTestCase):
+
+    indexes = [('name', 'sorted'), ('qty', 'sorted'), ('day', 'sorted'), ('price', 'sorted')]
+
+    def check_lookups(self, table):
+        reference = plain(self.path)
+        cases = [('name', ['Ann 3', 'ann 3', 'bob 1', 'Zed 4', 'Nobody']), ('qty', [17, 3, -20, 905, 1001, 12345]),
+                 ('day', ['', datetime(2020, 2, 2), datetime(2019, 12, 31), datetime(1999, 1, 1)]), ('price', [])]
+        for fieldname, values in cases:
+            with self.subTest(fieldname=fieldname, values=values):
+                found = [record.metadata.index for record in table.find_many(fieldname, values)]
+                self.assertEqual(found, [record.metadata.index for record in reference.find_many(fieldname, values)])
+        for fieldname in ('name', 'qty', 'day'):
+            expected = scan_order(reference, fieldname)
+            values = [value for value, _ in expected]
+            index = table.indexes[fieldname]
+            for low, high in [(0, len(values) - 1), (3, 20), (10, 10), (len(values) - 4, len(values) - 1)]:
+                with self.subTest(fieldname=fieldname, low=low, high=high):
+                    inside = expected[low:high + 1]
+                    self.assertEqual(list(index.range(values[low], values[high])), inside)
+                    self.assertEqual(list(index.range(values[low], values[high], False, False)), inside[1:-1])
+                    self.assertEqual(list(index.range(values[low], values[high], reverse=True)), inside[::-1])
+                    self.assertEqual(list(index.range(low=values[low])), expected[low:])
+                    self.assertEqual(list(index.range(high=values[high], high_inclusive=False)), expected[:high])
+        expected = scan_order(reference, 'name')
+        for prefix in ['Ann', 'ann 3', 'Bob', 'Zed', 'Nobody', '']:
+            with self.subTest(prefix=prefix):
+                found = [(value, keys) for value, keys in expected if value.startswith(prefix)]
+                self.assertEqual(list(table.indexes['name'].prefix(prefix)), found)
+                self.assertEqual(list(table.indexes['name'].prefix(prefix, True)), found[::-1])
+
+    def test_lookups(self):
+        table = DbaseFile(self.path)
+        self.check_lookups(table)
+        mutate(table)
+        self.check_lookups(table)
+        self.check_lookups(DbaseFile(self.path))
+
+    def test_order_by(self):
+        table = DbaseFile(self.path)
+        mutate(table)
+        reference = plain(self.path)
+        for sql in ["select name, qty from sales order by qty;", "select name, qty from sales where qty > 10 order by qty desc;",
+                    "select name, day from sales where day < '2020-05-01' order by day;", 
+                    "select name from sales where name LIKE 'Bob%' order by name;"]:
+            with self.subTest(sql=sql):
+                self.assertEqual(table.execute(sql).fetchall(), reference.execute(sql).fetchall())
+
+
+class CompositeTest(IndexTestCase):
+
+    indexes = [('qty+day', 'sorted'), ('paid+name', 'sorted')]
+
+    def conditions(self, table):
+        """Returns equality conditions on the fields of the composite indexes, for values held by the table."""
+
+        conditions = ["qty = 17", "paid = 'T'", "qty = 12345 AND day = '2020-01-01'", "paid = 'F' AND name = 'Nobody'"]
+        for key in (0, 1, 5, 13, 50, 199, len(table) - 1):
+            record = table.get_record(key)
+            day = record['day'].strftime('%Y-%m-%d') if record['day'] else ''
+            paid = 'T' if record['paid'] else 'F'
+            conditions += [f"qty = {record['qty']} AND day = '{day}'", f"day = '{day}' AND qty = {record['qty']}",
+                           f"paid = '{paid}' AND name = '{record['name']}'", 
+                           f"paid = '{paid}' AND name = '{record['name']}' AND qty > 10", 
+                           f"qty = {record['qty']} AND price > 0"]
+        return conditions
+
+    def test_round_trip(self):
+        table = DbaseFile(self.path)
+        hits = table.indexhits
+        self.check(table, self.conditions(table))
+        self.assertGreater(table.indexhits, hits)
+        mutate(table)
+        self.check(table, self.conditions(table))
+        table = DbaseFile(self.path)
+        self.check(table, self.conditions(table))
+
+    def test_leading_fields(self):
+        table = DbaseFile(self.path)
+        mutate(table)
+        index = table.indexes['qty+day']
+        expected = scan_order(plain(self.path), 'qty+day')
+        for qty in (17, -20, 905, 12345):
+            with self.subTest(qty=qty):
+                self.assertEqual(list(index.range((qty,), (qty,))), [item for item in expected if item[0][0] == qty])
+
+
+class BitmapTest(IndexTestCase):
+
+    indexes = [('paid', 'bitmap'), ('qty', 'bitmap'), ('day', 'bitmap')]
+
+    def check_bitmaps(self, table):
+        reference = plain(self.path)
+        for name, _ in self.indexes:
+            index = table.indexes[name]
+            live = {record['metadata']['index'] for record in reference.scan() if not record['deleted']}
+            with self.subTest(index=name):
+                self.assertEqual({key for key in range(len(table)) if index.universe() >> key & 1}, live)
+                for value, keys in scan_items(reference, name).items():
+                    self.assertEqual(index.bitmap(value), sum(1 << key for key in keys))
+
+    def test_round_trip(self):
+        conditions = CONDITIONS + ["paid = 'T' AND qty != 17", "paid != 'T' OR qty = 3", "paid != 'T' AND day != ''",
+                                   "qty = 3 OR qty = 17 OR day = ''", "qty BETWEEN 0 AND 10 AND paid = 'T' AND day > '2020-03-01'"]
+        table = DbaseFile(self.path)
+        self.check(table, conditions)
+        self.check_bitmaps(table)
+        mutate(table)
+        self.check(table, conditions)
+        self.check_bitmaps(table)
+        table = DbaseFile(self.path)
+        self.check(table, conditions)
+        self.check_bitmaps(table)
+
+    def test_table_order(self):
+        table = DbaseFile(self.path)
+        mutate(table)
+        sql = "select name, qty from sales where paid = 'T' AND qty != 17;"
+        self.assertEqual(table.execute(sql).fetchall(), plain(self.path).execute(sql).fetchall())
+
+
+class BuildTest(IndexTestCase):
+
+    count = 12000
+
+    def build_while_writing(self, table, fieldname):
+        """Starts building an index on 'fieldname' over a process pool and changes the table while it runs."""
+
+        table.mdx_workers, table.mdx_partition_size = 2, 2500
+        build = table.make_mdx(fieldname)
+        self.assertIsInstance(build, IndexBuild)
+        for i in range(300):
+            table.add_record(f'new {i}', 5000 + i % 7, 1.5, True, datetime(2022, 1, 1))
+            if i % 50 == 0:
+                record = dict(table.get_record(i * 37))
+                record['qty'] = 7000 + i
+                table.update_record(i * 37, record)
+        self.assertTrue(build.join())
+        self.assertTrue(build.done())
+        self.assertIsNone(build.error)
+
+    def test_build_while_writing(self):
+        self.indexes = [('qty', 'sorted')]
+        table = DbaseFile(self.path)
+        self.build_while_writing(table, 'qty')
+        self.assertEqual(len(table), self.count + 300)
+        self.check(table, ["qty >= 5000", "qty = 5003"])
+        self.check(DbaseFile(self.path), [])
+
+    def test_build_in_transaction(self):
+        self.indexes = [('qty', 'sorted')]
+        table = DbaseFile(self.path)
+        with table.transaction():
+            self.build_while_writing(table, 'qty')
+        self.check(table, ["qty >= 5000"])
+        table = DbaseFile(self.path)
+        build = table.make_mdx('qty')
+        table.begin()
+        table.add_record('rolled back', 8888, 0, False, None)
+        table.rollback()
+        build.join()
+        self.assertEqual(table.filter('qty', 8888), [])
+        self.check(table, [])
+
+    def test_all_fields_keep_their_kind(self):
+        table = DbaseFile(self.path)
+        table.make_mdx('name', 'casefold').join()
+        table.make_mdx('paid', 'bitmap').join()
+        self.build_while_writing(table, '*')
+        self.indexes = [('name', 'casefold'), ('qty', 'sorted'), ('price', 'sorted'), ('paid', 'bitmap'), ('day', 'sorted')]
+        self.check(table, ["qty >= 5000", "paid = 'T' AND qty < 10", "name LIKE 'new 1%'"])
+        table.make_mdx('*', 'bitmap').join()
+        self.check(DbaseFile(self.path), [])
+
+
+class BlankDateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'events.dbf')
+        table = DbaseFile.create(self.path, [('name', 'C', 8, 0), ('day', 'D', 8, 0)])
+        table.add_records([['b', datetime(2020, 1, 1)], ['a', None], ['c', datetime(2020, 1, 2)],
+                           ['e', datetime(2020, 1, 3)], ['f', None]])
+
+    def test_operators(self):
+        conditions = ["day = '2020-01-02'", "day != '2020-01-02'", "day < '2020-01-02'", "day <= '2020-01-02'",
+                      "day > '2020-01-02'", "day >= '20200102'", "day BETWEEN '2020-01-01' AND '2020-01-02'"]
+        expected = {where: select(plain(self.path), f"select name from events where {where};") for where in conditions}
+        self.assertEqual(expected["day < '2020-01-02'"], [('b',)])
+        self.assertEqual(expected["day != '2020-01-02'"], [('a',), ('b',), ('e',), ('f',)])
+        for kind in ('sorted', 'bitmap'):
+            table = DbaseFile(self.path)
+            table.make_mdx('day', kind).join()
+            for where in conditions:
+                with self.subTest(kind=kind, where=where):
+                    self.assertEqual(select(table, f"select name from events where {where};"), expected[where])
+                    ordered = table.execute(f"select name from events where {where} order by day;").fetchall()
+                    self.assertEqual(sorted((record['name'],) for record in ordered), expected[where])
+
+    def test_select_all_in_table_order(self):
+        table = DbaseFile(self.path)
+        table.make_mdx('name').join()
+        self.assertEqual([record['name'] for record in table.execute("select * from events;").fetchall()],
+                         ['b', 'a', 'c', 'e', 'f'])
+        self.assertEqual([record['name'] for record in table.execute("select * from events order by name;").fetchall()],
+                         ['a', 'b', 'c', 'e', 'f'])
+
+
+class PackTest(IndexTestCase):
+
+    indexes = [('qty', 'sorted'), ('name', 'casefold'), ('paid', 'bitmap'), ('day', 'sorted'), ('qty+day', 'sorted')]
+
+    def test_pack(self):
+        table = DbaseFile(self.path)
+        for key in range(0, 200, 3):
+            table.del_record(key)
+        self.check(table)
+        table.commit()
+        self.assertEqual(len(table), 133)
+        self.assertEqual(table.deleted_count, 0)
+        self.check(table)
+        self.check(DbaseFile(self.path))
+
+    def test_pack_deferred_by_transaction(self):
+        table = DbaseFile(self.path, autovacuum=0.2)
+        kept = len([record for record in table if record['qty'] >= 30])
+        with table.transaction():
+            table.execute("DELETE FROM sales WHERE qty < 30;")
+            self.assertEqual(len(table), 200)
+            record = dict(table.get_record(199))
+            record['qty'] = 5000
+            table.update_record(199, record)
+            table.add_records([['new', 6000, 1, True, datetime(2021, 1, 1)]])
+        self.assertEqual(len(table), kept + 1)
+        self.assertEqual(table.deleted_count, 0)
+        self.check(table)
+        self.check(DbaseFile(self.path))
+        self.assertEqual(table.find('qty', 6000).metadata.index, len(table) - 1)
+        self.assertEqual(len(table.filter('qty', 5000)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
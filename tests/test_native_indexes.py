@@ -0,0 +1,194 @@
+#-*- coding: utf-8 -*-
+
+# Checks the readers of native index files (native_indexes.py) against a scan of the table they index.
+# The fixtures are written by make_fixtures.py.
+
+
+import os, shutil, sys, tempfile, unittest
+from contextlib import redirect_stderr
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pybase3 import DbaseFile
+from pybase3.native_indexes import NdxIndex, NtxIndex, MdxFile, open_native
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Index file, field, function of the key expression
+INDEXES = [('name.ndx', 'name', ''), ('qty.ndx', 'qty', ''), ('born.ndx', 'born', ''),
+           ('uname.ntx', 'name', 'UPPER'), ('price.ntx', 'price', ''), ('born.ntx', 'born', ''),
+           ('people.mdx', 'name', ''), ('people.mdx', 'qty', ''), ('people.mdx', 'price', ''),
+           ('people.mdx', 'born', '')]
+
+
+class NativeIndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        for entry in os.listdir(FIXTURES):
+            shutil.copy(os.path.join(FIXTURES, entry), cls.directory)
+        cls.path = os.path.join(cls.directory, 'people.dbf')
+        table = DbaseFile(cls.path)
+        cls.records = [dict(record) for record in table.scan()]
+        cls.fields = {field.name: (field.type, field.decimal) for field in table.fields}
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def open(self, filename, fieldname):
+        indexes = open_native(os.path.join(self.directory, filename), self.fields)
+        index = next(index for index in indexes if index.fieldname == fieldname.upper())
+        self.addCleanup(lambda: [each.close() for each in indexes])
+        return index
+
+    def scan(self, fieldname, function):
+        """Returns the (value, record numbers) pairs of a field, in index order, from a table scan."""
+
+        groups = {}
+        for record in self.records:
+            value = record[fieldname]
+            if function == 'UPPER':
+                value = value.upper()
+            groups.setdefault(value, []).append(record['metadata']['index'])
+        if fieldname == 'name':
+            order = lambda value: value.encode('latin1')
+        elif fieldname == 'born':
+            order = lambda value: value.toordinal() if value else 0
+        else:
+            order = lambda value: value
+        return [(value, groups[value]) for value in sorted(groups, key=order)]
+
+    def test_items(self):
+        for filename, fieldname, function in INDEXES:
+            with self.subTest(filename=filename, fieldname=fieldname):
+                index = self.open(filename, fieldname)
+                self.assertEqual(index.kind, 'casefold' if function == 'UPPER' else 'sorted')
+                self.assertEqual(list(index.items()), self.scan(fieldname, function))
+                self.assertEqual(list(index.range(reverse=True)), self.scan(fieldname, function)[::-1])
+
+    def test_get(self):
+        for filename, fieldname, function in INDEXES:
+            with self.subTest(filename=filename, fieldname=fieldname):
+                index = self.open(filename, fieldname)
+                for value, keys in self.scan(fieldname, function):
+                    self.assertEqual(index.get(value), keys)
+                missing = {'name': 'Nobody', 'qty': 100000, 'price': 0.005, 'born': self.records[1]['born'].replace(year=1900)}
+                self.assertIsNone(index.get(missing[fieldname]))
+
+    def test_range(self):
+        for filename, fieldname, function in INDEXES:
+            with self.subTest(filename=filename, fieldname=fieldname):
+                index = self.open(filename, fieldname)
+                expected = self.scan(fieldname, function)
+                values = [value for value, _ in expected]
+                for low, high in [(3, 20), (0, len(values) - 1), (10, 11), (7, 7)]:
+                    inside = expected[low:high + 1]
+                    self.assertEqual(list(index.range(values[low], values[high])), inside)
+                    self.assertEqual(list(index.range(values[low], values[high], False, False)), inside[1:-1])
+                    self.assertEqual(list(index.range(values[low], values[high], reverse=True)), inside[::-1])
+                self.assertEqual(list(index.range(low=values[-3])), expected[-3:])
+                self.assertEqual(list(index.range(high=values[2], high_inclusive=False)), expected[:2])
+
+    def test_prefix(self):
+        for filename, fieldname, function in INDEXES:
+            if fieldname != 'name':
+                continue
+            with self.subTest(filename=filename):
+                index = self.open(filename, fieldname)
+                expected = self.scan(fieldname, function)
+                for prefix in ['Ann', 'ann 1', 'Zed', 'Eve 2', 'Nobody']:
+                    key = prefix.upper() if function == 'UPPER' else prefix
+                    found = [(value, keys) for value, keys in expected if value.startswith(key)]
+                    self.assertEqual(list(index.prefix(prefix)), found)
+                    self.assertEqual(list(index.prefix(prefix, True)), found[::-1])
+
+    def test_negative_numbers(self):
+        prices = [value for value, _ in self.open('price.ntx', 'price').items()]
+        self.assertTrue(prices[0] < 0 < prices[-1])
+        self.assertEqual(prices, sorted(record['price'] for record in self.records if record['price'] in prices))
+
+    def test_trees_have_branch_pages(self):
+        for filename, fieldname, _ in INDEXES:
+            with self.subTest(filename=filename, fieldname=fieldname):
+                index = self.open(filename, fieldname)
+                entries, last = index._node(index._root)
+                self.assertTrue(last or any(child for child, _, _ in entries))
+
+    def test_lookups_through_table(self):
+        table = DbaseFile(self.path)
+        self.assertEqual(sorted(table.indexes), ['born', 'name', 'price', 'qty'])
+        plain = DbaseFile(self.path)
+        for index in list(plain.indexes.values()):
+            index.close()
+        plain.indexes = {}
+        for sql in ["select name from people where qty > 400;", "select qty from people where name like 'Ann%';",
+                    "select price from people where price between -100 and 100;",
+                    "select name from people where born < '1990-01-01';", "select name from people where born >= '1990-01-01';"]:
+            with self.subTest(sql=sql):
+                self.assertEqual(sorted(map(tuple, table.execute(sql).fetchall())),
+                                 sorted(map(tuple, plain.execute(sql).fetchall())))
+
+    def test_deleted_records_left_out(self):
+        table = DbaseFile(self.path)
+        plain = DbaseFile(self.path)
+        for index in list(plain.indexes.values()):
+            index.close()
+        plain.indexes = {}
+        deleted = table.get_record(5)
+        self.assertTrue(deleted['deleted'])
+        for fieldname in ['name', 'qty', 'price', 'born']:
+            with self.subTest(fieldname=fieldname):
+                value = deleted[fieldname]
+                found = [record.metadata.index for record in table.filter(fieldname, value)]
+                self.assertNotIn(5, found)
+                self.assertEqual(sorted(found), [record.metadata.index for record in plain.filter(fieldname, value)])
+                self.assertEqual(table.index(fieldname, value), plain.index(fieldname, value))
+
+
+class CorruptIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        shutil.copy(os.path.join(FIXTURES, 'people.dbf'), self.directory)
+        with open(os.path.join(FIXTURES, 'people.mdx'), 'rb') as file:
+            self.mdx = file.read()
+
+    def write(self, filename, content):
+        path = os.path.join(self.directory, filename)
+        with open(path, 'wb') as file:
+            file.write(content)
+        return path
+
+    def test_unreadable_production_index(self):
+        for content in [b'', b'junk' * 10, self.mdx[:3000]]:
+            with self.subTest(size=len(content)):
+                self.write('people.mdx', content)
+                errors = StringIO()
+                with redirect_stderr(errors):
+                    table = DbaseFile(os.path.join(self.directory, 'people.dbf'))
+                self.assertEqual(table.indexes, {})
+                self.assertIn('not attached', errors.getvalue())
+                self.assertEqual(len(table.execute("select name from people where qty > 400;").fetchall()),
+                                 len([record for record in table if record['qty'] > 400]))
+
+    def test_truncated_files(self):
+        for filename, reader in [('name.ndx', NdxIndex), ('uname.ntx', NtxIndex), ('people.mdx', MdxFile)]:
+            with open(os.path.join(FIXTURES, filename), 'rb') as file:
+                content = file.read()
+            with self.subTest(filename=filename):
+                with self.assertRaises(ValueError):
+                    reader(self.write(filename, b''))
+                with self.assertRaises(ValueError):
+                    reader(self.write(filename, content[:100]))
+                path = self.write(filename, content[:len(content) // 2])
+                with self.assertRaises(ValueError):
+                    indexes = reader(path)
+                    for index in getattr(indexes, 'tags', [indexes]):
+                        list(index.items())
+
+
+if __name__ == '__main__':
+    unittest.main()
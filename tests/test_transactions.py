@@ -0,0 +1,230 @@
+#-*- coding: utf-8 -*-
+
+# Checks transactions on a table and on a Connection: rollback() must give back the table
+# byte for byte, and commit_transaction() the same table as changes made one at a time.
+# Crashes are simulated by copying the files of a table, journal included, in the middle of a transaction.
+
+
+import os, pickle, shutil, sys, tempfile, unittest
+from contextlib import redirect_stderr
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pybase3 import DbaseFile, Connection
+
+
+def content(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def change(table):
+    record = dict(table.get_record(3))
+    record['qty'] = 999
+    table.update_record(3, record)
+    table.del_record(4)
+    table.add_records([['new', 998]] * 5)
+
+
+class TransactionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'people.dbf')
+        table = DbaseFile.create(self.path, [('name', 'C', 10, 0), ('qty', 'N', 5, 0)])
+        table.add_records([[f'name {i}', i % 7] for i in range(50)])
+        table.make_mdx('qty').join()
+
+    def test_rollback(self):
+        before = content(self.path)
+        table = DbaseFile(self.path)
+        table.begin()
+        self.assertTrue(table.in_transaction)
+        change(table)
+        self.assertEqual(len(table), 55)
+        table.rollback()
+        self.assertFalse(table.in_transaction)
+        self.assertEqual(content(self.path), before)
+        self.assertEqual(len(table), 50)
+        self.assertEqual(table.filter('qty', 999), [])
+        self.assertEqual(len(table.filter('qty', 3)), 7)
+
+    def test_commit(self):
+        expected = os.path.join(self.directory, 'expected.dbf')
+        shutil.copy(self.path, expected)
+        change(DbaseFile(expected))
+        table = DbaseFile(self.path)
+        table.begin()
+        change(table)
+        table.commit_transaction()
+        self.assertFalse(table.in_transaction)
+        # The last update date of the header may differ
+        self.assertEqual(content(self.path)[4:], content(expected)[4:])
+        for table in (table, DbaseFile(self.path)):
+            self.assertEqual([record.metadata.index for record in table.filter('qty', 999)], [3])
+            self.assertEqual([record.metadata.index for record in table.filter('qty', 998)], list(range(50, 55)))
+            self.assertNotIn(4, [record.metadata.index for record in table.filter('qty', 4)])
+
+    def test_context_manager(self):
+        before = content(self.path)
+        table = DbaseFile(self.path)
+        with self.assertRaises(RuntimeError):
+            with table.transaction():
+                change(table)
+                raise RuntimeError
+        self.assertEqual(content(self.path), before)
+        with table.transaction():
+            change(table)
+        self.assertEqual(len(DbaseFile(self.path)), 55)
+
+    def test_add_records_all_or_nothing(self):
+        before = content(self.path)
+        table = DbaseFile(self.path)
+        with self.assertRaises(ValueError):
+            table.add_records([['ok', 1]] * 2500 + [['too wide', 123456]], batch_size=1000)
+        self.assertEqual(content(self.path), before)
+        self.assertEqual(len(table), 50)
+        self.assertEqual(len(table.filter('qty', 1)), 7)
+
+    def test_nested_begin(self):
+        table = DbaseFile(self.path)
+        table.begin()
+        self.addCleanup(table.rollback)
+        with self.assertRaises(ValueError):
+            table.begin()
+
+    def test_connection(self):
+        stock = os.path.join(self.directory, 'stock.dbf')
+        DbaseFile.create(stock, [('item', 'C', 10, 0), ('qty', 'N', 5, 0)]).add_records([['nail', 10]])
+        before = content(self.path), content(stock)
+        connection = Connection(self.directory)
+        connection.begin()
+        connection.execute("INSERT INTO people VALUES ('zoe', 7);")
+        connection.execute("UPDATE stock SET qty = 11 WHERE item = 'nail';")
+        self.assertEqual(len(connection.execute("select * from people;").fetchall()), 51)
+        connection.rollback()
+        self.assertEqual((content(self.path), content(stock)), before)
+        connection.begin()
+        connection.execute("INSERT INTO people VALUES ('zoe', 7);")
+        connection.execute("UPDATE stock SET qty = 11 WHERE item = 'nail';")
+        connection.commit()
+        self.assertEqual([record['qty'] for record in connection.execute("select qty from stock;").fetchall()], [11])
+        self.assertEqual(DbaseFile(self.path).find('name', 'zoe')['qty'], 7)
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'people.dbf')
+        self.journal = os.path.join(self.directory, 'people.pjnl')
+        table = DbaseFile.create(self.path, [('name', 'C', 10, 0), ('qty', 'N', 5, 0)])
+        table.add_records([[f'Name {i}', i % 7] for i in range(50)])
+        table.make_mdx('qty').join()
+        table.make_mdx('name', 'casefold').join()
+        self.before = content(self.path)
+
+    def crash(self):
+        """Copies the files of the table as a crash would leave them, and returns the path of the copy."""
+
+        copy = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, copy)
+        for entry in os.listdir(self.directory):
+            shutil.copy(os.path.join(self.directory, entry), copy)
+        return os.path.join(copy, 'people.dbf')
+
+    def check_indexes(self, table):
+        for name in ('qty', 'name'):
+            fold = str.lower if name == 'name' else lambda value: value
+            expected = {}
+            for record in table.scan():
+                if not record['deleted']:
+                    expected.setdefault(fold(record[name]), []).append(record['metadata']['index'])
+            self.assertEqual(dict(table.indexes[name].items()), expected)
+
+    def test_crash_recovery(self):
+        table = DbaseFile(self.path, journal=True)
+        table.begin()
+        change(table)
+        self.assertTrue(os.path.exists(self.journal))
+        copy = self.crash()
+        table.rollback()
+        self.assertEqual(content(self.path), self.before)
+        self.assertFalse(os.path.exists(self.journal))
+        recovered = DbaseFile(copy)
+        self.assertEqual(content(copy), self.before)
+        self.assertFalse(os.path.exists(os.path.splitext(copy)[0] + '.pjnl'))
+        self.assertEqual(len(recovered), 50)
+        self.check_indexes(recovered)
+
+    def test_crash_while_updating_indexes(self):
+        table = DbaseFile(self.path, journal=True)
+        log_mdx = table._log_mdx
+        copies = []
+
+        def crash(ops):
+            log_mdx(ops[:1])
+            copies.append(self.crash())
+            raise RuntimeError
+
+        table._log_mdx = crash
+        table.begin()
+        change(table)
+        with self.assertRaises(RuntimeError):
+            table.commit_transaction()
+        recovered = DbaseFile(copies[0])
+        self.assertEqual(content(copies[0]), self.before)
+        self.assertEqual({name: index.kind for name, index in recovered.indexes.items()}, {'qty': 'sorted', 'name': 'casefold'})
+        self.check_indexes(recovered)
+
+    def test_live_journal_left_alone(self):
+        table = DbaseFile(self.path, journal=True)
+        table.begin()
+        change(table)
+        DbaseFile(self.path, readonly=True)
+        DbaseFile(self.path)
+        self.assertTrue(os.path.exists(self.journal))
+        table.commit_transaction()
+        self.assertFalse(os.path.exists(self.journal))
+        table = DbaseFile(self.path)
+        self.assertEqual(len(table), 55)
+        self.assertEqual(table.get_record(3)['qty'], 999)
+        self.check_indexes(table)
+
+    def test_writes_journaled(self):
+        table = DbaseFile(self.path, journal=True)
+        change(table)
+        self.assertFalse(table.in_transaction)
+        self.assertFalse(os.path.exists(self.journal))
+        self.assertEqual(len(DbaseFile(self.path)), 55)
+
+    def test_unstarted_journal(self):
+        start = pickle.dumps({'header': self.before[:97], 'tail': b'\x1a'})
+        for journal in (b'', start[:len(start) // 2]):
+            with self.subTest(size=len(journal)):
+                with open(self.journal, 'wb') as file:
+                    file.write(journal)
+                errors = StringIO()
+                with redirect_stderr(errors):
+                    DbaseFile(self.path, readonly=True)
+                    self.assertTrue(os.path.exists(self.journal))
+                    DbaseFile(self.path)
+                self.assertFalse(os.path.exists(self.journal))
+                self.assertEqual(errors.getvalue(), '')
+                self.assertEqual(content(self.path), self.before)
+
+    def test_not_a_journal(self):
+        with open(self.journal, 'wb') as file:
+            file.write(b'Not a journal')
+        errors = StringIO()
+        with redirect_stderr(errors):
+            DbaseFile(self.path)
+        self.assertIn('is not a journal', errors.getvalue())
+        self.assertTrue(os.path.exists(self.journal))
+        self.assertEqual(content(self.path), self.before)
+
+
+if __name__ == '__main__':
+    unittest.main()